@@ -0,0 +1,2 @@
+from .pool import ReadOnlyPool
+from .server import QueryServer, run_query_api, start_query_api_thread
@@ -0,0 +1,39 @@
+import threading
+
+from app.config.config import QUERY_API_WORKERS
+from app.db.connection import connect_read_only
+
+
+class ReadOnlyPool:
+    """Reusable read-only connections, at most `size` kept idle per database.
+
+    Connections are opened with `connect_read_only`, so readers never take
+    the write lock and only see committed data (WAL snapshot).
+    """
+
+    def __init__(self, size=QUERY_API_WORKERS):
+        self.size = size
+        self._idle = {}   # path -> [connection]
+        self._lock = threading.Lock()
+
+    def acquire(self, path):
+        with self._lock:
+            idle = self._idle.get(path)
+            if idle:
+                return idle.pop()
+        return connect_read_only(path)
+
+    def release(self, path, conn):
+        with self._lock:
+            idle = self._idle.setdefault(path, [])
+            if len(idle) < self.size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
@@ -0,0 +1,166 @@
+"""
+Query building for the read API.
+
+Every resource maps to one table. Rows are always returned in
+(time, id) order and paged with a keyset cursor ("<time>|<id>"), so each
+page is a range scan on the time indexes instead of an OFFSET scan.
+"""
+
+import json
+
+from app.config.config import (
+    ALERTS_DB_PATH,
+    METRICS_DB_PATH,
+    SENSOR_DB_PATH,
+    STORAGE_MODE,
+    UNIFIED_DB_PATH,
+    VENTILATION_DB_PATH,
+)
+from app.utils.time_utils import to_epoch
+
+
+class Resource:
+    def __init__(self, table, path, time_column="timestamp", filters=None, json_columns=(), epoch=False):
+        self.table = table
+        self.path = path
+        self.time_column = time_column
+        self.filters = filters or {}   # query parameter -> column
+        self.json_columns = set(json_columns)
+        self.epoch = epoch             # time column holds epoch seconds
+
+    def time_value(self, value):
+        """Query parameter -> value comparable with the time column."""
+        return int(to_epoch(value)) if self.epoch else value
+
+
+SPLIT_RESOURCES = {
+    "readings": Resource("sensor_readings", SENSOR_DB_PATH, filters={"device": "device_id"}),
+    "metrics": Resource(
+        "metrics", METRICS_DB_PATH,
+        filters={"type": "metric_type", "level": "status", "window": "window"},
+    ),
+    "alerts": Resource(
+        "alerts", ALERTS_DB_PATH,
+        filters={"category": "category", "level": "severity", "state": "state"},
+    ),
+    "ventilation": Resource(
+        "ventilation_history", VENTILATION_DB_PATH,
+        filters={"mode": "mode"},
+        json_columns=("reasons",),
+    ),
+    "rollups": Resource(
+        "rollups", METRICS_DB_PATH,
+        time_column="bucket_start",
+        filters={"resolution": "resolution", "series": "series", "device": "device_id"},
+        json_columns=("band_seconds",),
+    ),
+}
+
+# Unified schema: the *_v views, ranged on the indexed integer `ts`
+UNIFIED_RESOURCES = {
+    "readings": Resource(
+        "readings_v", UNIFIED_DB_PATH, time_column="ts", epoch=True,
+        filters={"device": "device_id"},
+    ),
+    "metrics": Resource(
+        "metrics_v", UNIFIED_DB_PATH, time_column="ts", epoch=True,
+        filters={"type": "metric_type", "level": "status", "window": "window"},
+    ),
+    "alerts": Resource(
+        "alerts_v", UNIFIED_DB_PATH, time_column="ts", epoch=True,
+        filters={"category": "category", "level": "severity", "state": "state"},
+    ),
+    "ventilation": Resource(
+        "ventilation_v", UNIFIED_DB_PATH, time_column="ts", epoch=True,
+        filters={"mode": "mode"},
+        json_columns=("reasons",),
+    ),
+    "rollups": Resource(
+        "rollups", UNIFIED_DB_PATH,
+        time_column="bucket_start",
+        filters={"resolution": "resolution", "series": "series", "device": "device_id"},
+        json_columns=("band_seconds",),
+    ),
+}
+
+RESOURCES = UNIFIED_RESOURCES if STORAGE_MODE == "unified" else SPLIT_RESOURCES
+
+# Parameters understood by every resource
+COMMON_PARAMS = {"from", "to", "limit", "cursor", "stream"}
+
+
+def parse_cursor(cursor):
+    time_value, sep, row_id = cursor.rpartition("|")
+    if not sep or not row_id.isdigit():
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return time_value, int(row_id)
+
+
+def make_cursor(resource, row):
+    return f"{row[resource.time_column]}|{row['id']}"
+
+
+def build_query(resource, params, limit=None):
+    """Return (sql, args) for `params` (a dict of single string values).
+
+    `from` is inclusive and `to` exclusive; both are compared as ISO-8601
+    strings, like the stored timestamps. Filter values may be comma
+    separated ("level=warning,critical").
+    """
+    unknown = set(params) - COMMON_PARAMS - set(resource.filters)
+    if unknown:
+        raise ValueError(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+
+    time_column = resource.time_column
+    where, args = [], []
+    if params.get("from"):
+        where.append(f"{time_column} >= ?")
+        args.append(resource.time_value(params["from"]))
+    if params.get("to"):
+        where.append(f"{time_column} < ?")
+        args.append(resource.time_value(params["to"]))
+    for name, column in resource.filters.items():
+        if not params.get(name):
+            continue
+        values = [v for v in params[name].split(",") if v]
+        where.append(f"{column} IN ({', '.join('?' * len(values))})")
+        args.extend(values)
+    if params.get("cursor"):
+        time_value, row_id = parse_cursor(params["cursor"])
+        if resource.epoch:
+            time_value = int(time_value)
+        where.append(f"({time_column}, id) > (?, ?)")
+        args.extend((time_value, row_id))
+
+    sql = f"SELECT * FROM {resource.table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {time_column}, id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        args.append(int(limit))
+    return sql, args
+
+
+def row_to_dict(resource, columns, row):
+    record = dict(zip(columns, row))
+    for column in resource.json_columns:
+        if record.get(column) is not None:
+            record[column] = json.loads(record[column])
+    return record
+
+
+def fetch_page(resource, conn, params, limit):
+    """One page of rows plus the cursor of the next page (or None)."""
+    sql, args = build_query(resource, params, limit + 1)
+    cur = conn.execute(sql, args)
+    try:
+        columns = [d[0] for d in cur.description]
+        rows = [row_to_dict(resource, columns, r) for r in cur.fetchall()]
+    finally:
+        cur.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = make_cursor(resource, rows[-1])
+    return rows, next_cursor
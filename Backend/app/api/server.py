@@ -0,0 +1,276 @@
+"""
+Lightweight read-only HTTP query API (asyncio, standard library only).
+
+    GET /api                      list of resources
+    GET /api/<resource>?...       one page: {"rows": [...], "next": cursor}
+    GET /api/<resource>?stream=1  every matching row as NDJSON (chunked)
+    GET /api/state                latest state of every device
+    GET /api/state?device=<id>    one device; &readings=N adds its last N
+                                  readings as columns
+    GET /api/unity[?device=<id>]  Unity payload and alerts per device
+
+Resources: readings, metrics, alerts, ventilation, rollups. Common
+parameters are `from`, `to`, `limit` and `cursor`; see
+app/api/queries.py for the per-resource filters.
+
+SQLite calls run on a small thread pool through read-only connections, so
+queries never block the event loop nor contend with the ingest writer.
+/api/state and /api/unity are answered from the in-process hot state cache
+(app/state/hot_cache.py) on the event loop, without touching the
+databases; `device=` with an empty value selects readings without a
+device id.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from app.api.pool import ReadOnlyPool
+from app.api.queries import RESOURCES, build_query, fetch_page, row_to_dict
+from app.mqtt.payloads import build_unity_alert_messages, build_unity_payload
+from app.state.hot_cache import get_hot_state
+from app.config.config import (
+    QUERY_API_HOST,
+    QUERY_API_MAX_PAGE_SIZE,
+    QUERY_API_PAGE_SIZE,
+    QUERY_API_PORT,
+    QUERY_API_WORKERS,
+)
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    503: "Service Unavailable",
+}
+
+_REQUEST_TIMEOUT = 10
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryServer:
+    def __init__(
+        self,
+        host=QUERY_API_HOST,
+        port=QUERY_API_PORT,
+        page_size=QUERY_API_PAGE_SIZE,
+        max_page_size=QUERY_API_MAX_PAGE_SIZE,
+        workers=QUERY_API_WORKERS,
+        hot_state=None,
+    ):
+        self.host = host
+        self.port = port
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.pool = ReadOnlyPool(workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-api")
+        self.hot_state = get_hot_state() if hot_state is None else hot_state
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"🔎 Query API listening on http://{self.host}:{self.port}/api")
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+
+    # ------------------------------------------------
+    # HTTP
+    # ------------------------------------------------
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), _REQUEST_TIMEOUT)
+                method, target = _parse_request_line(head)
+                if method != "GET":
+                    raise HTTPError(405, f"method {method} not allowed")
+                await self._route(writer, target)
+            except HTTPError as e:
+                await _send_json(writer, e.status, {"error": str(e)})
+            except sqlite3.OperationalError as e:
+                # Typically the database does not exist yet
+                await _send_json(writer, 503, {"error": str(e)})
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            print("❌ Query API error:", e)
+        finally:
+            writer.close()
+
+    async def _route(self, writer, target):
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["api"]:
+            await _send_json(writer, 200, {"resources": sorted(RESOURCES), "live": ["state", "unity"]})
+            return
+        if parts in (["api", "state"], ["api", "unity"]):
+            # An empty device= is meaningful here
+            params = dict(parse_qsl(url.query, keep_blank_values=True))
+            await (self._state if parts[1] == "state" else self._unity)(writer, params)
+            return
+        if len(parts) != 2 or parts[0] != "api" or parts[1] not in RESOURCES:
+            raise HTTPError(404, f"no such resource: {url.path}")
+
+        resource = RESOURCES[parts[1]]
+        params = dict(parse_qsl(url.query))
+        try:
+            limit = int(params.get("limit", self.page_size))
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer")
+        limit = max(1, min(limit, self.max_page_size))
+
+        try:
+            if params.get("stream") in ("1", "true"):
+                await self._stream(writer, resource, params)
+            else:
+                await self._page(writer, resource, params, limit)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    def _devices(self, params):
+        if "device" not in params:
+            return self.hot_state.devices()
+        state = self.hot_state.get(params["device"] or None)
+        if state is None:
+            raise HTTPError(404, f"no such device: {params['device']}")
+        return [state]
+
+    async def _state(self, writer, params):
+        devices = self._devices(params)
+        if "device" not in params:
+            # Every device's JSON is already encoded: just join them
+            body = b'{"devices":[' + b",".join(state.encoded() for state in devices) + b"]}"
+            await _send_body(writer, 200, body)
+            return
+        state = devices[0]
+        if "readings" not in params:
+            await _send_body(writer, 200, state.encoded())
+            return
+        try:
+            n = int(params["readings"])
+        except ValueError:
+            raise HTTPError(400, "readings must be an integer")
+        await _send_json(writer, 200, {**state.to_dict(), "readings": state.recent(n)})
+
+    async def _unity(self, writer, params):
+        payloads = []
+        for state in self._devices(params):
+            latest = state.latest
+            if latest is None:
+                continue
+            payloads.append({
+                "device_id": state.device_id,
+                **build_unity_payload(latest.status_packet),
+                "alerts": build_unity_alert_messages(latest.status_packet),
+            })
+        await _send_json(writer, 200, {"devices": payloads})
+
+    async def _page(self, writer, resource, params, limit):
+        def query():
+            conn = self.pool.acquire(resource.path)
+            try:
+                return fetch_page(resource, conn, params, limit)
+            finally:
+                self.pool.release(resource.path, conn)
+
+        loop = asyncio.get_running_loop()
+        rows, next_cursor = await loop.run_in_executor(self.executor, query)
+        await _send_json(writer, 200, {"rows": rows, "next": next_cursor})
+
+    async def _stream(self, writer, resource, params):
+        sql, args = build_query(resource, params)
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(self.executor, self.pool.acquire, resource.path)
+        cur = None
+        try:
+            cur = await loop.run_in_executor(self.executor, conn.execute, sql, args)
+            columns = [d[0] for d in cur.description]
+            writer.write(_head(200, "application/x-ndjson", chunked=True))
+            try:
+                while True:
+                    rows = await loop.run_in_executor(self.executor, cur.fetchmany, self.page_size)
+                    if not rows:
+                        break
+                    body = "".join(
+                        json.dumps(row_to_dict(resource, columns, r)) + "\n" for r in rows
+                    ).encode()
+                    writer.write(b"%x\r\n%s\r\n" % (len(body), body))
+                    # Backpressure: a slow client pauses the cursor, not the server
+                    await writer.drain()
+            except (sqlite3.Error, ValueError) as e:
+                # The status line is already out: end the stream without its
+                # last chunk, the client sees a truncated response
+                print("❌ Query API stream aborted:", e)
+                return
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            # Finalizing the cursor ends the read snapshot so WAL checkpoints can proceed
+            if cur is not None:
+                cur.close()
+            self.pool.release(resource.path, conn)
+
+
+def _parse_request_line(head):
+    try:
+        method, target, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    return method, target
+
+
+def _head(status, content_type, length=None, chunked=False):
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        "Connection: close",
+    ]
+    if chunked:
+        lines.append("Transfer-Encoding: chunked")
+    elif length is not None:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send_json(writer, status, payload):
+    await _send_body(writer, status, json.dumps(payload).encode())
+
+
+async def _send_body(writer, status, body):
+    writer.write(_head(status, "application/json", len(body)) + body)
+    await writer.drain()
+
+
+def run_query_api(host=QUERY_API_HOST, port=QUERY_API_PORT):
+    """Serve the query API on the current thread until interrupted."""
+    asyncio.run(QueryServer(host, port).serve_forever())
+
+
+def start_query_api_thread(host=QUERY_API_HOST, port=QUERY_API_PORT):
+    """Serve the query API on a daemon thread (next to the MQTT listener)."""
+    thread = threading.Thread(
+        target=run_query_api, args=(host, port), name="query-api", daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,2 @@
+from .export import COLUMNS, export_archive, load_manifest
+from .reader import ArchiveReader
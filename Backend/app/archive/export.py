@@ -0,0 +1,248 @@
+"""
+Export stored readings and metrics into the columnar archive.
+
+Layout under ARCHIVE_DIR:
+
+    manifest.json
+    readings/2025-10-09/ts.npy, device_id.npy, temp.npy, ...
+    metrics/2025-10-09/ts.npy, device_id.npy, metric_type.npy, value.npy, ...
+
+Each day directory holds one .npy file per column, sorted by `ts` (int64
+epoch seconds). Measurements are float32 with NaN for NULL; strings are
+int32 codes into a per-table label list kept in the manifest (-1 = NULL),
+so the codes of a column mean the same thing on every day.
+
+Exports are incremental: a day is rewritten only when the source holds a
+different number of rows for it than the archive (the current day, or a
+day that was re-imported). Days already pruned from SQLite stay archived.
+"""
+
+import json
+import os
+import shutil
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.config.config import (
+    ARCHIVE_DIR,
+    METRICS_DB_PATH,
+    SENSOR_DB_PATH,
+    STORAGE_MODE,
+    UNIFIED_DB_PATH,
+)
+from app.db.connection import connect_read_only, select_list
+from app.utils.time_utils import to_epoch
+
+MANIFEST = "manifest.json"
+VERSION = 1
+
+# table -> [(column, dtype)]; "label" = int32 codes into the manifest labels
+COLUMNS = {
+    "readings": [
+        ("ts", "int64"),
+        ("device_id", "label"),
+        ("temp", "float32"),
+        ("pressure", "float32"),
+        ("co_mean", "float32"),
+        ("co_max", "float32"),
+        ("co_valid", "int8"),
+        ("pm2_5", "float32"),
+        ("pm10", "float32"),
+        ("co2", "float32"),
+        ("humidity", "float32"),
+    ],
+    "metrics": [
+        ("ts", "int64"),
+        ("device_id", "label"),
+        ("metric_type", "label"),
+        ("value", "float32"),
+        ("window", "label"),
+        ("limit_value", "float32"),
+        ("status", "label"),
+    ],
+}
+
+_READING_FIELDS = [c for c, _ in COLUMNS["readings"][2:]]
+
+
+class _Source:
+    """One table of one database: its rows per UTC day, oldest first."""
+
+    def __init__(self, path, table, time_column, select, epoch_time):
+        self.path = path
+        self.table = table
+        self.time_column = time_column
+        self.select = select           # conn -> SELECT list after the time column
+        self.epoch_time = epoch_time   # INTEGER epochs (unified) or ISO text (split)
+
+    def _day_expr(self):
+        if self.epoch_time:
+            return f"date({self.time_column}, 'unixepoch')"
+        return f"substr({self.time_column}, 1, 10)"
+
+    def _bounds(self, day):
+        if self.epoch_time:
+            start = int(to_epoch(day))
+            return start, start + 86400
+        return day, (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+    def day_counts(self, conn):
+        return dict(conn.execute(
+            f"SELECT {self._day_expr()} AS day, COUNT(*) FROM {self.table} "
+            f"WHERE {self.time_column} IS NOT NULL GROUP BY day ORDER BY day"
+        ))
+
+    def rows(self, conn, day):
+        return conn.execute(
+            f"SELECT {self.time_column}, {self.select(conn)} FROM {self.table} "
+            f"WHERE {self.time_column} >= ? AND {self.time_column} < ?",
+            self._bounds(day),
+        ).fetchall()
+
+
+def _sources(storage_mode, sensor_path, metrics_path, unified_path):
+    if storage_mode == "unified":
+        return {
+            "readings": _Source(
+                unified_path, "readings", "ts",
+                lambda conn: f"device_id, {select_list(conn, 'readings', _READING_FIELDS)}", True,
+            ),
+            "metrics": _Source(
+                unified_path, "metrics_v m JOIN readings r ON r.id = m.reading_id", "m.ts",
+                lambda conn: "r.device_id, m.metric_type, m.value, m.window, m.limit_value, m.status", True,
+            ),
+        }
+    return {
+        "readings": _Source(
+            sensor_path, "sensor_readings", "timestamp",
+            lambda conn: select_list(conn, "sensor_readings", ["device_id"] + _READING_FIELDS), False,
+        ),
+        # The split metrics table has no device column
+        "metrics": _Source(
+            metrics_path, "metrics", "timestamp",
+            lambda conn: "NULL AS device_id, metric_type, value, window, limit_value, status", False,
+        ),
+    }
+
+
+def _column(values, dtype, labels):
+    if dtype == "label":
+        codes = []
+        for v in values:
+            if v is None:
+                codes.append(-1)
+                continue
+            code = labels.get(v)
+            if code is None:
+                code = labels[v] = len(labels)
+            codes.append(code)
+        return np.array(codes, dtype=np.int32)
+    if dtype.startswith("float"):
+        return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    return np.array([-1 if v is None else v for v in values], dtype=dtype)
+
+
+def _write_day(directory, columns):
+    """Write the day into a scratch directory, then swap it in."""
+    scratch = directory + ".tmp"
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch)
+    for name, array in columns.items():
+        np.save(os.path.join(scratch, f"{name}.npy"), array)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(scratch, directory)
+
+
+def load_manifest(out_dir=ARCHIVE_DIR):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"version": VERSION, "tables": {}}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != VERSION:
+        raise ValueError(f"Unsupported archive version {manifest.get('version')} in {path}")
+    return manifest
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def export_archive(
+    out_dir=ARCHIVE_DIR,
+    storage_mode=STORAGE_MODE,
+    sensor_path=SENSOR_DB_PATH,
+    metrics_path=METRICS_DB_PATH,
+    unified_path=UNIFIED_DB_PATH,
+    tables=tuple(COLUMNS),
+    overwrite=False,
+):
+    """Archive every day whose row count changed since the last export
+    (every day with `overwrite`); returns per-table totals."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    sources = _sources(storage_mode, sensor_path, metrics_path, unified_path)
+    conns = {}
+    totals = {}
+    try:
+        for table in tables:
+            source = sources[table]
+            if not os.path.exists(source.path):
+                continue
+            if source.path not in conns:
+                conns[source.path] = connect_read_only(source.path)
+            conn = conns[source.path]
+            spec = COLUMNS[table]
+            entry = manifest["tables"].setdefault(table, {
+                "columns": dict(spec),
+                "labels": {name: [] for name, dtype in spec if dtype == "label"},
+                "chunks": {},
+            })
+            labels = {name: {v: i for i, v in enumerate(values)} for name, values in entry["labels"].items()}
+            counts = {"rows": 0, "days": 0, "unchanged": 0, "skipped": 0}
+
+            for day, count in source.day_counts(conn).items():
+                chunk = entry["chunks"].get(day)
+                if not overwrite and chunk is not None and chunk["source_rows"] == count:
+                    counts["unchanged"] += 1
+                    continue
+                times, kept = [], []
+                for row in source.rows(conn, day):
+                    try:
+                        times.append(int(row[0]) if source.epoch_time else int(to_epoch(row[0])))
+                    except (TypeError, ValueError):
+                        counts["skipped"] += 1
+                        continue
+                    kept.append(row[1:])
+                if not kept:
+                    continue
+
+                columns = {"ts": np.array(times, dtype=np.int64)}
+                for (name, dtype), values in zip(spec[1:], zip(*kept)):
+                    columns[name] = _column(values, dtype, labels.get(name))
+                order = np.argsort(columns["ts"], kind="stable")
+                if np.any(order != np.arange(len(order))):
+                    columns = {name: array[order] for name, array in columns.items()}
+
+                _write_day(os.path.join(out_dir, table, day), columns)
+                entry["chunks"][day] = {
+                    "rows": len(kept),
+                    "source_rows": count,
+                    "t_min": int(columns["ts"][0]),
+                    "t_max": int(columns["ts"][-1]),
+                }
+                counts["rows"] += len(kept)
+                counts["days"] += 1
+
+            entry["labels"] = {name: list(values) for name, values in labels.items()}
+            entry["chunks"] = dict(sorted(entry["chunks"].items()))
+            _save_manifest(out_dir, manifest)
+            totals[table] = counts
+    finally:
+        for conn in conns.values():
+            conn.close()
+    return totals
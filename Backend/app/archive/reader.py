@@ -0,0 +1,94 @@
+"""
+Read the columnar archive written by app/archive/export.py.
+
+Column files are memory-mapped read-only and a time range is located with
+a binary search on each day's `ts`, so `chunks()` yields views straight
+into the page cache: nothing is copied and only the requested columns are
+touched. `read()` concatenates those views (one copy) unless the range
+falls inside a single day.
+
+    reader = ArchiveReader()
+    data = reader.read("readings", "2025-10-01", "2025-11-01", ["ts", "co2"])
+    data["co2"].mean()
+"""
+
+import os
+
+import numpy as np
+
+from app.archive.export import COLUMNS, load_manifest
+from app.config.config import ARCHIVE_DIR
+from app.utils.time_utils import to_epoch
+
+
+def _epoch(value):
+    """None, epoch seconds or an ISO date/timestamp (naive = UTC)."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return to_epoch(value)
+
+
+class ArchiveReader:
+    def __init__(self, path=ARCHIVE_DIR):
+        self.path = path
+        self.manifest = load_manifest(path)
+        self._arrays = {}   # file -> memmap
+
+    def tables(self):
+        return list(self.manifest["tables"])
+
+    def columns(self, table):
+        return list(self.manifest["tables"][table]["columns"])
+
+    def days(self, table):
+        return list(self.manifest["tables"][table]["chunks"])
+
+    def labels(self, table, column):
+        """The strings behind the int32 codes of a label column."""
+        return self.manifest["tables"][table]["labels"][column]
+
+    def decode(self, table, column, codes):
+        """Codes -> object array of strings (None for -1)."""
+        labels = np.array(self.labels(table, column) + [None], dtype=object)
+        return labels[np.where(codes < 0, len(labels) - 1, codes)]
+
+    def _column(self, table, day, column):
+        path = os.path.join(self.path, table, day, f"{column}.npy")
+        array = self._arrays.get(path)
+        if array is None:
+            array = self._arrays[path] = np.load(path, mmap_mode="r")
+        return array
+
+    def chunks(self, table, start=None, end=None, columns=None):
+        """Per-day {column: view} for readings with start <= ts < end."""
+        entry = self.manifest["tables"][table]
+        columns = list(columns or entry["columns"])
+        start, end = _epoch(start), _epoch(end)
+        for day, chunk in entry["chunks"].items():
+            if (start is not None and chunk["t_max"] < start) or (end is not None and chunk["t_min"] >= end):
+                continue
+            lo, hi = 0, chunk["rows"]
+            if (start is not None and start > chunk["t_min"]) or (end is not None and end <= chunk["t_max"]):
+                ts = self._column(table, day, "ts")
+                if start is not None and start > chunk["t_min"]:
+                    lo = int(np.searchsorted(ts, start, "left"))
+                if end is not None and end <= chunk["t_max"]:
+                    hi = int(np.searchsorted(ts, end, "left"))
+            if lo < hi:
+                yield {c: self._column(table, day, c)[lo:hi] for c in columns}
+
+    def read(self, table, start=None, end=None, columns=None):
+        """{column: array} over the whole range."""
+        columns = list(columns or self.manifest["tables"][table]["columns"])
+        parts = list(self.chunks(table, start, end, columns))
+        if len(parts) == 1:
+            return parts[0]
+        dtypes = dict(COLUMNS[table])
+        return {
+            c: np.concatenate([p[c] for p in parts]) if parts
+            else np.empty(0, dtype="int32" if dtypes[c] == "label" else dtypes[c])
+            for c in columns
+        }
+
+    def close(self):
+        self._arrays.clear()
@@ -0,0 +1,5 @@
+from app.cluster.partition import PartitionFilter, partition_of
+from app.cluster.storage import QueueWriter, run_storage
+from app.cluster.supervisor import run_cluster, run_worker
+
+__all__ = ["PartitionFilter", "partition_of", "QueueWriter", "run_storage", "run_cluster", "run_worker"]
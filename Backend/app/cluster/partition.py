@@ -0,0 +1,29 @@
+"""
+Device partitioning for the multi-worker mode.
+
+A device (its topic) always maps to the same partition, on every machine
+and across restarts: crc32 of the name, not Python's per-process `hash`.
+"""
+
+import zlib
+
+
+def partition_of(device_id, partitions):
+    return zlib.crc32(str(device_id).encode()) % partitions
+
+
+class PartitionFilter:
+    """Accepts the topics of the devices owned by `partition` of `partitions`."""
+
+    def __init__(self, partition, partitions):
+        if not 0 <= partition < partitions:
+            raise ValueError(f"Partition {partition} out of range for {partitions} partition(s)")
+        self.partition = partition
+        self.partitions = partitions
+        self._owned = {}   # topic -> bool; one crc per device
+
+    def __call__(self, topic):
+        owned = self._owned.get(topic)
+        if owned is None:
+            owned = self._owned[topic] = partition_of(topic, self.partitions) == self.partition
+        return owned
@@ -0,0 +1,88 @@
+"""
+Coordinated storage for the multi-worker mode.
+
+SQLite takes one writer at a time, and the unified schema assigns reading
+ids in the writer (app/db/unified_db.py), so worker processes do not open
+the databases themselves. Each gets a QueueWriter with the DBWriter calls
+the listeners make; it forwards every batch over one multiprocessing queue
+to the storage process, which runs the process-wide writer (group commits,
+storage spool) exactly like a single listener does.
+
+A full queue blocks the worker's persist stage: back pressure, as between
+the stages of one pipeline.
+"""
+
+import queue
+import signal
+
+from app.db.writer import get_writer
+from app.spool import close_spools
+from app.telemetry.metrics import ERRORS
+
+STOP = None
+
+
+class QueueWriter:
+    """Worker-side writer: hands everything to the storage process."""
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+
+    def write_readings(self, items):
+        self.outbox.put(("write", list(items)))
+
+    def write_reading(self, reading, metrics=(), alerts=(), ventilation=None, rollups=()):
+        self.write_readings([(reading, list(metrics), list(alerts), ventilation, list(rollups))])
+
+    def add_rows(self, kind, rows):
+        rows = list(rows)
+        if rows:
+            self.outbox.put(("rows", kind, rows))
+
+    def maybe_flush(self):
+        pass   # the storage process commits on its own thresholds
+
+    def flush(self):
+        self.outbox.put(("flush",))
+
+    def close(self):
+        self.flush()
+
+    def pending(self):
+        try:
+            return self.outbox.qsize()
+        except NotImplementedError:   # macOS
+            return 0
+
+
+def run_storage(inbox):
+    """Storage process: write what the workers send until STOP."""
+    # Ctrl+C reaches the whole process group; keep writing until the
+    # workers have drained and the supervisor sends STOP
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    writer = get_writer()
+    print("🗄️ Storage process ready")
+    try:
+        while True:
+            try:
+                message = inbox.get()
+            except (EOFError, OSError, queue.Empty):
+                break
+            if message is STOP:
+                break
+            op, *args = message
+            try:
+                if op == "write":
+                    writer.write_readings(*args)
+                elif op == "rows":
+                    writer.add_rows(*args)
+                elif op == "flush":
+                    writer.flush()
+            except Exception as e:
+                ERRORS.inc(stage="storage", type=type(e).__name__)
+                print("❌ Storage error:", e)
+    finally:
+        writer.close()
+        close_spools()
+        print("🗄️ Storage process stopped")
@@ -0,0 +1,193 @@
+"""
+Multi-process ingestion: one storage process plus CLUSTER_WORKERS async
+listeners, started and kept alive from a single entry point (main.py when
+CLUSTER_WORKERS > 0).
+
+    broker -> worker 0..N-1 (decode, evaluate, publish) -> storage process -> SQLite
+
+Workers split the devices in one of two ways (CLUSTER_MODE):
+
+- "partition": every worker subscribes to MQTT_TOPICS and keeps the devices
+  whose topic hashes to its partition (app/cluster/partition.py). Works with
+  any broker; each message crosses the network once per worker.
+- "shared": MQTT v5 shared subscription `$share/<group>/<topic>`; the broker
+  hands each message to one member. Alert episodes, forecasts and the hot
+  cache are per device, so the broker must dispatch by topic (e.g. EMQX
+  `shared_subscription_strategy = hash_topic`, or app/mqtt/local_broker.py).
+
+Both need the device in the topic (several MQTT_TOPICS or a wildcard).
+The query API is not started in cluster mode: the hot cache is per worker.
+
+Several machines: give each one the same CLUSTER_PARTITIONS and its own
+CLUSTER_FIRST_PARTITION; each machine writes its own databases.
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from app.cluster.partition import PartitionFilter
+from app.cluster.storage import STOP, QueueWriter, run_storage
+from app.config.config import (
+    CLUSTER_FIRST_PARTITION,
+    CLUSTER_MODE,
+    CLUSTER_PARTITIONS,
+    CLUSTER_RESTART_DELAY,
+    CLUSTER_SHARE_GROUP,
+    CLUSTER_STORAGE_QUEUE_SIZE,
+    CLUSTER_WORKERS,
+    MQTT_TOPICS,
+    SPOOL_DIR,
+    STATE_SNAPSHOT_PATH,
+    TELEMETRY_HOST,
+    TELEMETRY_PORT,
+    TELEMETRY_SUMMARY_INTERVAL,
+)
+from app.mqtt.async_listener import topic_is_device
+
+_MAX_RESTART_DELAY = 60
+_POLL_INTERVAL = 0.5
+
+
+def _worker_path(path, partition):
+    """db/state.json.gz -> db/state-worker3.json.gz"""
+    head, name = os.path.split(path)
+    stem, dot, ext = name.partition(".")
+    return os.path.join(head, f"{stem}-worker{partition}{dot}{ext}")
+
+
+def run_worker(index, partition, partitions, outbox, mode=CLUSTER_MODE, topics=MQTT_TOPICS):
+    """Worker process: an async listener writing through the storage process."""
+    # Imported here so the spool directory is set before anything opens one
+    from app.mqtt.async_listener import AsyncMQTTListener, run_listener
+    from app.spool import close_spools, set_spool_dir
+    from app.telemetry.server import start_metrics_server, start_summary_log
+
+    if SPOOL_DIR is not None:
+        set_spool_dir(os.path.join(SPOOL_DIR, f"worker-{partition}"))
+    if TELEMETRY_PORT:
+        start_metrics_server(TELEMETRY_HOST, TELEMETRY_PORT + 1 + index)
+    if TELEMETRY_SUMMARY_INTERVAL:
+        start_summary_log()
+
+    options = {}
+    if mode == "shared":
+        options["share_group"] = CLUSTER_SHARE_GROUP
+        options["protocol"] = mqtt.MQTTv5
+    else:
+        options["accept"] = PartitionFilter(partition, partitions)
+
+    writer = QueueWriter(outbox)
+    listener = AsyncMQTTListener(
+        topics,
+        writer=writer,
+        client_id=f"ingest-{os.getpid()}-{partition}",
+        snapshot_path=_worker_path(STATE_SNAPSHOT_PATH, partition),
+        **options,
+    )
+    print(f"👷 Worker {index} serving partition {partition}/{partitions} ({mode})")
+    try:
+        run_listener(listener)
+    finally:
+        writer.close()
+        close_spools()
+
+
+class _Process:
+    """A child process restarted with a growing delay whenever it dies."""
+
+    def __init__(self, ctx, name, target, args):
+        self.ctx = ctx
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.delay = CLUSTER_RESTART_DELAY
+        self.restart_at = 0.0
+        self.started_at = 0.0
+
+    def start(self):
+        self.process = self.ctx.Process(target=self.target, args=self.args, name=self.name)
+        self.process.start()
+        self.started_at = time.monotonic()
+
+    def check(self, now):
+        """Restart the process if it exited; returns False while waiting."""
+        if self.process.is_alive():
+            # A process that stayed up for a while starts over with a short delay
+            if now - self.started_at > _MAX_RESTART_DELAY:
+                self.delay = CLUSTER_RESTART_DELAY
+            return True
+        if not self.restart_at:
+            print(f"⚠️ {self.name} exited (code {self.process.exitcode}), restarting in {self.delay:.0f}s")
+            self.restart_at = now + self.delay
+            self.delay = min(self.delay * 2, _MAX_RESTART_DELAY)
+        if now < self.restart_at:
+            return False
+        self.restart_at = 0.0
+        self.start()
+        return True
+
+    def terminate(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+
+    def join(self, timeout=None):
+        if self.process is not None:
+            self.process.join(timeout)
+
+
+def run_cluster(workers=CLUSTER_WORKERS, mode=CLUSTER_MODE, topics=MQTT_TOPICS):
+    """Run the storage process and `workers` listeners until SIGINT / SIGTERM."""
+    if mode not in ("partition", "shared"):
+        raise ValueError(f"Unknown CLUSTER_MODE {mode!r}")
+    if not topic_is_device(topics):
+        # One topic for every device: all of them would land on one partition
+        raise ValueError(
+            f"Cluster mode needs per-device topics, got MQTT_TOPICS={topics!r}; "
+            "use one topic per device or a wildcard (e.g. omar/factory/+/sensors)"
+        )
+    partitions = CLUSTER_PARTITIONS or workers
+    if CLUSTER_FIRST_PARTITION + workers > partitions:
+        raise ValueError(
+            f"Partitions {CLUSTER_FIRST_PARTITION}..{CLUSTER_FIRST_PARTITION + workers - 1} "
+            f"out of range for {partitions} partition(s)"
+        )
+
+    # spawn: no paho sockets, threads or SQLite handles inherited from the parent
+    ctx = multiprocessing.get_context("spawn")
+    inbox = ctx.Queue(CLUSTER_STORAGE_QUEUE_SIZE)
+    storage = _Process(ctx, "storage", run_storage, (inbox,))
+    pool = [
+        _Process(ctx, f"worker-{i}", run_worker, (i, CLUSTER_FIRST_PARTITION + i, partitions, inbox, mode, topics))
+        for i in range(workers)
+    ]
+
+    stopping = threading.Event()
+    previous = {sig: signal.signal(sig, lambda *_: stopping.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+    storage.start()
+    for worker in pool:
+        worker.start()
+    print(f"🧩 Cluster up: {workers} worker(s), mode {mode}")
+    try:
+        while not stopping.wait(_POLL_INTERVAL):
+            now = time.monotonic()
+            storage.check(now)
+            for worker in pool:
+                worker.check(now)
+    finally:
+        # Workers drain into the queue first; then storage writes what is left
+        for worker in pool:
+            worker.terminate()
+        for worker in pool:
+            worker.join()
+        if storage.process.is_alive():
+            inbox.put(STOP)
+            storage.join()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        print("🧩 Cluster stopped")
@@ -6,9 +6,146 @@ MQTT_VENTILATION_TOPIC = "omar/factory/ventilation"
 MQTT_UNITY_TOPIC = "omar/factory/unity" 
 MQTT_UNITY_ALERT_TOPIC = "omar/factory/unity/alerts"
 
+# Sensor topics served by the asyncio listener ("+"/"#" wildcards allowed);
+# with several topics or a wildcard the topic doubles as the device id
+MQTT_TOPICS = [MQTT_TOPIC]
+MQTT_DEFAULT_QOS = 0
+MQTT_TOPIC_QOS = {
+    MQTT_TOPIC: 0,
+    MQTT_VENTILATION_TOPIC: 0,
+    MQTT_UNITY_TOPIC: 0,
+    MQTT_UNITY_ALERT_TOPIC: 0,
+}
+MQTT_KEEPALIVE = 60
+MQTT_ASYNC = False                # main.py: asyncio listener instead of loop_forever
+MQTT_MAX_INFLIGHT = 100           # unacknowledged QoS>0 publishes kept in flight
+MQTT_RECONNECT_MIN_DELAY = 1      # seconds, doubled after every failed attempt
+MQTT_RECONNECT_MAX_DELAY = 60
+
+# Multi-process ingestion (app/cluster): 0 = one in-process listener as before.
+# Each worker is an async listener on MQTT_TOPICS; the device is the topic.
+CLUSTER_WORKERS = 0
+CLUSTER_MODE = "partition"        # "partition": every worker receives every message and keeps
+                                  # the devices whose topic hashes to it (any broker);
+                                  # "shared": MQTT v5 shared subscription, the broker splits the
+                                  # stream (per-device state needs a hash-by-topic dispatch)
+CLUSTER_SHARE_GROUP = "ingest"
+CLUSTER_PARTITIONS = None         # partitions over all machines (None = CLUSTER_WORKERS)
+CLUSTER_FIRST_PARTITION = 0       # partition of this machine's first worker
+CLUSTER_STORAGE_QUEUE_SIZE = 1000 # batches waiting for the storage process
+CLUSTER_RESTART_DELAY = 2.0       # seconds before a crashed process is restarted (doubles, max 60)
+
+# Local broker stand-in (app/mqtt/local_broker.py, `manage.py broker`)
+LOCAL_BROKER_HOST = "127.0.0.1"
+LOCAL_BROKER_PORT = 1883
+
+# Change-only publishing (app/mqtt/publisher.py)
+MQTT_SYNC_TOPIC = "omar/factory/sync"   # any message here re-sends every topic's full state
+MQTT_KEYFRAME_INTERVAL = 30             # seconds between full payloads on an unchanged topic
+MQTT_PUBLISH_POLICY = {
+    MQTT_VENTILATION_TOPIC: {"mode": "change", "retain": True},
+    MQTT_UNITY_TOPIC: {"mode": "change", "retain": True},
+    # Alerts are events: never retained, and a new value alone is not a change
+    MQTT_UNITY_ALERT_TOPIC: {"mode": "change", "retain": False, "ignore": ("predicted_value",)},
+}
+
 # DB paths
 SENSOR_DB_PATH = "db/sensor_data.db"
 METRICS_DB_PATH = "db/metrics.db"
 ALERTS_DB_PATH = "db/alerts.db"
 VENTILATION_DB_PATH = "db/ventilation.db"
 
+# "split": the four databases above; "unified": one database with integer
+# timestamps, enum tables and reading_id links (app/db/unified_db.py)
+STORAGE_MODE = "split"
+UNIFIED_DB_PATH = "db/sensors.db"
+
+# Columnar archive (app/archive, `manage.py archive`): one directory of .npy
+# columns per table and UTC day, indexed by manifest.json
+ARCHIVE_DIR = "db/archive"
+
+# DB writer (group commit)
+DB_COMMIT_MAX_ROWS = 500      # flush once this many rows are pending
+DB_COMMIT_MAX_DELAY = 1.0     # ... or once the oldest pending row is this old (s)
+DB_BUSY_TIMEOUT_MS = 5000
+
+# Ingest pipeline
+INGEST_QUEUE_SIZE = 10000     # raw payloads waiting to be decoded
+PIPELINE_QUEUE_SIZE = 1000    # per-stage queue between workers
+PIPELINE_STATS_INTERVAL = 60  # seconds between queue depth logs (0 = off)
+MAX_BATCH_SAMPLES = 1000      # readings accepted in one batched message
+
+# Priority scheduling (app/mqtt/priority.py): urgent readings and HVAC commands
+# first, routine (all-green) readings shed to raw-only storage under overload
+PRIORITY_INGEST = True
+PRIORITY_NEAR_DANGER = 0.8    # fraction of the first "high" band's lower bound that counts as urgent
+PRIORITY_SHED_WATERMARK = 0.5 # evaluate queue fill from which routine readings are coalesced
+
+# Spools (app/spool): memory-mapped files holding what a sink could not take
+# yet, replayed once it recovers. None = off (drop as before)
+SPOOL_DIR = "db/spool"
+SPOOL_MAX_BYTES = {
+    "ingest": 64 * 1024 * 1024,     # raw payloads the ingest queue had no room for
+    "storage": 256 * 1024 * 1024,   # DB rows while SQLite is locked / the disk is full
+    "outbound": 16 * 1024 * 1024,   # publishes while the broker is unreachable
+}
+SPOOL_OVERFLOW = {                  # drop_oldest | drop_newest | error (keep in memory)
+    "ingest": "drop_newest",
+    "storage": "error",
+    "outbound": "drop_oldest",
+}
+SPOOL_SYNC_INTERVAL = 1.0           # seconds between msyncs of a spool file
+SPOOL_RETRY_INTERVAL = 1.0          # seconds between retries of a failing DB
+
+# Trend forecasts (app/metrics/forecast.py), fed to the HVAC rules and Unity alerts
+FORECAST_HORIZON = 5 * 60     # seconds ahead
+FORECAST_ALPHA = 0.5          # level smoothing per sample
+FORECAST_BETA = 0.2           # slope smoothing per sample
+FORECAST_MAX_GAP = 10 * 60    # a longer gap between samples restarts the trend
+
+# WBGT lookup table (app/metrics/wbgt_lut.py); outside it the Stull formula is used
+WBGT_USE_LUT = False                # vectorized WBGT (app/metrics/batch.py) from the table; values
+                                    # then differ from the live (scalar) path by up to WBGT_LUT_MAX_ERROR
+WBGT_LUT_TEMP_RANGE = (0.0, 50.0)   # °C
+WBGT_LUT_TEMP_STEP = 0.5
+WBGT_LUT_RH_RANGE = (5.0, 100.0)    # % (below 5 % Stull bends too sharply to interpolate)
+WBGT_LUT_RH_STEP = 1.0
+WBGT_LUT_MAX_ERROR = 0.005          # °C, checked against Stull when the table is built
+
+# HVAC policy (app/hvac/rules.py): JSON rules files, None = built-in table
+HVAC_RULES_PATH = None
+HVAC_ZONE_RULES = {}          # zone (device id) -> rules file for that zone
+
+# Warm restart (app/state/snapshot.py)
+STATE_SNAPSHOT_PATH = "db/state.json.gz"
+STATE_SNAPSHOT_INTERVAL = 60  # seconds between snapshots (0 = off)
+
+# Hot state cache (app/state/hot_cache.py), served by the query API
+HOT_CACHE_READINGS = 720      # recent readings kept per device (12 h at one a minute)
+HOT_CACHE_MAX_DEVICES = 1000  # least recently updated devices are evicted beyond this
+
+# Exposure windows: a sample never accounts for more than this many seconds;
+# longer gaps between samples count as unmeasured (zero exposure).
+EXPOSURE_MAX_GAP = 120
+
+# Alert episodes (de-duplication / hysteresis)
+ALERT_ENTER_READINGS = 2          # consecutive readings before an episode opens or de-escalates
+                                  # (critical opens at once)
+ALERT_EXIT_HOLD = 120             # seconds a condition must stay clear before the episode closes
+ALERT_RENOTIFY_INTERVAL = 15 * 60 # seconds between summary rows while an episode stays open
+
+# Rollups (bucket name -> width in seconds)
+ROLLUP_RESOLUTIONS = {"1m": 60, "1h": 60 * 60, "1d": 24 * 60 * 60}
+
+# Query API (read-only HTTP access to the stores)
+QUERY_API_ENABLED = False     # start it next to the MQTT listener in main.py (not in cluster mode)
+QUERY_API_HOST = "127.0.0.1"
+QUERY_API_PORT = 8080
+QUERY_API_PAGE_SIZE = 500     # default rows per page
+QUERY_API_MAX_PAGE_SIZE = 5000
+QUERY_API_WORKERS = 4         # threads running queries = read-only connections kept per DB
+
+# Telemetry (app/telemetry)
+TELEMETRY_HOST = "127.0.0.1"
+TELEMETRY_PORT = 9108              # Prometheus text at /metrics (0 = no endpoint)
+TELEMETRY_SUMMARY_INTERVAL = 60    # seconds between stage latency log lines (0 = off)
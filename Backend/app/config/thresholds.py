@@ -72,4 +72,8 @@ WBGT_THRESHOLDS = {
     "red": (31, 33),
     "dark_red": (33, 35),
     "purple": (35, 100),
-}
\ No newline at end of file
+}
+
+# CO exposure windows (seconds)
+CO_STEL_WINDOW = 15 * 60
+CO_TWA_WINDOW = 8 * 60 * 60
@@ -2,3 +2,6 @@ from .sensor_db import init_sensor_db, insert_sensor_reading
 from .metrics_db import init_metrics_db, insert_metric_record
 from .alerts_db import init_alerts_db, insert_alert_record
 from .ventilation_db import init_ventilation_db, insert_ventilation_record
+from .rollups_db import init_rollups_db
+from .unified_db import init_unified_db
+from .writer import DBWriter, UnifiedDBWriter, get_writer
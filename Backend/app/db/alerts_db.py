@@ -1,9 +1,15 @@
-import sqlite3
 from app.config.config import ALERTS_DB_PATH
+from app.db.connection import connect, get_connection
 
 
-def init_alerts_db():
-    conn = sqlite3.connect(ALERTS_DB_PATH)
+ALERT_INSERT_SQL = """
+    INSERT INTO alerts (timestamp, category, value, limit_value, severity, message, state)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_alerts_db(path=ALERTS_DB_PATH):
+    conn = connect(path)
     cur = conn.cursor()
 
     cur.execute("""
@@ -14,28 +20,36 @@ def init_alerts_db():
             value REAL NOT NULL,
             limit_value REAL NOT NULL,
             severity TEXT NOT NULL,
-            message TEXT NOT NULL
+            message TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'open'
         )
     """)
 
+    # Databases created before alert episodes existed lack the state column
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(alerts)")}
+    if "state" not in columns:
+        cur.execute("ALTER TABLE alerts ADD COLUMN state TEXT NOT NULL DEFAULT 'open'")
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_category_timestamp ON alerts (category, timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_severity_timestamp ON alerts (severity, timestamp)")
+
     conn.commit()
     conn.close()
 
 
-def insert_alert_record(alert):
-    conn = sqlite3.connect(ALERTS_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO alerts (timestamp, category, value, limit_value, severity, message)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
+def alert_row(alert):
+    return (
         alert["timestamp"], alert["category"], alert["value"],
-        alert["limit"], alert["severity"], alert["message"]
-    ))
+        alert["limit"], alert["severity"], alert["message"],
+        alert.get("state", "open")
+    )
+
 
+def insert_alert_record(alert):
+    conn = get_connection(ALERTS_DB_PATH)
+    conn.execute(ALERT_INSERT_SQL, alert_row(alert))
     conn.commit()
-    conn.close()
 
 # Backward-compatible alias used by some call sites/documentation
 def insert_alert(alert):
@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+
+from app.config.config import DB_BUSY_TIMEOUT_MS
+
+
+_local = threading.local()
+
+
+def connect(path, check_same_thread=True):
+    """Open a SQLite connection tuned for the ingest workload (WAL mode)."""
+    conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    return conn
+
+
+def get_connection(path):
+    """Return a long-lived connection to `path` owned by the calling thread."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = connect(path)
+    return conn
+
+
+def close_connections():
+    """Close every pooled connection opened by the calling thread."""
+    conns = getattr(_local, "conns", None) or {}
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
+
+
+def connect_read_only(path):
+    """Open `path` read-only; readers never take the write lock."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    return conn
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_missing_columns(conn, table, columns):
+    """ALTER TABLE ADD COLUMN for each (name, type) the table does not have
+    yet (databases created before the column existed); returns the names added."""
+    existing = set(table_columns(conn, table))
+    added = []
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            added.append(name)
+    return added
+
+
+def select_list(conn, table, columns):
+    """`columns` as a SELECT list, NULL for those missing from an older schema."""
+    existing = set(table_columns(conn, table))
+    return ", ".join(c if c in existing else f"NULL AS {c}" for c in columns)
@@ -1,9 +1,15 @@
-import sqlite3
 from app.config.config import METRICS_DB_PATH
+from app.db.connection import connect, get_connection
 
 
-def init_metrics_db():
-    conn = sqlite3.connect(METRICS_DB_PATH)
+METRIC_INSERT_SQL = """
+    INSERT INTO metrics (timestamp, metric_type, value, window, limit_value, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_metrics_db(path=METRICS_DB_PATH):
+    conn = connect(path)
     cur = conn.cursor()
 
     cur.execute("""
@@ -17,22 +23,21 @@ def init_metrics_db():
             status TEXT NOT NULL
         )
     """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_metrics_type_timestamp ON metrics (metric_type, timestamp)")
 
     conn.commit()
     conn.close()
 
 
-def insert_metric_record(m):
-    conn = sqlite3.connect(METRICS_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO metrics (timestamp, metric_type, value, window, limit_value, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
+def metric_row(m):
+    return (
         m["timestamp"], m["type"], m["value"],
         m["window"], m["limit"], m["status"]
-    ))
+    )
+
 
+def insert_metric_record(m):
+    conn = get_connection(METRICS_DB_PATH)
+    conn.execute(METRIC_INSERT_SQL, metric_row(m))
     conn.commit()
-    conn.close()
@@ -0,0 +1,144 @@
+"""
+Copy the four split databases into the unified schema.
+
+Readings keep their ids. The split stores have no key linking a derived
+row to its reading, so each metric/alert/ventilation row is attached to
+the latest reading at or before its timestamp (normally the reading with
+the same timestamp). Rows older than the first reading cannot be linked
+and are counted as skipped.
+"""
+
+import json
+import os
+from bisect import bisect_right
+
+from app.config.config import (
+    ALERTS_DB_PATH,
+    METRICS_DB_PATH,
+    SENSOR_DB_PATH,
+    UNIFIED_DB_PATH,
+    VENTILATION_DB_PATH,
+)
+from app.db.connection import connect_read_only, select_list
+from app.db.rollups_db import rollup_row
+from app.db.unified_db import init_unified_db
+from app.db.writer import UnifiedDBWriter
+from app.utils.time_utils import to_epoch
+
+_FETCH_SIZE = 5000
+
+
+def _stream(path, table, columns):
+    """Rows of `table` in id order; nothing if the database or table is missing."""
+    if not os.path.exists(path):
+        return
+    conn = connect_read_only(path)
+    try:
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone():
+            return
+        cur = conn.execute(f"SELECT {select_list(conn, table, columns)} FROM {table} ORDER BY id")
+        while True:
+            rows = cur.fetchmany(_FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        conn.close()
+
+
+def migrate_to_unified(
+    sensor_path=SENSOR_DB_PATH,
+    metrics_path=METRICS_DB_PATH,
+    alerts_path=ALERTS_DB_PATH,
+    ventilation_path=VENTILATION_DB_PATH,
+    target_path=UNIFIED_DB_PATH,
+    overwrite=False,
+):
+    if os.path.exists(target_path):
+        if not overwrite:
+            raise FileExistsError(f"{target_path} exists (use overwrite to replace it)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(target_path + suffix):
+                os.remove(target_path + suffix)
+    init_unified_db(target_path)
+
+    writer = UnifiedDBWriter(target_path, max_rows=50000, max_delay=float("inf"))
+    totals = {"readings": 0, "metrics": 0, "alerts": 0, "ventilation": 0, "rollups": 0, "skipped": 0}
+
+    # Readings are written in id order; keep (epoch, id) to link derived rows
+    epochs, ids = [], []
+    for reading in _stream(
+        sensor_path, "sensor_readings",
+        ("id", "timestamp", "temp", "pressure", "co_mean", "co_max", "co_valid",
+         "pm2_5", "pm10", "co2", "humidity", "device_id"),
+    ):
+        try:
+            t = to_epoch(reading["timestamp"])
+        except (TypeError, ValueError):
+            totals["skipped"] += 1
+            continue
+        writer.add("sensor", reading)
+        epochs.append(t)
+        ids.append(reading["id"])
+        totals["readings"] += 1
+        writer.maybe_flush()
+
+    order = sorted(range(len(epochs)), key=epochs.__getitem__)
+    epochs = [epochs[i] for i in order]
+    ids = [ids[i] for i in order]
+
+    def _reading_id(ts):
+        try:
+            i = bisect_right(epochs, to_epoch(ts)) - 1
+        except (TypeError, ValueError):
+            return None
+        return ids[i] if i >= 0 else None
+
+    def _copy(kind, records):
+        for record in records:
+            record["reading_id"] = _reading_id(record["timestamp"])
+            if record["reading_id"] is None:
+                totals["skipped"] += 1
+                continue
+            writer.add(kind, record)
+            totals[kind] += 1
+            writer.maybe_flush()
+
+    _copy("metrics", (
+        {**r, "type": r["metric_type"], "limit": r["limit_value"]}
+        for r in _stream(metrics_path, "metrics",
+                         ("timestamp", "metric_type", "value", "window", "limit_value", "status"))
+    ))
+    _copy("alerts", (
+        {**r, "limit": r["limit_value"]}
+        for r in _stream(alerts_path, "alerts",
+                         ("timestamp", "category", "value", "limit_value", "severity", "message", "state"))
+    ))
+    _copy("ventilation", (
+        {
+            "timestamp": r["timestamp"],
+            "ventilation_mode": r["mode"],
+            "fan_supply_speed": r["fan_supply"],
+            "fan_exhaust_speed": r["fan_exhaust"],
+            "ac_power": r["ac_power"],
+            "reasons": json.loads(r["reasons"]),
+        }
+        for r in _stream(ventilation_path, "ventilation_history",
+                         ("timestamp", "mode", "fan_supply", "fan_exhaust", "ac_power", "reasons"))
+    ))
+
+    for r in _stream(
+        metrics_path, "rollups",
+        ("resolution", "bucket_start", "device_id", "series", "count",
+         "min", "max", "mean", "sum", "band_seconds"),
+    ):
+        r["band_seconds"] = json.loads(r["band_seconds"])
+        writer.add_rows("rollups", [rollup_row(r)])
+        totals["rollups"] += 1
+        writer.maybe_flush()
+
+    writer.close()
+    return totals
@@ -0,0 +1,47 @@
+import json
+
+from app.config.config import METRICS_DB_PATH
+from app.db.connection import connect
+
+
+# Rebuilding a bucket replaces the row written when it first closed
+ROLLUP_INSERT_SQL = """
+    INSERT OR REPLACE INTO rollups
+        (resolution, bucket_start, device_id, series,
+         count, min, max, mean, sum, band_seconds)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_rollups_db(path=METRICS_DB_PATH):
+    conn = connect(path)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rollups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            resolution TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            device_id TEXT NOT NULL DEFAULT '',
+            series TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            min REAL,
+            max REAL,
+            mean REAL,
+            sum REAL,
+            band_seconds TEXT NOT NULL,
+            UNIQUE (resolution, series, device_id, bucket_start)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_rollups_resolution_bucket ON rollups (resolution, bucket_start)")
+
+    conn.commit()
+    conn.close()
+
+
+def rollup_row(r):
+    return (
+        r["resolution"], r["bucket_start"], r.get("device_id") or "", r["series"],
+        r["count"], r["min"], r["max"], r["mean"], r["sum"],
+        json.dumps(r.get("band_seconds", {})),
+    )
@@ -1,9 +1,16 @@
-import sqlite3
 from app.config.config import SENSOR_DB_PATH
+from app.db.connection import add_missing_columns, connect, get_connection
 
 
-def init_sensor_db():
-    conn = sqlite3.connect(SENSOR_DB_PATH)
+SENSOR_INSERT_SQL = """
+    INSERT INTO sensor_readings
+    (timestamp, temp, pressure, co_mean, co_max, co_valid, pm2_5, pm10, co2, humidity, device_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_sensor_db(path=SENSOR_DB_PATH):
+    conn = connect(path)
     cur = conn.cursor()
 
     cur.execute("""
@@ -17,28 +24,31 @@ def init_sensor_db():
             co_valid INTEGER,
             pm2_5 REAL,
             pm10 REAL,
-            co2 REAL
+            co2 REAL,
+            humidity REAL,
+            device_id TEXT
         )
     """)
+    # Databases created before the humidity channel / per-device topics
+    add_missing_columns(conn, "sensor_readings", [("humidity", "REAL"), ("device_id", "TEXT")])
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_timestamp ON sensor_readings (timestamp)")
 
     conn.commit()
     conn.close()
 
 
-def insert_sensor_reading(r):
-    conn = sqlite3.connect(SENSOR_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO sensor_readings
-        (timestamp, temp, pressure, co_mean, co_max, co_valid, pm2_5, pm10, co2)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+def sensor_row(r):
+    return (
         r["timestamp"], r["temp"], r["pressure"],
         r["co_mean"], r["co_max"],
         1 if r["co_valid"] else 0,
-        r["pm2_5"], r["pm10"], r["co2"]
-    ))
+        r["pm2_5"], r["pm10"], r["co2"],
+        r.get("humidity"),
+        r.get("device_id"),
+    )
+
 
+def insert_sensor_reading(r):
+    conn = get_connection(SENSOR_DB_PATH)
+    conn.execute(SENSOR_INSERT_SQL, sensor_row(r))
     conn.commit()
-    conn.close()
@@ -0,0 +1,248 @@
+"""
+Single-database schema (STORAGE_MODE = "unified").
+
+Compared to the four split stores:
+- timestamps are INTEGER epoch seconds, stored once on the reading;
+- repeated strings (metric type / alert category, level, alert state,
+  ventilation mode, metric window) live in small enum tables;
+- metrics, alerts and ventilation rows carry the `reading_id` of the
+  reading that produced them.
+
+The *_v views expose the split-schema column names (ISO `timestamp`,
+`metric_type`, `status`, ...) for readers such as the query API.
+
+Reading and enum ids are assigned by the writer, so derived rows can be
+built and batched before the reading is committed. This assumes a single
+writer process per database, which is how the ingest service runs.
+"""
+
+import json
+
+from app.config.config import UNIFIED_DB_PATH
+from app.db.connection import add_missing_columns, connect
+from app.db.rollups_db import init_rollups_db
+from app.utils.time_utils import to_epoch
+
+ENUM_TABLES = ("categories", "levels", "states", "modes", "windows")
+
+UNIFIED_READING_SQL = """
+    INSERT INTO readings
+        (id, ts, device_id, temp, pressure, co_mean, co_max, co_valid, pm2_5, pm10, co2, humidity)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UNIFIED_METRIC_SQL = """
+    INSERT INTO metrics (reading_id, category_id, window_id, value, limit_value, level_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+UNIFIED_ALERT_SQL = """
+    INSERT INTO alerts (reading_id, category_id, level_id, state_id, value, limit_value, message)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+UNIFIED_VENTILATION_SQL = """
+    INSERT INTO ventilation (reading_id, mode_id, fan_supply, fan_exhaust, ac_power, reasons)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def enum_insert_sql(table):
+    return f"INSERT OR IGNORE INTO {table} (id, name) VALUES (?, ?)"
+
+
+_ISO = "strftime('%Y-%m-%dT%H:%M:%SZ', r.ts, 'unixepoch')"
+
+_VIEWS = {
+    "readings_v": f"""
+        SELECT r.id, r.ts, {_ISO} AS timestamp, r.device_id,
+               r.temp, r.pressure, r.co_mean, r.co_max, r.co_valid, r.pm2_5, r.pm10, r.co2,
+               r.humidity
+        FROM readings r
+    """,
+    "metrics_v": f"""
+        SELECT m.id, r.ts, {_ISO} AS timestamp, m.reading_id,
+               c.name AS metric_type, m.value, w.name AS window,
+               m.limit_value, l.name AS status
+        FROM metrics m
+        JOIN readings r ON r.id = m.reading_id
+        JOIN categories c ON c.id = m.category_id
+        JOIN windows w ON w.id = m.window_id
+        JOIN levels l ON l.id = m.level_id
+    """,
+    "alerts_v": f"""
+        SELECT a.id, r.ts, {_ISO} AS timestamp, a.reading_id,
+               c.name AS category, a.value, a.limit_value, l.name AS severity,
+               a.message, s.name AS state
+        FROM alerts a
+        JOIN readings r ON r.id = a.reading_id
+        JOIN categories c ON c.id = a.category_id
+        JOIN levels l ON l.id = a.level_id
+        JOIN states s ON s.id = a.state_id
+    """,
+    "ventilation_v": f"""
+        SELECT v.id, r.ts, {_ISO} AS timestamp, v.reading_id,
+               md.name AS mode, v.fan_supply, v.fan_exhaust, v.ac_power, v.reasons
+        FROM ventilation v
+        JOIN readings r ON r.id = v.reading_id
+        JOIN modes md ON md.id = v.mode_id
+    """,
+}
+
+
+def init_unified_db(path=UNIFIED_DB_PATH):
+    conn = connect(path)
+    cur = conn.cursor()
+
+    for table in ENUM_TABLES:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            device_id TEXT,
+            temp REAL,
+            pressure REAL,
+            co_mean REAL,
+            co_max REAL,
+            co_valid INTEGER,
+            pm2_5 REAL,
+            pm10 REAL,
+            co2 REAL,
+            humidity REAL
+        )
+    """)
+    if add_missing_columns(conn, "readings", [("humidity", "REAL")]):
+        # Created before the humidity channel: rebuild the view to include it
+        cur.execute("DROP VIEW IF EXISTS readings_v")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY,
+            reading_id INTEGER NOT NULL REFERENCES readings(id),
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            window_id INTEGER NOT NULL REFERENCES windows(id),
+            value REAL NOT NULL,
+            limit_value REAL NOT NULL,
+            level_id INTEGER NOT NULL REFERENCES levels(id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY,
+            reading_id INTEGER NOT NULL REFERENCES readings(id),
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            level_id INTEGER NOT NULL REFERENCES levels(id),
+            state_id INTEGER NOT NULL REFERENCES states(id),
+            value REAL NOT NULL,
+            limit_value REAL NOT NULL,
+            message TEXT NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ventilation (
+            id INTEGER PRIMARY KEY,
+            reading_id INTEGER NOT NULL REFERENCES readings(id),
+            mode_id INTEGER NOT NULL REFERENCES modes(id),
+            fan_supply INTEGER NOT NULL,
+            fan_exhaust INTEGER NOT NULL,
+            ac_power INTEGER NOT NULL,
+            reasons TEXT NOT NULL
+        )
+    """)
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_metrics_reading ON metrics (reading_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_metrics_category ON metrics (category_id, reading_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_reading ON alerts (reading_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_category ON alerts (category_id, reading_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_level ON alerts (level_id, reading_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ventilation_reading ON ventilation (reading_id)")
+
+    for name, select in _VIEWS.items():
+        cur.execute(f"CREATE VIEW IF NOT EXISTS {name} AS {select}")
+
+    conn.commit()
+    conn.close()
+    init_rollups_db(path)
+
+
+class UnifiedRows:
+    """Builds unified rows, assigning reading and enum ids locally.
+
+    New enum values are returned as extra ("enum:<table>", (id, name)) rows
+    that must be written before (or with) the rows referencing them.
+    """
+
+    def __init__(self, path=UNIFIED_DB_PATH):
+        self.path = path
+        self.next_reading_id = None
+        self.enums = {}
+
+    def load(self):
+        conn = connect(self.path)
+        try:
+            self.next_reading_id = (conn.execute("SELECT MAX(id) FROM readings").fetchone()[0] or 0) + 1
+            self.enums = {
+                table: dict(conn.execute(f"SELECT name, id FROM {table}").fetchall())
+                for table in ENUM_TABLES
+            }
+        finally:
+            conn.close()
+
+    def enum_id(self, table, name, out):
+        ids = self.enums[table]
+        enum_id = ids.get(name)
+        if enum_id is None:
+            enum_id = ids[name] = len(ids) + 1
+            out.append((f"enum:{table}", (enum_id, name)))
+        return enum_id
+
+    def reading(self, reading, out):
+        """Append the reading row to `out`; returns its id."""
+        reading_id = reading.get("id")
+        if reading_id is None:
+            reading_id = self.next_reading_id
+        self.next_reading_id = max(self.next_reading_id, reading_id + 1)
+        out.append(("sensor", (
+            reading_id,
+            int(round(to_epoch(reading["timestamp"]))),
+            reading.get("device_id"),
+            reading["temp"], reading["pressure"],
+            reading["co_mean"], reading["co_max"],
+            1 if reading["co_valid"] else 0,
+            reading["pm2_5"], reading["pm10"], reading["co2"],
+            reading.get("humidity"),
+        )))
+        return reading_id
+
+    def metric(self, reading_id, m, out):
+        out.append(("metrics", (
+            reading_id,
+            self.enum_id("categories", m["type"], out),
+            self.enum_id("windows", m["window"], out),
+            m["value"], m["limit"],
+            self.enum_id("levels", m["status"], out),
+        )))
+
+    def alert(self, reading_id, alert, out):
+        out.append(("alerts", (
+            reading_id,
+            self.enum_id("categories", alert["category"], out),
+            self.enum_id("levels", alert["severity"], out),
+            self.enum_id("states", alert.get("state", "open"), out),
+            alert["value"], alert["limit"], alert["message"],
+        )))
+
+    def ventilation(self, reading_id, record, out):
+        out.append(("ventilation", (
+            reading_id,
+            self.enum_id("modes", record["ventilation_mode"], out),
+            record["fan_supply_speed"], record["fan_exhaust_speed"], record["ac_power"],
+            json.dumps(list(record.get("reasons", ()))),
+        )))
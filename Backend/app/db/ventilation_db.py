@@ -1,11 +1,18 @@
 import json
-import sqlite3
 
 from app.config.config import VENTILATION_DB_PATH
+from app.db.connection import connect, get_connection
 
 
-def init_ventilation_db():
-    conn = sqlite3.connect(VENTILATION_DB_PATH)
+VENTILATION_INSERT_SQL = """
+    INSERT INTO ventilation_history
+        (timestamp, mode, fan_supply, fan_exhaust, ac_power, reasons)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_ventilation_db(path=VENTILATION_DB_PATH):
+    conn = connect(path)
     cur = conn.cursor()
 
     cur.execute(
@@ -21,30 +28,24 @@ def init_ventilation_db():
         )
         """
     )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ventilation_timestamp ON ventilation_history (timestamp)")
 
     conn.commit()
     conn.close()
 
 
-def insert_ventilation_record(record):
-    conn = sqlite3.connect(VENTILATION_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        INSERT INTO ventilation_history
-            (timestamp, mode, fan_supply, fan_exhaust, ac_power, reasons)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (
-            record["timestamp"],
-            record["ventilation_mode"],
-            record["fan_supply_speed"],
-            record["fan_exhaust_speed"],
-            record["ac_power"],
-            json.dumps(record.get("reasons", [])),
-        ),
+def ventilation_row(record):
+    return (
+        record["timestamp"],
+        record["ventilation_mode"],
+        record["fan_supply_speed"],
+        record["fan_exhaust_speed"],
+        record["ac_power"],
+        json.dumps(list(record.get("reasons", ()))),
     )
 
-    conn.commit()
-    conn.close()
\ No newline at end of file
+
+def insert_ventilation_record(record):
+    conn = get_connection(VENTILATION_DB_PATH)
+    conn.execute(VENTILATION_INSERT_SQL, ventilation_row(record))
+    conn.commit()
\ No newline at end of file
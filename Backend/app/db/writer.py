@@ -0,0 +1,407 @@
+"""
+Group-commit writer for the SQLite stores.
+
+Rows are buffered in memory and written with one transaction per database
+once DB_COMMIT_MAX_ROWS rows are pending or the oldest pending row is older
+than DB_COMMIT_MAX_DELAY seconds. Connections stay open (WAL mode) for the
+lifetime of the writer instead of being reopened for every insert.
+
+With a spool (app/spool), rows that cannot be written (database locked,
+disk full) go to the spool instead of staying in memory. While it holds
+rows, the database is retried every SPOOL_RETRY_INTERVAL seconds and newer
+rows are spooled behind them; once a write succeeds the spooled rows are
+written back first, oldest first.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from app.config.config import (
+    ALERTS_DB_PATH,
+    DB_COMMIT_MAX_DELAY,
+    DB_COMMIT_MAX_ROWS,
+    METRICS_DB_PATH,
+    SENSOR_DB_PATH,
+    SPOOL_RETRY_INTERVAL,
+    STORAGE_MODE,
+    UNIFIED_DB_PATH,
+    VENTILATION_DB_PATH,
+)
+from app.db.alerts_db import ALERT_INSERT_SQL, alert_row
+from app.db.connection import connect
+from app.db.metrics_db import METRIC_INSERT_SQL, metric_row
+from app.db.rollups_db import ROLLUP_INSERT_SQL, rollup_row
+from app.db.sensor_db import SENSOR_INSERT_SQL, sensor_row
+from app.db.unified_db import (
+    ENUM_TABLES,
+    UNIFIED_ALERT_SQL,
+    UNIFIED_METRIC_SQL,
+    UNIFIED_READING_SQL,
+    UNIFIED_VENTILATION_SQL,
+    UnifiedRows,
+    enum_insert_sql,
+)
+from app.db.ventilation_db import VENTILATION_INSERT_SQL, ventilation_row
+from app.spool import SpoolFull, get_spool
+from app.telemetry.metrics import DB_ROWS, DB_WRITE_SECONDS
+
+
+DEFAULT_DB_PATHS = {
+    "sensor": SENSOR_DB_PATH,
+    "metrics": METRICS_DB_PATH,
+    "alerts": ALERTS_DB_PATH,
+    "ventilation": VENTILATION_DB_PATH,
+    "rollups": METRICS_DB_PATH,
+}
+
+# kind -> (INSERT statement, row builder)
+_STATEMENTS = {
+    "sensor": (SENSOR_INSERT_SQL, sensor_row),
+    "metrics": (METRIC_INSERT_SQL, metric_row),
+    "alerts": (ALERT_INSERT_SQL, alert_row),
+    "ventilation": (VENTILATION_INSERT_SQL, ventilation_row),
+    "rollups": (ROLLUP_INSERT_SQL, rollup_row),
+}
+
+
+def _pad_rows(rows, width):
+    """Rows spooled before a column was appended to the table get NULL for it."""
+    if all(len(row) == width for row in rows):
+        return rows
+    return [row + [None] * (width - len(row)) for row in rows]
+
+
+class DBWriter:
+    statements = _STATEMENTS
+
+    def __init__(
+        self,
+        paths=None,
+        max_rows=DB_COMMIT_MAX_ROWS,
+        max_delay=DB_COMMIT_MAX_DELAY,
+        spool=None,
+        retry_interval=SPOOL_RETRY_INTERVAL,
+    ):
+        self.paths = dict(paths or DEFAULT_DB_PATHS)
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._replayed = set()   # kinds of the oldest spooled record already written
+
+        self._pending = {kind: [] for kind in self.statements}
+        self._pending_count = 0
+        self._oldest = None
+        self._conns = {}
+        self.rejected = 0   # rows dropped because they violate a constraint
+
+        self._lock = threading.Lock()       # guards the pending buffers
+        self._io_lock = threading.Lock()    # serializes flushes
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------
+    # Buffering
+    # ------------------------------------------------
+    def _extend(self, rows):
+        with self._lock:
+            for kind, row in rows:
+                self._pending[kind].append(row)
+            self._pending_count += len(rows)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def add(self, kind, record):
+        self._extend([(kind, self.statements[kind][1](record))])
+
+    def add_rows(self, kind, rows):
+        """Queue rows already built with the table's row builder."""
+        self._extend([(kind, row) for row in rows])
+
+    def add_sensor_reading(self, reading):
+        self.add("sensor", reading)
+
+    def add_metric(self, metric):
+        self.add("metrics", metric)
+
+    def add_alert(self, alert):
+        self.add("alerts", alert)
+
+    def add_ventilation(self, record):
+        self.add("ventilation", record)
+
+    def _reading_rows(self, rows, reading, metrics=(), alerts=(), ventilation=None, rollups=()):
+        rows.append(("sensor", sensor_row(reading)))
+        rows.extend(("metrics", metric_row(m)) for m in metrics)
+        rows.extend(("alerts", alert_row(a)) for a in alerts)
+        if ventilation is not None:
+            rows.append(("ventilation", ventilation_row(ventilation)))
+        rows.extend(("rollups", rollup_row(r)) for r in rollups)
+
+    def write_reading(self, reading, metrics=(), alerts=(), ventilation=None, rollups=()):
+        """Queue every row produced by one reading, then flush if due."""
+        self.write_readings([(reading, metrics, alerts, ventilation, rollups)])
+
+    def write_readings(self, items):
+        """Queue the rows of a batch of readings (`write_reading` argument
+        tuples) at once, so one flush writes all of them, then flush if due.
+        """
+        rows = []
+        for item in items:
+            self._reading_rows(rows, *item)
+        self._extend(rows)
+        self.maybe_flush()
+
+    def pending(self):
+        return self._pending_count
+
+    # ------------------------------------------------
+    # Flushing
+    # ------------------------------------------------
+    def _due(self):
+        if self.spool is not None and len(self.spool) and time.monotonic() >= self._retry_at:
+            return True
+        if self._pending_count == 0:
+            return False
+        if self._pending_count >= self.max_rows:
+            return True
+        return time.monotonic() - self._oldest >= self.max_delay
+
+    def maybe_flush(self):
+        if self._due():
+            self.flush()
+
+    def flush(self):
+        """Write all pending rows, one transaction per database."""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {kind: [] for kind in self.statements}
+                self._pending_count = 0
+                self._oldest = None
+
+            if self.spool is not None and len(self.spool):
+                if time.monotonic() < self._retry_at:
+                    self._spill(batch)
+                    return
+                try:
+                    self._replay_spool()
+                except Exception:
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    self._spill(batch)
+                    raise
+
+            done = set()
+            try:
+                for kind, rows in batch.items():
+                    if not rows:
+                        continue
+                    self._write(kind, rows)
+                    done.add(kind)
+            except Exception:
+                rest = {k: r for k, r in batch.items() if k not in done}
+                if self.spool is None:
+                    self._requeue(rest)
+                else:
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    self._spill(rest)
+                raise
+
+    def _spill(self, batch):
+        """Spool rows that could not be written (one record per flush)."""
+        batch = {kind: rows for kind, rows in batch.items() if rows}
+        if not batch:
+            return
+        try:
+            if not self.spool.append(json.dumps(batch).encode()):
+                print(f"❌ Storage spool full, dropped {sum(map(len, batch.values()))} row(s)")
+        except (SpoolFull, ValueError):
+            # No room: keep them in memory, as without a spool
+            self._requeue(batch)
+
+    def _replay_spool(self):
+        """Write the spooled rows back, oldest record first."""
+        replayed = 0
+        while len(self.spool):
+            for record in self.spool.peek(100):
+                batch = json.loads(record)
+                for kind in self.statements:
+                    rows = batch.get(kind)
+                    if rows and kind not in self._replayed:
+                        self._write(kind, _pad_rows(rows, self.statements[kind][0].count("?")))
+                        self._replayed.add(kind)
+                self.spool.discard(1)
+                self._replayed.clear()
+                replayed += 1
+        print(f"✅ Storage recovered: wrote {replayed} spooled batch(es)")
+
+    def _write(self, kind, rows):
+        conn = self._connection(kind)
+        sql = self.statements[kind][0]
+        try:
+            with DB_WRITE_SECONDS.time(kind=kind), conn:
+                conn.executemany(sql, rows)
+            DB_ROWS.inc(len(rows), kind=kind)
+        except sqlite3.IntegrityError:
+            # One bad row must not poison the whole batch: retry row by row
+            # and drop the ones the schema rejects.
+            rejected = 0
+            with conn:
+                for row in rows:
+                    try:
+                        conn.execute(sql, row)
+                    except sqlite3.IntegrityError as e:
+                        rejected += 1
+                        error = e
+            DB_ROWS.inc(len(rows) - rejected, kind=kind)
+            if rejected:
+                self.rejected += rejected
+                print(f"❌ Rejected {rejected} {kind} row(s): {error}")
+
+    def _requeue(self, batch):
+        with self._lock:
+            for kind, rows in batch.items():
+                self._pending[kind][:0] = rows
+                self._pending_count += len(rows)
+            if self._pending_count and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def _connection(self, kind):
+        path = self.paths[kind]
+        conn = self._conns.get(path)
+        if conn is None:
+            conn = self._conns[path] = connect(path, check_same_thread=False)
+        return conn
+
+    # ------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------
+    def start(self):
+        """Start a background thread that enforces the time threshold."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = max(0.05, self.max_delay / 4)
+        while not self._stop.wait(interval):
+            try:
+                self.maybe_flush()
+            except Exception as e:
+                print("❌ DB flush error:", e)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._io_lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+
+# Enum rows come first so every flush writes them before the rows using them
+_UNIFIED_STATEMENTS = {
+    **{f"enum:{table}": (enum_insert_sql(table), None) for table in ENUM_TABLES},
+    "sensor": (UNIFIED_READING_SQL, None),
+    "metrics": (UNIFIED_METRIC_SQL, None),
+    "alerts": (UNIFIED_ALERT_SQL, None),
+    "ventilation": (UNIFIED_VENTILATION_SQL, None),
+    "rollups": (ROLLUP_INSERT_SQL, rollup_row),
+}
+
+
+class UnifiedDBWriter(DBWriter):
+    """DBWriter for the single-database schema (see app/db/unified_db.py).
+
+    Derived records passed to `add` need a "reading_id"; `write_reading`
+    assigns it.
+    """
+
+    statements = _UNIFIED_STATEMENTS
+
+    def __init__(
+        self,
+        path=UNIFIED_DB_PATH,
+        max_rows=DB_COMMIT_MAX_ROWS,
+        max_delay=DB_COMMIT_MAX_DELAY,
+        spool=None,
+        retry_interval=SPOOL_RETRY_INTERVAL,
+    ):
+        super().__init__({kind: path for kind in self.statements}, max_rows, max_delay, spool, retry_interval)
+        self.rows = UnifiedRows(path)
+        self._ids_lock = threading.Lock()
+
+    def _build(self, build):
+        out = []
+        with self._ids_lock:
+            if self.rows.next_reading_id is None:
+                self.rows.load()
+                self._reserve_spooled_ids()
+            build(out)
+        return out
+
+    def _reserve_spooled_ids(self):
+        # Spooled rows (from before a restart) use ids the database does not have yet
+        if self.spool is None:
+            return
+        for record in self.spool.peek():
+            batch = json.loads(record)
+            for row in batch.get("sensor", ()):
+                self.rows.next_reading_id = max(self.rows.next_reading_id, row[0] + 1)
+            for table in ENUM_TABLES:
+                for enum_id, name in batch.get(f"enum:{table}", ()):
+                    self.rows.enums[table].setdefault(name, enum_id)
+
+    def add(self, kind, record):
+        if kind == "rollups":
+            super().add(kind, record)
+            return
+        if kind == "sensor":
+            rows = self._build(lambda out: self.rows.reading(record, out))
+        else:
+            build = {
+                "metrics": self.rows.metric,
+                "alerts": self.rows.alert,
+                "ventilation": self.rows.ventilation,
+            }[kind]
+            rows = self._build(lambda out: build(record["reading_id"], record, out))
+        self._extend(rows)
+
+    def _reading_rows(self, rows, reading, metrics=(), alerts=(), ventilation=None, rollups=()):
+        # Called by `_build`, with the id lock held
+        reading_id = self.rows.reading(reading, rows)
+        for m in metrics:
+            self.rows.metric(reading_id, m, rows)
+        for a in alerts:
+            self.rows.alert(reading_id, a, rows)
+        if ventilation is not None:
+            self.rows.ventilation(reading_id, ventilation, rows)
+        rows.extend(("rollups", rollup_row(r)) for r in rollups)
+
+    def write_readings(self, items):
+        def build(out):
+            for item in items:
+                self._reading_rows(out, *item)
+
+        self._extend(self._build(build))
+        self.maybe_flush()
+
+
+_default_writer = None
+
+
+def get_writer():
+    """Return the process-wide writer, starting it on first use."""
+    global _default_writer
+    if _default_writer is None:
+        spool = get_spool("storage")
+        _default_writer = UnifiedDBWriter(spool=spool) if STORAGE_MODE == "unified" else DBWriter(spool=spool)
+        _default_writer.start()
+    return _default_writer
@@ -0,0 +1,384 @@
+"""
+Table-driven HVAC policy.
+
+A policy is plain data (JSON-compatible), so a zone-specific policy is a
+rules file rather than code:
+
+    base       actions when no rule fires
+    features   discrete inputs read from the status packet:
+                 [paths]                  worst severity among the paths
+                 {"band": {...}}          "low" / "high" / "normal" for a value
+                                          outside [below, above] while its level
+                                          is one of `levels`
+    rules      applied in order; every key of "when" must match:
+                 set             assign fields (ventilation_mode included)
+                 raise           fields = max(field, value)
+                 add             fields += value
+                 mode_if_normal  switch the mode only if it is still NORMAL
+                 reason          template, e.g. "CO {co.level!u} ({co.value:.1f} ppm)";
+                                 !u upper-cases, paths default like the packet readers
+                 stop            skip the remaining rules
+
+Compiling a policy evaluates the rules for the combinations of feature
+values and keeps the resulting actions and reason templates in a dict keyed
+on the feature tuple: all of them up front when there are at most
+EAGER_COMBINATIONS, otherwise each one the first time it is seen (the
+forecast features make the full product far larger than what a site ever
+visits). Deciding is then a fixed amount of work: read the features, one
+lookup and a copy of the actions. The reasons that apply are rendered only
+when first read (`Reasons`).
+"""
+
+import json
+import threading
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from itertools import product
+from math import prod
+from string import Formatter
+
+from app.config.config import HVAC_RULES_PATH, HVAC_ZONE_RULES
+from app.metrics.classifier import SEVERITIES, SEVERITY_RANK
+
+DANGER = ["high", "critical"]
+NOT_DANGER = ["none", "warning"]
+EAGER_COMBINATIONS = 4096
+
+DEFAULT_POLICY = {
+    "base": {
+        "ventilation_mode": "NORMAL",
+        "fan_supply_speed": 40,
+        "fan_exhaust_speed": 30,
+        "ac_power": 0,
+    },
+    "features": {
+        "co": ["co.severity"],
+        "co2": ["co2.severity"],
+        "pm": ["pm.pm2_5.severity", "pm.pm10.severity"],
+        "heat": ["temp.severity", "wbgt.severity"],
+        "pressure": ["pressure.severity"],
+        "pressure_band": {"band": {
+            "value": "pressure.value", "default": 1015.0,
+            "level": "pressure.level", "levels": ["orange", "red"],
+            "below": 1005, "above": 1025,
+        }},
+        # Severity expected FORECAST_HORIZON ahead (app/metrics/forecast.py)
+        "co_forecast": ["co.predicted_severity"],
+        "co2_forecast": ["co2.predicted_severity"],
+        "pm_forecast": ["pm.pm2_5.predicted_severity", "pm.pm10.predicted_severity"],
+        "heat_forecast": ["temp.predicted_severity", "wbgt.predicted_severity"],
+    },
+    "rules": [
+        # CO is toxic: purge and ignore everything else
+        {"when": {"co": DANGER},
+         "set": {"ventilation_mode": "EMERGENCY_PURGE", "fan_exhaust_speed": 100,
+                 "fan_supply_speed": 40, "ac_power": 0},
+         "reason": "CO {co.level!u} ({co.value:.1f} ppm) → EMERGENCY_PURGE",
+         "stop": True},
+        # Trending into danger: ramp up now to cut the peak
+        {"when": {"co": NOT_DANGER, "co_forecast": DANGER},
+         "raise": {"fan_exhaust_speed": 80, "fan_supply_speed": 50},
+         "reason": "CO rising: {co.predicted_value:.1f} ppm expected → early exhaust"},
+
+        {"when": {"co2": DANGER},
+         "set": {"ventilation_mode": "CO2_PURGE"},
+         "raise": {"fan_supply_speed": 90, "fan_exhaust_speed": 75},
+         "reason": "CO2 {co2.level!u} ({co2.value:.0f} ppm) → increase fresh air"},
+        {"when": {"co2": ["warning"]},
+         "raise": {"fan_supply_speed": 70, "fan_exhaust_speed": 55},
+         "reason": "CO2 warning ({co2.value:.0f} ppm) → boost ventilation"},
+        {"when": {"co2": NOT_DANGER, "co2_forecast": DANGER},
+         "raise": {"fan_supply_speed": 80, "fan_exhaust_speed": 65},
+         "reason": "CO2 rising: {co2.predicted_value:.0f} ppm expected → early fresh air"},
+
+        {"when": {"pm": DANGER},
+         "set": {"ventilation_mode": "DUST_CONTROL", "fan_exhaust_speed": 90,
+                 "fan_supply_speed": 60, "ac_power": 0},
+         "reason": "PM danger: PM2.5={pm.pm2_5.value:.1f}µg/m³ ({pm.pm2_5.level}), "
+                   "PM10={pm.pm10.value:.1f}µg/m³ ({pm.pm10.level})"},
+        {"when": {"pm": ["warning"]},
+         "set": {"ventilation_mode": "DUST_CONTROL"},
+         "raise": {"fan_exhaust_speed": 70, "fan_supply_speed": 50},
+         "reason": "PM warning: PM2.5={pm.pm2_5.value:.1f}µg/m³ ({pm.pm2_5.level}), "
+                   "PM10={pm.pm10.value:.1f}µg/m³ ({pm.pm10.level})"},
+        {"when": {"pm": NOT_DANGER, "pm_forecast": DANGER},
+         "raise": {"fan_exhaust_speed": 80, "fan_supply_speed": 55},
+         "reason": "PM rising: PM2.5={pm.pm2_5.predicted_value:.1f}µg/m³, "
+                   "PM10={pm.pm10.predicted_value:.1f}µg/m³ expected → early exhaust"},
+
+        {"when": {"heat": DANGER},
+         "set": {"ventilation_mode": "HEAT_STRESS"},
+         "raise": {"fan_supply_speed": 80, "fan_exhaust_speed": 60, "ac_power": 80},
+         "reason": "Heat danger: Temp={temp.value:.1f}°C ({temp.level}), WBGT={wbgt.value:.1f}°C ({wbgt.level})"},
+        {"when": {"heat": ["warning"]},
+         "mode_if_normal": "HEAT_STRESS",
+         "raise": {"fan_supply_speed": 60, "fan_exhaust_speed": 50, "ac_power": 50},
+         "reason": "Heat warning: Temp={temp.value:.1f}°C ({temp.level}), WBGT={wbgt.value:.1f}°C ({wbgt.level})"},
+        {"when": {"heat": NOT_DANGER, "heat_forecast": DANGER},
+         "raise": {"fan_supply_speed": 70, "fan_exhaust_speed": 55, "ac_power": 60},
+         "reason": "Heat rising: Temp={temp.predicted_value:.1f}°C, "
+                   "WBGT={wbgt.predicted_value:.1f}°C expected → early cooling"},
+
+        # Supply vs exhaust balance
+        {"when": {"pressure_band": ["low"]},
+         "add": {"fan_supply_speed": 15},
+         "reason": "Low pressure ({pressure.value:.1f} hPa) → increase supply"},
+        {"when": {"pressure_band": ["high"]},
+         "add": {"fan_exhaust_speed": 15},
+         "reason": "High pressure ({pressure.value:.1f} hPa) → increase exhaust"},
+        {"when": {"pressure": DANGER},
+         "mode_if_normal": "PRESSURE_CORRECTION",
+         "reason": "Pressure anomaly severity={pressure.severity}"},
+    ],
+}
+
+_PERCENT_FIELDS = ("fan_supply_speed", "fan_exhaust_speed", "ac_power")
+_BANDS = ("low", "high", "normal")
+_DEFAULTS = {"value": 0.0, "level": "green", "severity": "none",
+             "predicted_value": 0.0, "predicted_severity": "none"}
+
+
+def _getter(path, default=None):
+    """Compile a dotted path into a function reading it from a packet."""
+    keys = tuple(path.split("."))
+    if default is None:
+        default = _DEFAULTS.get(keys[-1])
+    if len(keys) == 2:
+        a, b = keys
+
+        def get(packet):
+            try:
+                return packet[a][b]
+            except (KeyError, TypeError, IndexError):
+                return default
+        return get
+
+    def get(packet):
+        cur = packet
+        try:
+            for key in keys:
+                cur = cur[key]
+        except (KeyError, TypeError, IndexError):
+            return default
+        return cur
+    return get
+
+
+class ReasonTemplate:
+    """A reason format string compiled once; `render` fills it from a packet.
+
+    The fields become item lookups ("{co.value:.1f}" -> "{co[value]:.1f}")
+    so str.format reads the packet directly; a packet missing some of them
+    goes through the per-field getters, which apply the defaults.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.getters = []    # every field, for the slow path
+        self.upper = []      # fields with !u, passed positionally to the fast path
+        fast, slow = [], []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            literal = literal.replace("{", "{{").replace("}", "}}")
+            fast.append(literal)
+            slow.append(literal)
+            if field is None:
+                continue
+            spec = f":{spec}" if spec else ""
+            get = _getter(field)
+            if conversion == "u":
+                get = (lambda g: lambda packet: str(g(packet)).upper())(get)
+                fast.append(f"{{{len(self.upper)}{spec}}}")
+                self.upper.append(get)
+            else:
+                head, *rest = field.split(".")
+                fast.append("{" + head + "".join(f"[{k}]" for k in rest) + spec + "}")
+            slow.append(f"{{{len(self.getters)}{spec}}}")
+            self.getters.append(get)
+        self._fast = "".join(fast).format
+        self._slow = "".join(slow).format
+
+    def render(self, packet):
+        try:
+            return self._fast(*[get(packet) for get in self.upper], **packet)
+        except (KeyError, TypeError, IndexError):
+            return self._slow(*[get(packet) for get in self.getters])
+
+
+_RENDER_LOCK = threading.Lock()
+
+
+class Reasons(Sequence):
+    """The reasons of one decision, rendered on first access.
+
+    Only the stored ventilation rows use them (the published command drops
+    them), so the formatting happens on the persist stage instead of in
+    the evaluate/publish path. The status packet must not change until
+    then; the evaluator builds a new one per reading. The persist stage and
+    the query API (hot cache) may read the same instance, so the first
+    render happens under a lock.
+    """
+
+    __slots__ = ("_templates", "_packet", "_strings")
+
+    def __init__(self, templates, packet):
+        self._templates = templates
+        self._packet = packet
+        self._strings = None
+
+    def _render(self):
+        strings = self._strings
+        if strings is None:
+            with _RENDER_LOCK:
+                if self._strings is None:
+                    self._strings = [t.render(self._packet) for t in self._templates]
+                    self._packet = None
+                strings = self._strings
+        return strings
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __getitem__(self, i):
+        return self._render()[i]
+
+    def __iter__(self):
+        return iter(self._render())
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return self._render() == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self._render())
+
+    def __reduce__(self):
+        # Rendered before crossing to another process (app/cluster/storage.py)
+        return list, (self._render(),)
+
+
+class CompiledPolicy:
+    def __init__(self, policy=DEFAULT_POLICY):
+        self.policy = policy
+        self.features = []   # (name, reader)
+        for name, spec in policy["features"].items():
+            if isinstance(spec, dict):
+                self.features.append((name, self._band_reader(spec["band"])))
+            else:
+                self.features.append((name, self._severity_reader(spec)))
+        self._readers = [read for _, read in self.features]
+        self._templates = {}   # reason text -> ReasonTemplate, shared by the table
+        self.table = self._compile()
+
+    @staticmethod
+    def _severity_reader(paths):
+        ranks = SEVERITY_RANK
+        if len(paths) == 1 and paths[0].count(".") == 1:
+            a, b = paths[0].split(".")
+
+            def read(packet):
+                try:
+                    severity = packet[a][b]
+                except (KeyError, TypeError, IndexError):
+                    return "none"
+                # Anything but a known severity counts as "none"
+                return severity if severity in ranks else "none"
+        else:
+            getters = [_getter(p) for p in paths]
+
+            def read(packet):
+                # Worst known severity
+                worst, worst_rank = "none", 0
+                for get in getters:
+                    severity = get(packet)
+                    rank = ranks.get(severity, 0)
+                    if rank > worst_rank:
+                        worst, worst_rank = severity, rank
+                return worst
+        read.domain = SEVERITIES
+        return read
+
+    @staticmethod
+    def _band_reader(band):
+        get_value = _getter(band["value"], band.get("default", 0.0))
+        get_level = _getter(band["level"])
+        levels = frozenset(band["levels"])
+        below, above = band["below"], band["above"]
+
+        def read(packet):
+            if get_level(packet) not in levels:
+                return "normal"
+            value = get_value(packet)
+            if value < below:
+                return "low"
+            if value > above:
+                return "high"
+            return "normal"
+        read.domain = _BANDS
+        return read
+
+    def _evaluate(self, key):
+        """Apply the rules to one combination of feature values."""
+        features = dict(zip((name for name, _ in self.features), key))
+        actions = dict(self.policy["base"])
+        reasons = []
+        for rule in self.policy["rules"]:
+            if not all(features.get(name) in allowed for name, allowed in rule.get("when", {}).items()):
+                continue
+            actions.update(rule.get("set", {}))
+            for field, value in rule.get("raise", {}).items():
+                actions[field] = max(actions.get(field, 0), value)
+            for field, value in rule.get("add", {}).items():
+                actions[field] = actions.get(field, 0) + value
+            if "mode_if_normal" in rule and actions["ventilation_mode"] == "NORMAL":
+                actions["ventilation_mode"] = rule["mode_if_normal"]
+            if "reason" in rule and rule["reason"] not in reasons:
+                reasons.append(rule["reason"])
+            if rule.get("stop"):
+                break
+
+        for field in _PERCENT_FIELDS:
+            actions[field] = max(0, min(100, int(actions.get(field, 0))))
+        return actions, tuple(self._template(r) for r in reasons)
+
+    def _template(self, text):
+        template = self._templates.get(text)
+        if template is None:
+            template = self._templates[text] = ReasonTemplate(text)
+        return template
+
+    def _compile(self):
+        domains = [reader.domain for _, reader in self.features]
+        if prod(len(d) for d in domains) > EAGER_COMBINATIONS:
+            return {}   # filled by decide()
+        return {key: self._evaluate(key) for key in product(*domains)}
+
+    def decide(self, status_packet):
+        key = tuple([read(status_packet) for read in self._readers])
+        entry = self.table.get(key)
+        if entry is None:
+            entry = self.table[key] = self._evaluate(key)
+        template, reasons = entry
+        actions = {"timestamp": status_packet.get("timestamp") or datetime.now(timezone.utc).isoformat()}
+        actions.update(template)
+        actions["reasons"] = Reasons(reasons, status_packet)
+        return actions
+
+
+def load_policy(path):
+    """Compile a policy from a JSON rules file."""
+    with open(path, encoding="utf-8") as f:
+        return CompiledPolicy(json.load(f))
+
+
+_policies = {}   # rules file (None = built-in table) -> CompiledPolicy
+
+
+def get_policy(zone=None):
+    """Compiled policy for `zone`: its HVAC_ZONE_RULES file, else
+    HVAC_RULES_PATH, else the built-in table. Each file is compiled once."""
+    path = HVAC_ZONE_RULES.get(zone, HVAC_RULES_PATH)
+    policy = _policies.get(path)
+    if policy is None:
+        policy = _policies[path] = CompiledPolicy() if path is None else load_policy(path)
+    return policy
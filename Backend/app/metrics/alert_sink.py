@@ -0,0 +1,170 @@
+"""
+Single alert sink: turns per-reading alert conditions into alert episodes.
+
+The evaluator reports every condition that is active for a reading. Writing
+those straight to the alerts table produces one identical row per reading
+for as long as the condition lasts, so everything goes through AlertSink,
+which tracks one open episode per (device, category) and only emits rows on
+state transitions:
+
+    open         condition seen for ALERT_ENTER_READINGS consecutive readings
+                 (critical conditions open immediately)
+    escalated    severity rose above the episode's current severity
+    deescalated  severity below the episode's for ALERT_ENTER_READINGS
+                 consecutive readings; the episode takes the highest of them
+    summary      still open after ALERT_RENOTIFY_INTERVAL seconds
+    closed       condition clear for ALERT_EXIT_HOLD seconds
+"""
+
+from app.config.config import (
+    ALERT_ENTER_READINGS,
+    ALERT_EXIT_HOLD,
+    ALERT_RENOTIFY_INTERVAL,
+)
+from app.metrics.classifier import SEVERITY_RANK
+from app.utils.time_utils import to_epoch
+
+
+class AlertSink:
+    def __init__(
+        self,
+        enter_readings=ALERT_ENTER_READINGS,
+        exit_hold=ALERT_EXIT_HOLD,
+        renotify_interval=ALERT_RENOTIFY_INTERVAL,
+    ):
+        self.enter_readings = enter_readings
+        self.exit_hold = exit_hold
+        self.renotify_interval = renotify_interval
+        self._episodes = {}   # (device_id, category) -> episode dict
+        self._arming = {}     # (device_id, category) -> consecutive readings seen
+
+    def process(self, timestamp, alerts, device_id=None):
+        """Feed the alerts of one reading; returns the rows to persist."""
+        now = to_epoch(timestamp)
+        rows = []
+        active = set()
+
+        for alert in alerts:
+            key = (device_id, alert["category"])
+            active.add(key)
+            episode = self._episodes.get(key)
+
+            if episode is None:
+                seen = self._arming.get(key, 0) + 1
+                if seen < self.enter_readings and alert["severity"] != "critical":
+                    self._arming[key] = seen
+                    continue
+                self._arming.pop(key, None)
+                self._episodes[key] = {
+                    "category": alert["category"],
+                    "opened": now,
+                    "opened_at": timestamp,
+                    "last_seen": now,
+                    "last_notified": now,
+                    "severity": alert["severity"],
+                    "peak": alert["value"],
+                    "samples": 1,
+                    "last": alert,
+                    "below": [],   # severities of the consecutive readings under "severity"
+                }
+                rows.append(dict(alert, state="open"))
+                continue
+
+            episode["last_seen"] = now
+            episode["samples"] += 1
+            episode["last"] = alert
+            if _gt(alert["value"], episode["peak"]):
+                episode["peak"] = alert["value"]
+
+            rank = SEVERITY_RANK.get(alert["severity"], 0)
+            current = SEVERITY_RANK.get(episode["severity"], 0)
+            below = episode.setdefault("below", [])
+            if rank < current:
+                below.append(alert["severity"])
+            else:
+                below.clear()
+
+            if rank > current:
+                episode["severity"] = alert["severity"]
+                episode["last_notified"] = now
+                rows.append(dict(alert, state="escalated"))
+            elif below and len(below) >= self.enter_readings:
+                severity = max(below, key=lambda s: SEVERITY_RANK.get(s, 0))
+                below.clear()
+                episode["severity"] = severity
+                episode["last_notified"] = now
+                rows.append(dict(alert, severity=severity, state="deescalated"))
+            elif now - episode["last_notified"] >= self.renotify_interval:
+                episode["last_notified"] = now
+                rows.append(self._summary(episode, timestamp, now))
+
+        for key in [k for k in self._arming if k[0] == device_id and k not in active]:
+            del self._arming[key]
+
+        for key, episode in list(self._episodes.items()):
+            if key[0] != device_id or key in active:
+                continue
+            if now - episode["last_seen"] >= self.exit_hold:
+                del self._episodes[key]
+                rows.append(self._closed(episode, timestamp, now))
+
+        return rows
+
+    def open_episodes(self):
+        return {key: dict(ep) for key, ep in self._episodes.items()}
+
+    def snapshot(self):
+        return {
+            "episodes": [[*key, dict(ep)] for key, ep in self._episodes.items()],
+            "arming": [[*key, seen] for key, seen in self._arming.items()],
+        }
+
+    def restore(self, state):
+        self._episodes = {(device_id, category): ep for device_id, category, ep in state["episodes"]}
+        self._arming = {(device_id, category): seen for device_id, category, seen in state["arming"]}
+
+    @staticmethod
+    def _summary(episode, timestamp, now):
+        last = episode["last"]
+        return dict(
+            last,
+            timestamp=timestamp,
+            severity=episode["severity"],
+            state="summary",
+            message=(
+                f"{episode['category']} ongoing for {int(now - episode['opened'])}s "
+                f"since {episode['opened_at']}: peak {episode['peak']}, "
+                f"{episode['samples']} readings"
+            ),
+        )
+
+    @staticmethod
+    def _closed(episode, timestamp, now):
+        last = episode["last"]
+        return dict(
+            last,
+            timestamp=timestamp,
+            severity=episode["severity"],
+            state="closed",
+            message=(
+                f"{episode['category']} cleared after {int(now - episode['opened'])}s "
+                f"(peak {episode['peak']}, {episode['samples']} readings)"
+            ),
+        )
+
+
+def _gt(a, b):
+    try:
+        return a > b
+    except TypeError:
+        return False
+
+
+_default_sink = None
+
+
+def get_alert_sink():
+    global _default_sink
+    if _default_sink is None:
+        _default_sink = AlertSink()
+    return _default_sink
@@ -0,0 +1,129 @@
+"""
+Columnar batch evaluation.
+
+`evaluate_all_metrics_batch` is the vectorized counterpart of
+`evaluate_all_metrics`: it takes column arrays instead of one reading dict
+and returns columnar values, level names, severity ranks, band limits and
+per-category alert masks. Classification and WBGT are computed with NumPy
+(WBGT with the same formula as the scalar path, or from the lookup table
+with WBGT_USE_LUT, within WBGT_LUT_MAX_ERROR); CO STEL/TWA go through the same
+streaming ExposureTracker as the scalar path so the windows can continue
+across successive batches and the results stay identical to evaluating the
+readings one by one.
+"""
+
+import numpy as np
+
+from app.config.thresholds import CO_CEILING, CO_STEL, CO_TWA
+from app.metrics.classifier import (
+    CO2_CLASSIFIER,
+    CO_CLASSIFIER,
+    PM10_CLASSIFIER,
+    PM25_CLASSIFIER,
+    PRESSURE_CLASSIFIER,
+    TEMP_CLASSIFIER,
+    WBGT_CLASSIFIER,
+)
+from app.metrics.exposure import ExposureTracker
+from app.metrics.temp_pressure_wbgt import compute_wbgt_array
+from app.utils.time_utils import to_epoch
+
+# channel -> (input column, classifier)
+_CHANNELS = {
+    "co": ("co_max", CO_CLASSIFIER),
+    "co2": ("co2", CO2_CLASSIFIER),
+    "pm2_5": ("pm2_5", PM25_CLASSIFIER),
+    "pm10": ("pm10", PM10_CLASSIFIER),
+    "temp": ("temp", TEMP_CLASSIFIER),
+    "pressure": ("pressure", PRESSURE_CLASSIFIER),
+    "wbgt": ("wbgt", WBGT_CLASSIFIER),
+}
+
+# Alert categories raised on a non-"none" band severity (scalar path parity)
+_BAND_ALERTS = {
+    "PM2.5": "pm2_5",
+    "PM10": "pm10",
+    "WBGT": "wbgt",
+    "TEMP": "temp",
+    "PRESSURE": "pressure",
+    "CO2": "co2",
+}
+
+
+def epoch_column(timestamps):
+    """ISO strings or epoch numbers -> float64 epoch seconds."""
+    ts = np.asarray(timestamps)
+    if ts.dtype.kind in "iuf":
+        return ts.astype(float)
+    return np.fromiter((to_epoch(t) for t in ts.tolist()), float, ts.size)
+
+
+def compute_exposure_columns(epochs, co_mean, exposure=None):
+    """Run the streaming STEL/TWA windows over a column; returns (stel, twa)."""
+    exposure = exposure or ExposureTracker()
+    n = len(epochs)
+    stel = np.empty(n)
+    twa = np.empty(n)
+    update = exposure.update
+    for i, (t, v) in enumerate(zip(epochs.tolist(), co_mean.tolist())):
+        stel[i], twa[i] = update(t, v)
+    return stel, twa
+
+
+def evaluate_all_metrics_batch(columns, exposure=None):
+    """
+    Evaluate a batch of readings given as columns.
+
+    `columns` maps "timestamp" (ISO strings or epoch seconds), "temp",
+    "pressure", "co_max", "pm2_5", "pm10", "co2" and optionally "co_mean"
+    (defaults to co_max) and "humidity" (% RH, NaN or None where not
+    measured) to equal-length arrays. Pass `exposure` to continue
+    an existing ExposureTracker across batches.
+
+    Returns:
+    {
+        "timestamp": float64 epoch seconds,
+        "values":   {channel: float64, ..., "co_stel", "co_twa"},
+        "levels":   {channel: object array of level names},
+        "severity": {channel: int8 SEVERITY_RANK},
+        "limits":   {channel: band upper bound, NaN if unknown},
+        "alerts":   {category: bool mask, same categories as the scalar path},
+    }
+    """
+    epochs = epoch_column(columns["timestamp"])
+    values = {
+        channel: np.asarray(columns[column], dtype=float)
+        for channel, (column, _) in _CHANNELS.items()
+        if column != "wbgt"
+    }
+    humidity = columns.get("humidity")
+    if humidity is not None:
+        humidity = np.asarray(humidity, dtype=float)   # None entries -> NaN -> default RH
+    values["wbgt"] = compute_wbgt_array(values["temp"], humidity)
+
+    co_mean = np.asarray(columns.get("co_mean", columns["co_max"]), dtype=float)
+    values["co_stel"], values["co_twa"] = compute_exposure_columns(epochs, co_mean, exposure)
+
+    levels, severity, limits = {}, {}, {}
+    for channel, (_, classifier) in _CHANNELS.items():
+        idx = classifier.classify_array(values[channel])
+        levels[channel] = classifier.levels_of(idx)
+        severity[channel] = classifier.severity_ranks_of(idx)
+        limits[channel] = classifier.highs_of(idx)
+
+    alerts = {
+        "CO_STEL": values["co_stel"] > CO_STEL,
+        "CO_TWA": values["co_twa"] > CO_TWA,
+        "CO_CEILING": values["co"] > CO_CEILING,
+    }
+    for category, channel in _BAND_ALERTS.items():
+        alerts[category] = severity[channel] > 0
+
+    return {
+        "timestamp": epochs,
+        "values": values,
+        "levels": levels,
+        "severity": severity,
+        "limits": limits,
+        "alerts": alerts,
+    }
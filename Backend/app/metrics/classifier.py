@@ -0,0 +1,139 @@
+"""
+Compiled threshold classifiers shared by every metric.
+
+Each `*_LIMITS` table is compiled once into a sorted array of lower bounds
+and a tuple of precomputed (level, severity, low, high) bands. A scalar
+lookup is a single `bisect`; `classify_array` does the same for a whole
+column with `numpy.searchsorted`.
+"""
+
+from bisect import bisect_right
+
+from app.config.thresholds import (
+    CO2_LIMITS,
+    CO_LIMITS,
+    PM10_LIMITS,
+    PM25_LIMITS,
+    PRESSURE_LIMITS,
+    TEMP_LIMITS,
+    WBGT_THRESHOLDS,
+)
+
+try:
+    import numpy as np
+except ImportError:  # only needed for the vectorized paths
+    np = None
+
+
+UNKNOWN_LEVEL = "unknown"
+
+# Generic band -> severity mapping (CO, CO2, temperature, pressure)
+BAND_SEVERITY = {
+    "green": "none",
+    "yellow": "warning",
+    "yellow-low": "warning",
+    "yellow-high": "warning",
+    "orange-low": "warning",
+    "orange-high": "warning",
+    "orange": "warning",
+    "red-low": "high",
+    "red-high": "high",
+    "red": "high",
+    "dark-red-low": "critical",
+    "dark-red-high": "critical",
+    "dark-red": "critical",
+    "dark_red": "critical",
+    "purple-low": "critical",
+    "purple-high": "critical",
+    "purple": "critical",
+}
+
+# PM bands: yellow is informational only
+PM_SEVERITY = {
+    "green": "none",
+    "yellow": "none",
+    "orange": "warning",
+    "red": "high",
+    "dark-red": "critical",
+    "purple": "critical",
+}
+
+SEVERITY_RANK = {"none": 0, "warning": 1, "high": 2, "critical": 3}
+SEVERITIES = ("none", "warning", "high", "critical")
+
+
+def band_severity(level):
+    return BAND_SEVERITY.get(level, "none")
+
+
+def pm_severity(level):
+    return PM_SEVERITY.get(level, "none")
+
+
+def wbgt_severity(level):
+    if level in ("green", "yellow", UNKNOWN_LEVEL):
+        return "none"
+    if level == "orange":
+        return "warning"
+    return "critical"
+
+
+class ThresholdClassifier:
+    def __init__(self, limits, severity_of=band_severity):
+        if isinstance(limits, dict):
+            limits = [(level, low, high) for level, (low, high) in limits.items()]
+        ordered = sorted(limits, key=lambda band: band[1])
+
+        self.bands = tuple(
+            (level, severity_of(level), low, high) for level, low, high in ordered
+        )
+        self.unknown = (UNKNOWN_LEVEL, severity_of(UNKNOWN_LEVEL), None, None)
+        self._lows = [band[2] for band in self.bands]
+        self._highs = [band[3] for band in self.bands]
+
+        # Lookup tables for the vectorized path; index -1 means "unknown"
+        self.levels = tuple(band[0] for band in self.bands) + (UNKNOWN_LEVEL,)
+        self.severity_ranks = tuple(SEVERITY_RANK[band[1]] for band in self.bands) + (
+            SEVERITY_RANK[self.unknown[1]],
+        )
+
+    def classify(self, value):
+        """Return (level, severity, low, high) for a single value."""
+        i = bisect_right(self._lows, value) - 1
+        if i >= 0 and value < self._highs[i]:
+            return self.bands[i]
+        return self.unknown
+
+    def classify_array(self, values):
+        """Return band indices for a whole array (-1 where no band matches)."""
+        if np is None:
+            raise RuntimeError("numpy is required for vectorized classification")
+
+        values = np.asarray(values, dtype=float)
+        lows = np.asarray(self._lows, dtype=float)
+        highs = np.asarray(self._highs, dtype=float)
+
+        idx = np.searchsorted(lows, values, side="right") - 1
+        matched = (idx >= 0) & (values < highs[np.clip(idx, 0, None)])
+        return np.where(matched, idx, -1)
+
+    def levels_of(self, indices):
+        """Map indices from `classify_array` to level names."""
+        return np.asarray(self.levels, dtype=object)[indices]
+
+    def severity_ranks_of(self, indices):
+        """Map indices from `classify_array` to SEVERITY_RANK values."""
+        return np.asarray(self.severity_ranks, dtype=np.int8)[indices]
+
+    def highs_of(self, indices):
+        """Map indices from `classify_array` to band upper bounds (NaN if unknown)."""
+        return np.asarray(self._highs + [np.nan], dtype=float)[indices]
+
+
+CO_CLASSIFIER = ThresholdClassifier(CO_LIMITS)
+CO2_CLASSIFIER = ThresholdClassifier(CO2_LIMITS)
+PM25_CLASSIFIER = ThresholdClassifier(PM25_LIMITS, pm_severity)
+PM10_CLASSIFIER = ThresholdClassifier(PM10_LIMITS, pm_severity)
+TEMP_CLASSIFIER = ThresholdClassifier(TEMP_LIMITS)
+PRESSURE_CLASSIFIER = ThresholdClassifier(PRESSURE_LIMITS)
+WBGT_CLASSIFIER = ThresholdClassifier(WBGT_THRESHOLDS, wbgt_severity)
@@ -12,3 +12,25 @@ def compute_co_ceiling(timestamp, co_max):
         "limit": CO_CEILING,
         "status": "danger" if co_max > CO_CEILING else "safe"
     }
+
+
+def compute_co_stel(timestamp, stel):
+    return {
+        "timestamp": timestamp,
+        "type": "CO_STEL",
+        "value": stel,
+        "window": "15min",
+        "limit": CO_STEL,
+        "status": "danger" if stel > CO_STEL else "safe"
+    }
+
+
+def compute_co_twa(timestamp, twa):
+    return {
+        "timestamp": timestamp,
+        "type": "CO_TWA",
+        "value": twa,
+        "window": "8h",
+        "limit": CO_TWA,
+        "status": "danger" if twa > CO_TWA else "safe"
+    }
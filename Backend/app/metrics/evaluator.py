@@ -1,32 +1,53 @@
-from app.metrics.co_metrics import compute_co_ceiling
+from app.metrics.co_metrics import compute_co_ceiling, compute_co_stel, compute_co_twa
+from app.metrics.exposure import get_exposure_tracker
+from app.metrics.forecast import get_channel_forecasts
 from app.metrics.pm_metrics import process_pm_metrics
-from app.config.thresholds import CO_LIMITS, CO2_LIMITS
+from app.metrics.classifier import (
+    CO2_CLASSIFIER,
+    CO_CLASSIFIER,
+    PM10_CLASSIFIER,
+    PM25_CLASSIFIER,
+    PRESSURE_CLASSIFIER,
+    TEMP_CLASSIFIER,
+    WBGT_CLASSIFIER,
+    wbgt_severity,
+)
 from app.metrics.temp_pressure_wbgt import (
-    build_environment_alert,
-    classify_pressure,
-    classify_temp,
+    build_band_alert,
     compute_wbgt,
-    level_to_severity,
     process_wbgt,
-    wbgt_level_to_severity,
 )
 from app.metrics.co_alerts import process_co_alerts
-
-def _classify_from_limits(value, limits):
-    if isinstance(limits, dict):
-        thresholds = sorted(limits.items(), key=lambda item: item[1][0])
-        for level, (low, high) in thresholds:
-            if low <= value < high:
-                return level, low, high
-    else:
-        for level, low, high in limits:
-            if low <= value < high:
-                return level, low, high
-
-    return "unknown", None, None
-
-def evaluate_all_metrics(reading):
+from app.utils.time_utils import to_epoch
+
+_FORECAST_CLASSIFIERS = {
+    "co": CO_CLASSIFIER,
+    "co2": CO2_CLASSIFIER,
+    "pm2_5": PM25_CLASSIFIER,
+    "pm10": PM10_CLASSIFIER,
+    "temp": TEMP_CLASSIFIER,
+}
+
+
+def _add_forecasts(status_packet, predicted, humidity=None):
+    """Attach predicted_value / predicted_severity to the packet channels."""
+    pm = status_packet["pm"]
+    for name, value in predicted.items():
+        status = pm[name] if name in ("pm2_5", "pm10") else status_packet[name]
+        status["predicted_value"] = value
+        status["predicted_severity"] = _FORECAST_CLASSIFIERS[name].classify(value)[1]
+    if "temp" in predicted:
+        wbgt = status_packet["wbgt"]
+        wbgt["predicted_value"] = compute_wbgt(predicted["temp"], humidity)
+        wbgt["predicted_severity"] = WBGT_CLASSIFIER.classify(wbgt["predicted_value"])[1]
+
+
+def evaluate_all_metrics(reading, exposure=None, forecasts=None):
     ts = reading["timestamp"]
+    if exposure is None:
+        exposure = get_exposure_tracker(reading.get("device_id"))
+    if forecasts is None:
+        forecasts = get_channel_forecasts(reading.get("device_id"))
 
     metrics = []
     alerts = []
@@ -38,28 +59,28 @@ def evaluate_all_metrics(reading):
     # -------------------------
     co_ceiling_m = compute_co_ceiling(ts, reading["co_max"])
     metrics.append(co_ceiling_m)
-    co_level = _classify_from_limits(reading["co_max"], CO_LIMITS)
+    co_level = CO_CLASSIFIER.classify(reading["co_max"])
     co_status = {
         "value": reading["co_max"],
         "level": co_level[0],
-        "severity": level_to_severity(co_level[0]),
+        "severity": co_level[1],
     }
     results["co"] = co_status
 
     # -------------------------
     # CO2 (air quality / ventilation)
     # -------------------------
-    co2_level = _classify_from_limits(reading["co2"], CO2_LIMITS)
+    co2_level = CO2_CLASSIFIER.classify(reading["co2"])
     co2_status = {
         "value": reading["co2"],
         "level": co2_level[0],
-        "severity": level_to_severity(co2_level[0]),
+        "severity": co2_level[1],
     }
 
     # -------------------------
     # PM Metrics
     # -------------------------
-    pm = process_pm_metrics(ts, reading["pm2_5"], reading["pm10"])
+    pm = process_pm_metrics(ts, reading["pm2_5"], reading["pm10"], alerts)
     for key, metric in pm.items():
         metrics.append({
             "timestamp": ts,
@@ -69,14 +90,17 @@ def evaluate_all_metrics(reading):
             "limit": metric["high"],
             "status": metric["level"],
         })
-    # Alerts are generated inside process_pm_metrics
+    # PM alerts are appended to `alerts` by process_pm_metrics
 
     # -------------------------
-    # CO STEL/TWA Alerts
-    # (you can integrate STEL/TWA code)
+    # CO STEL/TWA (streaming 15 min / 8 h windows over co_mean)
     # -------------------------
-    co_stel = None       # compute if needed
-    co_twa = None        # compute if needed
+    epoch = to_epoch(ts)
+    co_stel, co_twa = exposure.update(epoch, reading["co_mean"])
+    metrics.append(compute_co_stel(ts, co_stel))
+    metrics.append(compute_co_twa(ts, co_twa))
+    co_status["stel"] = co_stel
+    co_status["twa"] = co_twa
     ceiling = reading["co_max"]
 
     co_alert_list = process_co_alerts(ts, co_stel, co_twa, ceiling)
@@ -85,16 +109,18 @@ def evaluate_all_metrics(reading):
     # -------------------------
     # Temperature / Pressure
     # -------------------------
-    temp_lvl = classify_temp(reading["temp"])
-    pressure_lvl = classify_pressure(reading["pressure"])
+    # (level, severity, low, high)
+    temp_lvl = TEMP_CLASSIFIER.classify(reading["temp"])
+    pressure_lvl = PRESSURE_CLASSIFIER.classify(reading["pressure"])
 
-    # WBGT  (approx)
-    wbgt_val = compute_wbgt(reading["temp"])
+    # WBGT  (approx; 40% RH when the board has no humidity sensor)
+    humidity = reading.get("humidity")
+    wbgt_val = compute_wbgt(reading["temp"], humidity)
     wbgt_status, wbgt_alert = process_wbgt(ts, wbgt_val)
     results["wbgt"] = wbgt_status
-    temp_severity = level_to_severity(temp_lvl[0])
-    pressure_severity = level_to_severity(pressure_lvl[0])
-    wbgt_severity = wbgt_level_to_severity(wbgt_status["level"])
+    temp_severity = temp_lvl[1]
+    pressure_severity = pressure_lvl[1]
+    wbgt_sev = wbgt_severity(wbgt_status["level"])
 
     # Add them as passive metrics (no alerts yet)
     metrics.append({
@@ -102,7 +128,7 @@ def evaluate_all_metrics(reading):
         "type": "TEMP_LEVEL",
         "value": reading["temp"],
         "window": "instant",
-        "limit": temp_lvl[2],
+        "limit": temp_lvl[3],
         "status": temp_lvl[0]
     })
 
@@ -111,7 +137,7 @@ def evaluate_all_metrics(reading):
         "type": "PRESSURE_LEVEL",
         "value": reading["pressure"],
         "window": "instant",
-        "limit": pressure_lvl[2],
+        "limit": pressure_lvl[3],
         "status": pressure_lvl[0]
     })
 
@@ -120,7 +146,7 @@ def evaluate_all_metrics(reading):
         "type": "CO2_LEVEL",
         "value": reading["co2"],
         "window": "instant",
-        "limit": co2_level[2],
+        "limit": co2_level[3],
         "status": co2_level[0],
     })
 
@@ -136,9 +162,9 @@ def evaluate_all_metrics(reading):
         alerts.append(wbgt_alert)
     # Add alerts for non-green levels
     for alert in (
-        build_environment_alert("TEMP", ts, reading["temp"], temp_lvl),
-        build_environment_alert("PRESSURE", ts, reading["pressure"], pressure_lvl),
-        build_environment_alert("CO2", ts, reading["co2"], co2_level),
+        build_band_alert("TEMP", ts, reading["temp"], temp_lvl),
+        build_band_alert("PRESSURE", ts, reading["pressure"], pressure_lvl),
+        build_band_alert("CO2", ts, reading["co2"], co2_level),
     ):
         if alert:
             alerts.append(alert)
@@ -166,7 +192,8 @@ def evaluate_all_metrics(reading):
             "wbgt": {
                 "value": wbgt_status["value"],
                 "level": wbgt_status["level"],
-                "severity": wbgt_severity,
+                "severity": wbgt_sev,
+                "humidity": humidity,
             },
             "pressure": {
                 "value": reading["pressure"],
@@ -175,6 +202,8 @@ def evaluate_all_metrics(reading):
             },
         }
     )
+    # Where each channel is heading (FORECAST_HORIZON ahead)
+    _add_forecasts(status_packet, forecasts.update(epoch, reading), humidity)
     results["status_packet"] = status_packet
 
     return {
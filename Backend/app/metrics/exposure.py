@@ -0,0 +1,111 @@
+"""
+Streaming CO exposure windows (STEL 15 min / TWA 8 h).
+
+Each sample is treated as the concentration over the interval since the
+previous sample (the device reports the mean of the last period), capped at
+EXPOSURE_MAX_GAP seconds so an outage is counted as unmeasured time instead
+of being filled with a stale value. Every window keeps the covered intervals
+in a deque together with a running time-weighted sum, so adding a sample and
+reading the average are amortized O(1) and never rescan history.
+"""
+
+from collections import deque
+
+from app.config.config import EXPOSURE_MAX_GAP
+from app.config.thresholds import CO_STEL_WINDOW, CO_TWA_WINDOW
+
+
+class TimeWeightedWindow:
+    def __init__(self, horizon, max_gap=EXPOSURE_MAX_GAP):
+        self.horizon = horizon
+        self.max_gap = max_gap
+        self._segments = deque()   # [start, end, value], oldest first
+        self._area = 0.0           # sum of value * duration over the window
+        self._last_t = None
+
+    def add(self, t, value):
+        """Account for `value` over (previous sample, t] and slide the window."""
+        last_t = self._last_t
+        if last_t is not None and t > last_t:
+            start = max(last_t, t - self.max_gap)
+            tail = self._segments[-1] if self._segments else None
+            if tail is not None and tail[1] == start and tail[2] == value:
+                # Contiguous run of the same value: extend instead of appending
+                tail[1] = t
+            else:
+                self._segments.append([start, t, value])
+            self._area += value * (t - start)
+
+        if last_t is None or t > last_t:
+            self._last_t = t
+        self._evict(self._last_t - self.horizon)
+
+    def _evict(self, window_start):
+        segments = self._segments
+        while segments and segments[0][1] <= window_start:
+            start, end, value = segments.popleft()
+            self._area -= value * (end - start)
+
+        if segments and segments[0][0] < window_start:
+            head = segments[0]
+            self._area -= head[2] * (window_start - head[0])
+            head[0] = window_start
+
+        if not segments:
+            self._area = 0.0
+
+    def average(self):
+        """Time-weighted average over the full horizon (unmeasured time = 0)."""
+        return max(self._area, 0.0) / self.horizon
+
+    def coverage(self):
+        """Seconds of the horizon actually covered by samples."""
+        return sum(end - start for start, end, _ in self._segments)
+
+    def snapshot(self):
+        return {"segments": [list(s) for s in self._segments], "area": self._area, "last_t": self._last_t}
+
+    def restore(self, state):
+        self._segments = deque(list(s) for s in state["segments"])
+        self._area = state["area"]
+        self._last_t = state["last_t"]
+
+
+class ExposureTracker:
+    """CO STEL and TWA for one sensor."""
+
+    def __init__(self, stel_window=CO_STEL_WINDOW, twa_window=CO_TWA_WINDOW, max_gap=EXPOSURE_MAX_GAP):
+        self.stel = TimeWeightedWindow(stel_window, max_gap)
+        self.twa = TimeWeightedWindow(twa_window, max_gap)
+
+    def update(self, t, co_mean):
+        self.stel.add(t, co_mean)
+        self.twa.add(t, co_mean)
+        return self.stel.average(), self.twa.average()
+
+    def snapshot(self):
+        return {"stel": self.stel.snapshot(), "twa": self.twa.snapshot()}
+
+    def restore(self, state):
+        self.stel.restore(state["stel"])
+        self.twa.restore(state["twa"])
+
+
+_trackers = {}
+
+
+def get_exposure_tracker(device_id=None):
+    tracker = _trackers.get(device_id)
+    if tracker is None:
+        tracker = _trackers[device_id] = ExposureTracker()
+    return tracker
+
+
+def snapshot_trackers():
+    return [[device_id, tracker.snapshot()] for device_id, tracker in list(_trackers.items())]
+
+
+def restore_trackers(state):
+    _trackers.clear()
+    for device_id, tracker_state in state:
+        get_exposure_tracker(device_id).restore(tracker_state)
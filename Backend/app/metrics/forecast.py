@@ -0,0 +1,106 @@
+"""
+Short-horizon trend forecasts per channel.
+
+Every channel keeps Holt's linear-trend state (a smoothed level and a slope
+per second), updated in O(1) per sample and robust to irregular intervals:
+
+    expected = level + slope * dt
+    level'   = expected + alpha * (value - expected)
+    slope'   = slope + beta * ((level' - level) / dt - slope)
+
+The forecast FORECAST_HORIZON seconds ahead is `level' + slope' * horizon`
+(never below zero for concentrations). A gap longer than FORECAST_MAX_GAP
+restarts the trend from the new sample.
+"""
+
+from app.config.config import FORECAST_ALPHA, FORECAST_BETA, FORECAST_HORIZON, FORECAST_MAX_GAP
+
+# status packet channel -> (reading field, lowest possible value)
+FORECAST_CHANNELS = {
+    "co": ("co_max", 0.0),
+    "co2": ("co2", 0.0),
+    "pm2_5": ("pm2_5", 0.0),
+    "pm10": ("pm10", 0.0),
+    "temp": ("temp", None),
+}
+
+
+class HoltForecaster:
+    __slots__ = ("alpha", "beta", "max_gap", "level", "slope", "last_t")
+
+    def __init__(self, alpha=FORECAST_ALPHA, beta=FORECAST_BETA, max_gap=FORECAST_MAX_GAP):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_gap = max_gap
+        self.level = None
+        self.slope = 0.0
+        self.last_t = None
+
+    def update(self, t, value):
+        if self.level is None or t - self.last_t > self.max_gap:
+            self.level, self.slope, self.last_t = value, 0.0, t
+            return
+        dt = t - self.last_t
+        if dt <= 0:
+            # Same or older timestamp: adjust the level only
+            self.level += self.alpha * (value - self.level)
+            return
+        level = self.level + self.slope * dt
+        level += self.alpha * (value - level)
+        self.slope += self.beta * ((level - self.level) / dt - self.slope)
+        self.level, self.last_t = level, t
+
+    def forecast(self, horizon=FORECAST_HORIZON):
+        return self.level + self.slope * horizon
+
+
+class ChannelForecasts:
+    """The forecasters of one device."""
+
+    def __init__(self, horizon=FORECAST_HORIZON):
+        self.horizon = horizon
+        self.channels = {name: HoltForecaster() for name in FORECAST_CHANNELS}
+
+    def update(self, t, reading):
+        """Feed one reading; returns {channel: forecast value}."""
+        out = {}
+        for name, (field, floor) in FORECAST_CHANNELS.items():
+            value = reading.get(field)
+            if value is None:
+                continue
+            forecaster = self.channels[name]
+            forecaster.update(t, value)
+            predicted = forecaster.forecast(self.horizon)
+            if floor is not None and predicted < floor:
+                predicted = floor
+            out[name] = predicted
+        return out
+
+    def snapshot(self):
+        return {name: [f.level, f.slope, f.last_t] for name, f in self.channels.items()}
+
+    def restore(self, state):
+        for name, (level, slope, last_t) in state.items():
+            forecaster = self.channels.get(name)
+            if forecaster is not None:
+                forecaster.level, forecaster.slope, forecaster.last_t = level, slope, last_t
+
+
+_forecasts = {}
+
+
+def get_channel_forecasts(device_id=None):
+    forecasts = _forecasts.get(device_id)
+    if forecasts is None:
+        forecasts = _forecasts[device_id] = ChannelForecasts()
+    return forecasts
+
+
+def snapshot_forecasts():
+    return [[device_id, f.snapshot()] for device_id, f in list(_forecasts.items())]
+
+
+def restore_forecasts(state):
+    _forecasts.clear()
+    for device_id, forecasts_state in state:
+        get_channel_forecasts(device_id).restore(forecasts_state)
@@ -1,39 +1,22 @@
-from app.db.alerts_db import insert_alert_record
-from app.config.thresholds import PM25_LIMITS, PM10_LIMITS
+from app.metrics.classifier import PM10_CLASSIFIER, PM25_CLASSIFIER, pm_severity
 
-
-def _classify(value: float, limits: dict):
-    for level, (low, high) in limits.items():
-        if low <= value < high:
-            return level, low, high
-    return "unknown", None, None
-
-
-def _level_to_severity(level):
-    return {
-        "green": "none",
-        "yellow": "none",
-        "orange": "warning",
-        "red": "high",
-        "dark-red": "critical",
-        "purple": "critical",
-    }.get(level, "none")
+_level_to_severity = pm_severity
 
 
 def classify_pm25(value):
-    level, low, high = _classify(value, PM25_LIMITS)
-    severity = _level_to_severity(level)
-    return level, severity, low, high
+    return PM25_CLASSIFIER.classify(value)
 
 
 def classify_pm10(value):
-    level, low, high = _classify(value, PM10_LIMITS)
-    severity = _level_to_severity(level)
-    return level, severity, low, high
+    return PM10_CLASSIFIER.classify(value)
 
 
-def process_pm_metrics(timestamp, pm25, pm10):
+def process_pm_metrics(timestamp, pm25, pm10, alerts=None):
+    """Classify PM2.5/PM10; alerts for non-"none" severities are appended to
+    `alerts` when given (nothing is written to the database here)."""
     results = {}
+    if alerts is None:
+        alerts = []
 
     # PM2.5
     level25, sev25, low25, high25 = classify_pm25(pm25)
@@ -45,7 +28,7 @@ def process_pm_metrics(timestamp, pm25, pm10):
         "high": high25,
     }
     if sev25 != "none":
-        insert_alert_record({
+        alerts.append({
             "timestamp": timestamp,
             "category": "PM2.5",
             "value": pm25,
@@ -64,7 +47,7 @@ def process_pm_metrics(timestamp, pm25, pm10):
         "high": high10,
     }
     if sev10 != "none":
-        insert_alert_record({
+        alerts.append({
             "timestamp": timestamp,
             "category": "PM10",
             "value": pm10,
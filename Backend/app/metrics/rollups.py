@@ -0,0 +1,139 @@
+"""
+Incremental rollups (1-minute / 1-hour / 1-day aggregates).
+
+Every sample updates one open bucket per resolution and series with
+count/sum/min/max and, for series that carry a level, the seconds spent in
+each level band (the interval since the previous sample, capped at
+EXPOSURE_MAX_GAP like the exposure windows). A bucket is emitted as a row
+for the `rollups` table when the first sample of the next bucket arrives.
+
+Series names are the sensor channel ("temp", "co_max", ...) for raw
+readings and "metric:<metric_type>" for evaluated metrics.
+"""
+
+from app.config.config import EXPOSURE_MAX_GAP, ROLLUP_RESOLUTIONS
+from app.utils.time_utils import epoch_to_iso, to_epoch
+
+SENSOR_CHANNELS = ("temp", "pressure", "co_mean", "co_max", "pm2_5", "pm10", "co2", "humidity")
+
+
+class _Bucket:
+    __slots__ = ("start", "count", "total", "min", "max", "bands")
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.bands = {}
+
+    def add(self, value, status, dt):
+        if value is not None:
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        if status is not None and dt:
+            self.bands[status] = self.bands.get(status, 0.0) + dt
+
+
+class RollupEngine:
+    def __init__(self, resolutions=ROLLUP_RESOLUTIONS, max_gap=EXPOSURE_MAX_GAP):
+        self.resolutions = dict(resolutions)
+        self.max_gap = max_gap
+        self.late_samples = 0
+        self._open = {}      # (device_id, series, resolution) -> _Bucket
+        self._last_t = {}    # (device_id, series) -> epoch of previous sample
+
+    def add_sample(self, device_id, series, t, value, status=None):
+        """Add one sample; returns the rows of any buckets it closed."""
+        key = (device_id, series)
+        last_t = self._last_t.get(key)
+        dt = 0.0
+        if last_t is not None and t > last_t:
+            dt = min(t - last_t, self.max_gap)
+        if last_t is None or t > last_t:
+            self._last_t[key] = t
+
+        closed = []
+        for name, width in self.resolutions.items():
+            start = t - (t % width)
+            bucket_key = (device_id, series, name)
+            bucket = self._open.get(bucket_key)
+            if bucket is None or start > bucket.start:
+                if bucket is not None:
+                    closed.append(self._row(bucket_key, bucket))
+                bucket = self._open[bucket_key] = _Bucket(start)
+            elif start < bucket.start:
+                # Belongs to a bucket that was already written
+                self.late_samples += 1
+                continue
+            bucket.add(value, status, dt)
+        return closed
+
+    def observe(self, reading, metrics=()):
+        """Feed one reading and its evaluated metrics; returns closed rows."""
+        device_id = reading.get("device_id")
+        t = to_epoch(reading["timestamp"])
+        closed = []
+        for channel in SENSOR_CHANNELS:
+            value = reading.get(channel)
+            if value is not None:
+                closed.extend(self.add_sample(device_id, channel, t, value))
+        for m in metrics:
+            closed.extend(
+                self.add_sample(device_id, f"metric:{m['type']}", t, m["value"], m["status"])
+            )
+        return closed
+
+    def flush(self):
+        """Rows for every open (partial) bucket, e.g. on shutdown."""
+        return [self._row(key, bucket) for key, bucket in self._open.items()]
+
+    def snapshot(self):
+        return {
+            "open": [
+                [*key, b.start, b.count, b.total, b.min, b.max, b.bands]
+                for key, b in self._open.items()
+            ],
+            "last_t": [[*key, t] for key, t in self._last_t.items()],
+            "late_samples": self.late_samples,
+        }
+
+    def restore(self, state):
+        self._open = {}
+        for device_id, series, resolution, start, count, total, lo, hi, bands in state["open"]:
+            bucket = self._open[(device_id, series, resolution)] = _Bucket(start)
+            bucket.count, bucket.total, bucket.min, bucket.max = count, total, lo, hi
+            bucket.bands = dict(bands)
+        self._last_t = {(device_id, series): t for device_id, series, t in state["last_t"]}
+        self.late_samples = state["late_samples"]
+
+    @staticmethod
+    def _row(key, bucket):
+        device_id, series, resolution = key
+        return {
+            "resolution": resolution,
+            "bucket_start": epoch_to_iso(bucket.start),
+            "device_id": device_id,
+            "series": series,
+            "count": bucket.count,
+            "min": bucket.min,
+            "max": bucket.max,
+            "mean": bucket.total / bucket.count if bucket.count else None,
+            "sum": bucket.total,
+            "band_seconds": dict(bucket.bands),
+        }
+
+
+_default_engine = None
+
+
+def get_rollup_engine():
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = RollupEngine()
+    return _default_engine
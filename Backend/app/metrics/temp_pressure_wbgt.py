@@ -1,94 +1,185 @@
 import math
 
-from app.config.thresholds import TEMP_LIMITS, PRESSURE_LIMITS, WBGT_THRESHOLDS
+from app.config.config import WBGT_USE_LUT
 from app.db.alerts_db import insert_alert
+from app.metrics.classifier import (
+    PRESSURE_CLASSIFIER,
+    TEMP_CLASSIFIER,
+    WBGT_CLASSIFIER,
+    band_severity,
+    wbgt_severity,
+)
+from app.metrics.wbgt_lut import WbgtTable
+
+try:
+    import numpy as np
+except ImportError:  # only needed for the vectorized paths
+    np = None
 
 DEFAULT_WBGT_RH = 40
+_MAX_CACHED_HUMIDITIES = 4096
+
+_table = None
+_terms = {}   # RH -> _humidity_terms(RH)
+
+
+def get_wbgt_table():
+    """The process-wide WBGT lookup table, built on first use."""
+    global _table
+    if _table is None:
+        _table = WbgtTable(compute_wbgt_exact)
+    return _table
+
+
+def _humidity(humidity):
+    """Measured RH clamped to 0-100 %, DEFAULT_WBGT_RH when not measured."""
+    if humidity is None:
+        return DEFAULT_WBGT_RH
+    if humidity < 0.0:
+        return 0.0
+    if humidity > 100.0:
+        return 100.0
+    return humidity
 
 
 def estimate_wet_bulb(temp_c: float, humidity: float = DEFAULT_WBGT_RH) -> float:
     """Estimate wet-bulb temperature using Stull approximation (2011).
 
     Defaults to 40% RH as a stand-in when no humidity sensor is present.
+    Only atan(T + RH) depends on the temperature; the humidity terms are
+    computed once per RH value and reused.
     """
 
     T = temp_c
     RH = humidity
 
-    return (
-        T * math.atan(0.151977 * math.sqrt(RH + 8.313659))
-        + math.atan(T + RH)
-        - math.atan(RH - 1.676331)
-        + 0.00391838 * (RH ** 1.5) * math.atan(0.023101 * RH)
-        - 4.686035
-    )
+    terms = _terms.get(RH)
+    if terms is None:
+        if len(_terms) >= _MAX_CACHED_HUMIDITIES:
+            _terms.clear()
+        terms = _terms[RH] = _humidity_terms(RH)
+    a, b, c = terms
+
+    return T * a + math.atan(T + RH) - b + c - 4.686035
+
 
+def compute_wbgt_exact(temp_c: float, humidity: float = DEFAULT_WBGT_RH) -> float:
+    """Approximate WBGT using wet-bulb estimate and dry-bulb temperature."""
 
-def compute_wbgt(temp_c: float, humidity: float = DEFAULT_WBGT_RH) -> float:
-    """Approximate WBGT using wet-bulb estimate and dry-bulb temperature.
+    twb = estimate_wet_bulb(temp_c, humidity)
+    return 0.7 * twb + 0.3 * temp_c
+
+
+def compute_wbgt(temp_c: float, humidity=None) -> float:
+    """WBGT for a reading; `humidity` is the measured RH in %.
 
     When no humidity reading is provided, a 40% default is used to match the
     agreed-upon baseline for environments without a dedicated humidity sensor.
+
+    This stays on the formula: with the humidity terms cached it is one atan,
+    cheaper in CPython than a bilinear table lookup done in Python.
     """
 
-    twb = estimate_wet_bulb(temp_c, humidity)
-    return 0.7 * twb + 0.3 * temp_c
+    return compute_wbgt_exact(temp_c, _humidity(humidity))
 
 
-def _classify(value, limits):
-    if isinstance(limits, dict):
-        thresholds = ((level, bounds[0], bounds[1]) for level, bounds in limits.items())
+def estimate_wet_bulb_array(temp_c, humidity=DEFAULT_WBGT_RH):
+    """Vectorized estimate_wet_bulb over a temperature column.
+
+    The temperature-dependent atan is evaluated with math.atan so the result
+    is bit-identical to the scalar function (numpy's arctan may differ by one
+    ulp, which could flip a value sitting exactly on a band boundary).
+    """
+
+    T = np.asarray(temp_c, dtype=float)
+
+    if np.ndim(humidity) == 0:
+        a, b, c = _humidity_terms(float(humidity))
     else:
-        thresholds = limits
+        RH = np.asarray(humidity, dtype=float)
+        T, RH = np.broadcast_arrays(T, RH)
+        # Few distinct humidities per batch: terms once per value
+        unique, inverse = np.unique(RH, return_inverse=True)
+        terms = np.array([_humidity_terms(h) for h in unique.tolist()], dtype=float)
+        a, b, c = (terms[inverse.reshape(T.shape), k] for k in range(3))
+
+    shifted = (T + humidity).ravel().tolist()
+    atan_t = np.fromiter(map(math.atan, shifted), float, len(shifted)).reshape(T.shape)
+
+    return T * a + atan_t - b + c - 4.686035
+
+
+def _humidity_terms(RH):
+    return (
+        math.atan(0.151977 * math.sqrt(RH + 8.313659)),
+        math.atan(RH - 1.676331),
+        0.00391838 * (RH ** 1.5) * math.atan(0.023101 * RH),
+    )
+
+
+def compute_wbgt_exact_array(temp_c, humidity=DEFAULT_WBGT_RH):
+    """Vectorized compute_wbgt_exact; returns a float array matching the scalar path."""
+
+    T = np.asarray(temp_c, dtype=float)
+    twb = estimate_wet_bulb_array(T, humidity)
+    return 0.7 * twb + 0.3 * T
+
+
+def compute_wbgt_array(temp_c, humidity=None):
+    """Vectorized compute_wbgt.
+
+    `humidity` is None, one RH for every row, or a column with NaN where it
+    was not measured. With WBGT_USE_LUT the values come from the lookup
+    table, within WBGT_LUT_MAX_ERROR of the scalar path (points off the grid
+    use the formula); without it they match the scalar path exactly.
+    """
+
+    T = np.asarray(temp_c, dtype=float)
+    if humidity is None:
+        RH = np.full(T.shape, float(DEFAULT_WBGT_RH))
+    else:
+        RH = np.asarray(humidity, dtype=float)
+        RH = np.where(np.isnan(RH), float(DEFAULT_WBGT_RH), np.clip(RH, 0.0, 100.0))
+        T, RH = np.broadcast_arrays(T, RH)
+    if not WBGT_USE_LUT:
+        return compute_wbgt_exact_array(T, RH)
+
+    wbgt = get_wbgt_table().wbgt_array(T, RH)
+    off_grid = np.isnan(wbgt) & ~np.isnan(T)
+    if off_grid.any():
+        wbgt[off_grid] = compute_wbgt_exact_array(T[off_grid], RH[off_grid])
+    return wbgt
+
+
+def _classify(value, classifier):
+    level, _, low, high = classifier.classify(value)
+    return level, low, high
 
-    for level, low, high in thresholds:
-        if low <= value < high:
-            return level, low, high
-    return "unknown", None, None
 
 def _level_to_severity(level: str):
-    return {
-        "green": "none",
-        "yellow": "warning",
-        "yellow-low": "warning",
-        "yellow-high": "warning",
-        "orange-low": "warning",
-        "orange-high": "warning",
-        "orange": "warning",
-        "red-low": "high",
-        "red-high": "high",
-        "red": "high",
-        "dark-red-low": "critical",
-        "dark-red-high": "critical",
-        "dark-red": "critical",
-        "dark_red": "critical",
-        "purple-low": "critical",
-        "purple-high": "critical",
-        "purple": "critical",
-    }.get(level, "none")
+    return band_severity(level)
 
 def level_to_severity(level: str) -> str:
     """Public wrapper for mapping band names to severity strings."""
 
-    return _level_to_severity(level)
+    return band_severity(level)
 
 
 def classify_temp(temp):
-    return _classify(temp, TEMP_LIMITS)
+    return _classify(temp, TEMP_CLASSIFIER)
 
 
 def classify_pressure(p):
-    return _classify(p, PRESSURE_LIMITS)
+    return _classify(p, PRESSURE_CLASSIFIER)
 
 
 def classify_wbgt(w):
-    return _classify(w, WBGT_THRESHOLDS)
+    return _classify(w, WBGT_CLASSIFIER)
 
 def process_wbgt(timestamp, wbgt_value):
-    level, low, high = classify_wbgt(wbgt_value)
+    level, severity, low, high = WBGT_CLASSIFIER.classify(wbgt_value)
 
     alert = None
-    severity = wbgt_level_to_severity(level)
     if severity != "none":
         alert = {
             "timestamp": timestamp,
@@ -107,15 +198,16 @@ def process_wbgt(timestamp, wbgt_value):
 
 
 def wbgt_level_to_severity(level: str) -> str:
-    if level in ("green", "yellow", "unknown"):
-        return "none"
-    if level == "orange":
-        return "warning"
-    return "critical"
+    return wbgt_severity(level)
 
 def build_environment_alert(category: str, timestamp: str, value: float, level_data):
     level, low, high = level_data
-    severity = _level_to_severity(level)
+    return build_band_alert(category, timestamp, value, (level, band_severity(level), low, high))
+
+
+def build_band_alert(category: str, timestamp: str, value: float, band):
+    """Same as build_environment_alert for a compiled (level, severity, low, high) band."""
+    level, severity, low, high = band
 
     if severity == "none":
         return None
@@ -0,0 +1,110 @@
+"""
+Precomputed WBGT lookup table.
+
+The Stull wet-bulb approximation behind WBGT costs four atans, a sqrt and a
+power per reading. WbgtTable evaluates it once on a (temp, RH) grid and
+interpolates bilinearly, one value at a time or over NumPy columns. Both
+paths do the same float operations in the same order, so they return the
+same values.
+
+When the table is built its largest deviation from the formula, sampled at
+every cell center and edge midpoint (where bilinear error peaks), must stay
+below `max_error` °C; with the default grid it is about 0.0024 °C. Points
+off the grid give None (NaN in arrays) and the caller falls back to the
+formula: that covers freezing temperatures and RH below 5 %, where
+atan(T + RH) bends too sharply for a coarse grid.
+"""
+
+from app.config.config import (
+    WBGT_LUT_MAX_ERROR,
+    WBGT_LUT_RH_RANGE,
+    WBGT_LUT_RH_STEP,
+    WBGT_LUT_TEMP_RANGE,
+    WBGT_LUT_TEMP_STEP,
+)
+
+try:
+    import numpy as np
+except ImportError:  # only needed for wbgt_array
+    np = None
+
+
+class WbgtTable:
+    def __init__(
+        self,
+        func,
+        temp_range=WBGT_LUT_TEMP_RANGE,
+        temp_step=WBGT_LUT_TEMP_STEP,
+        rh_range=WBGT_LUT_RH_RANGE,
+        rh_step=WBGT_LUT_RH_STEP,
+        max_error=WBGT_LUT_MAX_ERROR,
+    ):
+        """`func(temp, rh)` is the exact function being tabulated."""
+        self.func = func
+        self.t_min, self.t_max = map(float, temp_range)
+        self.rh_min, self.rh_max = map(float, rh_range)
+        self.t_scale = 1.0 / temp_step
+        self.rh_scale = 1.0 / rh_step
+        self.nt = round((self.t_max - self.t_min) * self.t_scale) + 1
+        self.nrh = round((self.rh_max - self.rh_min) * self.rh_scale) + 1
+        # Row-major by RH: values[j * nt + i] = func(t_min + i * step, rh_min + j * step)
+        self.values = [
+            func(self.t_min + i * temp_step, self.rh_min + j * rh_step)
+            for j in range(self.nrh)
+            for i in range(self.nt)
+        ]
+        self._array = None
+        self.error = self.max_error()
+        if self.error > max_error:
+            raise ValueError(
+                f"WBGT table is off by up to {self.error:.4f} °C (limit {max_error}); use smaller steps"
+            )
+
+    def wbgt(self, temp, rh):
+        """Interpolated func(temp, rh), or None off the grid."""
+        if not (self.t_min <= temp <= self.t_max and self.rh_min <= rh <= self.rh_max):
+            return None
+        x = (temp - self.t_min) * self.t_scale
+        y = (rh - self.rh_min) * self.rh_scale
+        i = min(int(x), self.nt - 2)
+        j = min(int(y), self.nrh - 2)
+        fx = x - i
+        fy = y - j
+        k = j * self.nt + i
+        v = self.values
+        low = v[k] + fx * (v[k + 1] - v[k])
+        high = v[k + self.nt] + fx * (v[k + self.nt + 1] - v[k + self.nt])
+        return low + fy * (high - low)
+
+    def wbgt_array(self, temp, rh):
+        """Vectorized `wbgt`: float array, NaN off the grid."""
+        if self._array is None:
+            self._array = np.array(self.values, dtype=float)
+        T, RH = np.broadcast_arrays(np.asarray(temp, dtype=float), np.asarray(rh, dtype=float))
+        inside = (T >= self.t_min) & (T <= self.t_max) & (RH >= self.rh_min) & (RH <= self.rh_max)
+        x = (np.clip(T, self.t_min, self.t_max) - self.t_min) * self.t_scale
+        y = (np.clip(RH, self.rh_min, self.rh_max) - self.rh_min) * self.rh_scale
+        i = np.minimum(x.astype(np.intp), self.nt - 2)
+        j = np.minimum(y.astype(np.intp), self.nrh - 2)
+        fx = x - i
+        fy = y - j
+        k = j * self.nt + i
+        v = self._array
+        a, c = v.take(k), v.take(k + self.nt)
+        low = a + fx * (v.take(k + 1) - a)
+        high = c + fx * (v.take(k + self.nt + 1) - c)
+        return np.where(inside, low + fy * (high - low), np.nan)
+
+    def max_error(self):
+        """Largest |table - func| over every cell center and edge midpoint."""
+        t_step = 1.0 / self.t_scale
+        rh_step = 1.0 / self.rh_scale
+        worst = 0.0
+        for j in range(self.nrh - 1):
+            for i in range(self.nt - 1):
+                t = self.t_min + i * t_step
+                rh = self.rh_min + j * rh_step
+                for dt, drh in ((0.5, 0.5), (0.5, 0.0), (0.0, 0.5)):
+                    point = (t + dt * t_step, rh + drh * rh_step)
+                    worst = max(worst, abs(self.wbgt(*point) - self.func(*point)))
+        return worst
@@ -1 +1,3 @@
 from .validate_payload import validate_payload
+from .binary_payload import decode_reading, decode_readings, encode_reading, is_binary_payload
+from .batch_payload import is_batch, validate_batch
@@ -0,0 +1,63 @@
+"""
+Batched JSON payloads: several readings in one MQTT message.
+
+Two shapes are accepted next to the single-reading payload:
+
+    {"samples": [{...}, {...}], "co_valid": true}
+        one object per reading; the other top-level fields are a header
+        shared by every sample (a sample's own field wins)
+
+    {"timestamp": [...], "temp": [...], "pressure": [...], ..., "co2": 420}
+        columns: list fields hold one value per reading, scalar fields are
+        shared. Instead of a timestamp list, a first "timestamp" plus an
+        "interval" in seconds can be given.
+
+Every sample goes through validate_payload; one bad sample rejects the
+whole message, so a batch is stored entirely or not at all.
+"""
+
+from app.config.config import MAX_BATCH_SAMPLES
+from app.models.validate_payload import validate_payload
+from app.utils.time_utils import epoch_to_iso, to_epoch
+
+
+def is_batch(d):
+    return "samples" in d or any(isinstance(v, list) for v in d.values())
+
+
+def _rows(d):
+    if "samples" in d:
+        samples = d["samples"]
+        if not isinstance(samples, list):
+            raise ValueError("samples must be a list")
+        header = {k: v for k, v in d.items() if k != "samples"}
+        return [{**header, **sample} for sample in samples]
+
+    columns = {k: v for k, v in d.items() if isinstance(v, list)}
+    lengths = {len(v) for v in columns.values()}
+    if len(lengths) != 1:
+        raise ValueError("Batch columns must all have the same length")
+    n = lengths.pop()
+
+    header = {k: v for k, v in d.items() if k not in columns and k != "interval"}
+    if "interval" in d and "timestamp" in header:
+        start, interval = to_epoch(header.pop("timestamp")), float(d["interval"])
+        columns["timestamp"] = [epoch_to_iso(start + i * interval) for i in range(n)]
+    return [{**header, **{k: v[i] for k, v in columns.items()}} for i in range(n)]
+
+
+def validate_batch(d):
+    """Batched payload -> list of validated readings, in message order."""
+    rows = _rows(d)
+    if not rows:
+        raise ValueError("Empty batch")
+    if len(rows) > MAX_BATCH_SAMPLES:
+        raise ValueError(f"Batch of {len(rows)} samples exceeds MAX_BATCH_SAMPLES ({MAX_BATCH_SAMPLES})")
+
+    readings = []
+    for i, row in enumerate(rows):
+        try:
+            readings.append(validate_payload(row))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Sample {i}: {e}") from None
+    return readings
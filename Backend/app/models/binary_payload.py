@@ -0,0 +1,127 @@
+"""
+Fixed-layout binary sensor payload (alternative to JSON).
+
+Version 2, little-endian, 40 bytes:
+
+    offset  size  field
+    0       1     magic 0xA5 (a JSON payload starts with "{")
+    1       1     version (2)
+    2       1     flags: bit 0 = co_valid
+    3       1     reserved (0)
+    4       4     uint32 timestamp, epoch seconds (UTC)
+    8       4     int32 temp      \
+    12      4     int32 pressure   |
+    16      4     int32 co_mean    |  fixed point, value * 100
+    20      4     int32 co_max     |  (-2**31 = not measured)
+    24      4     int32 pm2_5      |
+    28      4     int32 pm10       |
+    32      4     int32 co2        |
+    36      4     int32 humidity  /   % RH, optional (-2**31 when absent)
+
+Version 1 is the same without the humidity field (36 bytes); it is still
+decoded, with humidity None.
+
+Fixed point carries exactly the two decimals the JSON payload has, and
+`raw / 100` gives the same float as parsing that JSON number.
+
+A batched message is several records of one version back to back
+(N * 40 bytes).
+
+The firmware encoder is `publishBinaryPayload` in device_code.ino.
+"""
+
+import struct
+
+from app.utils.time_utils import epoch_to_iso_cached, to_epoch
+
+MAGIC = 0xA5
+VERSION = 2
+FLAG_CO_VALID = 0x01
+
+SCALE = 100
+MISSING = -2 ** 31
+
+_LAYOUTS = {
+    1: struct.Struct("<BBBxI7i"),
+    2: struct.Struct("<BBBxI8i"),
+}
+SIZE = _LAYOUTS[VERSION].size
+
+_CHANNELS = ("temp", "pressure", "co_mean", "co_max", "pm2_5", "pm10", "co2")
+_OPTIONAL = ("humidity",)
+
+
+def is_binary_payload(payload):
+    return payload[:1] == b"\xa5"
+
+
+def encode_reading(reading, version=VERSION):
+    """Reading dict (as returned by validate_payload) -> binary payload."""
+    channels = _CHANNELS if version == 1 else _CHANNELS + _OPTIONAL
+    return _LAYOUTS[version].pack(
+        MAGIC,
+        version,
+        FLAG_CO_VALID if reading["co_valid"] else 0,
+        int(to_epoch(reading["timestamp"])),
+        *(MISSING if reading.get(c) is None else round(reading[c] * SCALE) for c in channels),
+    )
+
+
+def _version(payload):
+    """Version byte of the (first) record; records of a batch share it."""
+    version = payload[1] if len(payload) > 1 else VERSION
+    if version in _LAYOUTS:
+        return version
+    if is_binary_payload(payload):
+        raise ValueError(f"Unsupported binary payload version: {version}")
+    return VERSION   # _reading reports the bad magic byte
+
+
+def decode_reading(payload):
+    """Binary payload -> reading dict with the same fields as validate_payload."""
+    version = _version(payload)
+    layout = _LAYOUTS[version]
+    if len(payload) != layout.size:
+        raise ValueError(f"Binary payload must be {layout.size} bytes, got {len(payload)}")
+    return _reading(layout.unpack(payload), version)
+
+
+def decode_readings(payload):
+    """Batched binary payload (records back to back) -> list of reading dicts."""
+    version = _version(payload)
+    layout = _LAYOUTS[version]
+    if not payload or len(payload) % layout.size:
+        raise ValueError(f"Binary payload must be a multiple of {layout.size} bytes, got {len(payload)}")
+    readings = []
+    for i, fields in enumerate(layout.iter_unpack(payload)):
+        try:
+            readings.append(_reading(fields, version))
+        except ValueError as e:
+            raise ValueError(f"Sample {i}: {e}") from None
+    return readings
+
+
+def _reading(fields, expected_version):
+    magic, version, flags, ts, *values = fields
+    if magic != MAGIC:
+        raise ValueError(f"Bad magic byte: {magic:#04x}")
+    if version != expected_version:
+        raise ValueError(f"Binary payload version {version} in a batch of version {expected_version}")
+
+    humidity = values.pop() if version >= 2 else MISSING
+    if MISSING in values:
+        raise ValueError(f"Missing field: {_CHANNELS[values.index(MISSING)]}")
+
+    temp, pressure, co_mean, co_max, pm2_5, pm10, co2 = values
+    return {
+        "timestamp": epoch_to_iso_cached(ts),
+        "temp": temp / SCALE,
+        "pressure": pressure / SCALE,
+        "co_mean": co_mean / SCALE,
+        "co_max": co_max / SCALE,
+        "co_valid": bool(flags & FLAG_CO_VALID),
+        "pm2_5": pm2_5 / SCALE,
+        "pm10": pm10 / SCALE,
+        "co2": co2 / SCALE,
+        "humidity": None if humidity == MISSING else humidity / SCALE,
+    }
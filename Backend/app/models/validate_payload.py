@@ -1,3 +1,6 @@
+from app.utils.time_utils import to_epoch
+
+
 def validate_payload(d):
     required = [
         "timestamp", "temp", "pressure",
@@ -9,6 +12,12 @@ def validate_payload(d):
         if r not in d:
             raise ValueError(f"Missing field: {r}")
 
+    # Snapshots, the hot cache and the stores all work in epoch seconds
+    try:
+        to_epoch(d["timestamp"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timestamp: {d['timestamp']!r}") from None
+
     return {
         "timestamp": d["timestamp"],
         "temp": float(d["temp"]),
@@ -18,5 +27,7 @@ def validate_payload(d):
         "co_valid": bool(d["co_valid"]),
         "pm2_5": float(d["pm2_5"]),
         "pm10": float(d["pm10"]),
-        "co2": float(d["co2"])
+        "co2": float(d["co2"]),
+        # Optional: boards without a humidity sensor leave it out
+        "humidity": float(d["humidity"]) if d.get("humidity") is not None else None,
     }
@@ -1 +1,2 @@
 from .mqtt_listener import start_listener
+from .async_listener import AsyncMQTTListener, start_async_listener
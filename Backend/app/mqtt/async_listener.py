@@ -0,0 +1,469 @@
+"""
+asyncio MQTT listener (alternative to the blocking `start_listener`).
+
+paho's socket is driven by the event loop (add_reader / add_writer) instead
+of `loop_forever`, and the stages run as tasks connected by bounded queues:
+
+    on_message -> decode -> evaluate -> persist (writer thread)
+                                     -> publish
+
+As in IngestPipeline, a batched message travels as one item, and messages
+the ingest queue has no room for (or published while the broker is away)
+go to the spools. PRIORITY_INGEST turns the evaluate and publish queues
+into priority lanes, as in IngestPipeline.
+
+Publishes are pipelined: `client.publish` only queues the packet and the
+event loop writes it whenever the socket is writable, so a reading never
+waits for the acknowledgements of the previous one (at most
+MQTT_MAX_INFLIGHT QoS>0 messages are unacknowledged). Any number of sensor
+topics or wildcards can be subscribed (MQTT_TOPICS); a lost connection is
+retried with exponential backoff.
+"""
+
+import asyncio
+import random
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import paho.mqtt.client as mqtt
+
+from app.config.config import (
+    INGEST_QUEUE_SIZE,
+    MQTT_KEEPALIVE,
+    MQTT_MAX_INFLIGHT,
+    MQTT_PORT,
+    MQTT_RECONNECT_MAX_DELAY,
+    MQTT_RECONNECT_MIN_DELAY,
+    MQTT_SERVER,
+    MQTT_SYNC_TOPIC,
+    MQTT_TOPICS,
+    PIPELINE_QUEUE_SIZE,
+    PRIORITY_INGEST,
+    STATE_SNAPSHOT_INTERVAL,
+    STATE_SNAPSHOT_PATH,
+)
+from app.db.rollups_db import rollup_row
+from app.db.writer import get_writer
+from app.metrics.alert_sink import get_alert_sink
+from app.metrics.rollups import get_rollup_engine
+from app.mqtt.payloads import qos_for
+from app.mqtt.pipeline import (
+    _DRAIN,
+    _SPOOL_BATCH,
+    _STOP,
+    _SYNC,
+    decode_message,
+    evaluate_batch,
+    pipeline_collector,
+    publish_outbound,
+    raw_items,
+    spool_message,
+    unspool_message,
+)
+from app.mqtt.priority import AsyncLaneQueue, PriorityLanes, PublishLanes
+from app.mqtt.publisher import ChangePublisher
+from app.spool import get_spool
+from app.state.hot_cache import get_hot_state
+from app.state.snapshot import StateSnapshotter
+from app.telemetry.metrics import ERRORS, register_collector, unregister_collector
+
+_PERSIST_BATCH = 200   # messages handed to the writer thread per call
+
+
+def topic_is_device(topics):
+    """Whether the sensor topic identifies the device (several topics or wildcards)."""
+    return len(topics) > 1 or any("+" in t or "#" in t for t in topics)
+
+
+class AsyncMQTTListener:
+    def __init__(
+        self,
+        topics=MQTT_TOPICS,
+        host=MQTT_SERVER,
+        port=MQTT_PORT,
+        writer=None,
+        alert_sink=None,
+        rollups=None,
+        hot_state=None,
+        ingest_size=INGEST_QUEUE_SIZE,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        snapshot_interval=STATE_SNAPSHOT_INTERVAL,
+        spool=True,
+        client_id="",
+        protocol=mqtt.MQTTv311,
+        share_group=None,
+        accept=None,
+        snapshot_path=STATE_SNAPSHOT_PATH,
+        priority=PRIORITY_INGEST,
+    ):
+        self.topics = list(topics)
+        self.priority = priority
+        # Cluster workers: `share_group` subscribes through an MQTT v5 shared
+        # subscription, `accept(topic)` keeps only this worker's devices
+        self.share_group = share_group
+        self.accept = accept
+        self.host = host
+        self.port = port
+        self.writer = writer or get_writer()
+        self.alert_sink = alert_sink or get_alert_sink()
+        self.rollups = rollups or get_rollup_engine()
+        self.hot_state = get_hot_state() if hot_state is None else hot_state
+        self.ingest_size = ingest_size
+        self.queue_size = queue_size
+        self.device_from_topic = topic_is_device(self.topics)
+
+        self.counters = {
+            "received": 0,
+            "dropped": 0,
+            "spooled": 0,
+            "decoded": 0,
+            "evaluated": 0,
+            "persisted": 0,
+            "published": 0,
+            "errors": 0,
+            "reconnects": 0,
+            "skipped": 0,
+        }
+        if priority:
+            self.counters.update(
+                urgent=0, shed_superseded=0, shed_coalesced=0, shed_overflow=0, publish_superseded=0
+            )
+
+        self.client = mqtt.Client(client_id=client_id, protocol=protocol)
+        self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.ingest_spool = get_spool("ingest") if spool else None
+        self.publisher = ChangePublisher(self.client, spool=get_spool("outbound") if spool else None)
+        self.snapshots = None
+        if snapshot_interval:
+            self.snapshots = StateSnapshotter(
+                self, snapshot_path, snapshot_interval, known_devices_only=share_group is not None or accept is not None
+            )
+
+        self.loop = None
+        self._loop_thread = None
+        self._queues = {}
+        self._stopping = None
+        self._disconnected = None
+        self._delay = MQTT_RECONNECT_MIN_DELAY
+        # One thread keeps the writer calls in arrival order
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-persist")
+
+    # ------------------------------------------------
+    # paho callbacks
+    # ------------------------------------------------
+    def _call(self, func, *args):
+        # Connecting runs on an executor thread; loop methods must not
+        if threading.get_ident() == self._loop_thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call(self.loop.add_reader, sock.fileno(), client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call(self.loop.remove_reader, sock.fileno())
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call(self.loop.add_writer, sock.fileno(), client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call(self.loop.remove_writer, sock.fileno())
+
+    def _subscriptions(self):
+        if self.share_group is None:
+            return self.topics
+        return [f"$share/{self.share_group}/{topic}" for topic in self.topics]
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc != 0:
+            print(f"❌ MQTT connection refused (rc={rc})")
+            return
+        self._delay = MQTT_RECONNECT_MIN_DELAY
+        # (Re)subscribe on every connect: a clean session forgets subscriptions.
+        # Every worker gets the sync requests, each re-sends its own devices.
+        subscriptions = self._subscriptions()
+        client.subscribe(
+            [(topic, qos_for(topic)) for topic in subscriptions]
+            + [(MQTT_SYNC_TOPIC, qos_for(MQTT_SYNC_TOPIC))]
+        )
+        print(f"✅ MQTT connected, subscribed to {', '.join(subscriptions)}")
+        # Send what was spooled while the broker was away
+        self._call(self._request_drain)
+
+    def _request_drain(self):
+        try:
+            self._queues["publish"].put_nowait(_DRAIN)
+        except asyncio.QueueFull:
+            pass
+
+    def _on_disconnect(self, client, userdata, rc, properties=None):
+        self._call(self._disconnected.set)
+
+    def _on_message(self, client, userdata, msg):
+        if msg.topic == MQTT_SYNC_TOPIC:
+            try:
+                self._queues["publish"].put_nowait(_SYNC)
+            except asyncio.QueueFull:
+                pass
+            return
+        if self.accept is not None and not self.accept(msg.topic):
+            self.counters["skipped"] += 1
+            return
+        self.counters["received"] += 1
+        spool = self.ingest_spool
+        if spool is not None and len(spool):
+            # Behind the spooled backlog, to keep the arrival order
+            spool_message(spool, self.counters, msg.topic, msg.payload)
+            return
+        try:
+            self._queues["ingest"].put_nowait((msg.topic, msg.payload))
+        except asyncio.QueueFull:
+            if spool is not None:
+                spool_message(spool, self.counters, msg.topic, msg.payload)
+            else:
+                self.counters["dropped"] += 1
+
+    # ------------------------------------------------
+    # Connection management
+    # ------------------------------------------------
+    async def _connection_loop(self):
+        while not self._stopping.is_set():
+            self._disconnected.clear()
+            try:
+                await self.loop.run_in_executor(
+                    None, self.client.connect, self.host, self.port, MQTT_KEEPALIVE
+                )
+            except OSError as e:
+                print(f"⚠️ MQTT connect to {self.host}:{self.port} failed: {e}")
+            else:
+                await self._disconnected.wait()
+                if self._stopping.is_set():
+                    return
+                print("⚠️ MQTT connection lost")
+
+            self.counters["reconnects"] += 1
+            delay = self._delay * random.uniform(1.0, 1.5)
+            self._delay = min(self._delay * 2, MQTT_RECONNECT_MAX_DELAY)
+            print(f"🔄 Reconnecting in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _misc_loop(self):
+        # Keepalive pings and retries of unacknowledged QoS>0 messages
+        while not self._stopping.is_set():
+            self.client.loop_misc()
+            await asyncio.sleep(1)
+
+    # ------------------------------------------------
+    # Stages
+    # ------------------------------------------------
+    async def _decode(self, topic, payload):
+        try:
+            readings = decode_message(payload)
+        except Exception as e:
+            self.counters["errors"] += 1
+            ERRORS.inc(stage="decode", type=type(e).__name__)
+            print("❌ Decode error:", e)
+            return
+        if self.device_from_topic:
+            for reading in readings:
+                reading["device_id"] = topic
+        self.counters["decoded"] += len(readings)
+        shed = await self._queues["evaluate"].put(readings)
+        if shed:
+            await self._queues["persist"].put(raw_items(shed))
+
+    async def _decode_loop(self):
+        inbox = self._queues["ingest"]
+        spool = self.ingest_spool
+        while True:
+            if spool is not None and len(spool) and inbox.empty():
+                # The queue has caught up: the spooled messages come next
+                records = spool.peek(_SPOOL_BATCH)
+                spool.discard(len(records))
+                for record in records:
+                    await self._decode(*unspool_message(record))
+                continue
+            item = await inbox.get()
+            if item is _STOP:
+                # Whatever is still spooled is decoded after the next start
+                await self._queues["evaluate"].put(_STOP)
+                return
+            await self._decode(*item)
+
+    def _evaluation_error(self, e):
+        self.counters["errors"] += 1
+        ERRORS.inc(stage="evaluate", type=type(e).__name__)
+        print("❌ Evaluation error:", e)
+
+    async def _evaluate_loop(self):
+        inbox = self._queues["evaluate"]
+        persist, publish = self._queues["persist"], self._queues["publish"]
+        while True:
+            readings = await inbox.get()
+            if readings is _STOP:
+                self.writer.add_rows("rollups", [rollup_row(r) for r in self.rollups.flush()])
+                await persist.put(_STOP)
+                await publish.put(_STOP)
+                return
+            persist_items, publish_item, evaluated = evaluate_batch(
+                readings, self.alert_sink, self.rollups, self._evaluation_error
+            )
+            self.counters["evaluated"] += len(evaluated)
+            self.hot_state.observe(evaluated, publish_item)
+            await persist.put(persist_items)
+            if publish_item is not None:
+                await publish.put(publish_item)
+            if self.snapshots is not None:
+                self.snapshots.observe(evaluated)
+                self.snapshots.maybe_save()
+            # Give the decode and publish tasks a turn during bursts
+            await asyncio.sleep(0)
+
+    def _write_batch(self, batches):
+        for items in batches:
+            try:
+                self.writer.write_readings(items)
+                self.counters["persisted"] += len(items)
+            except Exception as e:
+                self.counters["errors"] += 1
+                ERRORS.inc(stage="persist", type=type(e).__name__)
+                print("❌ Storage error:", e)
+
+    async def _persist_loop(self):
+        inbox = self._queues["persist"]
+        stop = False
+        while not stop:
+            items = [await inbox.get()]
+            while len(items) < _PERSIST_BATCH and not inbox.empty():
+                items.append(inbox.get_nowait())
+            if items[-1] is _STOP:
+                items.pop()
+                stop = True
+            await self.loop.run_in_executor(self._db_executor, self._write_batch, items)
+        await self.loop.run_in_executor(self._db_executor, self.writer.flush)
+
+    async def _publish_loop(self):
+        inbox = self._queues["publish"]
+        while True:
+            item = await inbox.get()
+            if item is _STOP:
+                return
+            if item is _SYNC:
+                self.publisher.resync()
+                continue
+            if item is _DRAIN:
+                self.publisher.drain_spool()
+                continue
+            reading, status_packet, ventilation_actions = item
+            try:
+                messages = publish_outbound(
+                    self.publisher, status_packet, ventilation_actions, reading.get("device_id")
+                )
+            except Exception as e:
+                self.counters["errors"] += 1
+                ERRORS.inc(stage="publish", type=type(e).__name__)
+                print("❌ Publish error:", e)
+                continue
+
+            self.counters["published"] += 1
+            print("\n📥 Received:", reading)
+            for topic, payload in messages:
+                print(f"📡 Published to {topic}: {payload}")
+
+    # ------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------
+    def stop(self):
+        if self._stopping is not None:
+            self._call(self._stopping.set)
+
+    def depths(self):
+        return {name: q.qsize() for name, q in self._queues.items()}
+
+    def stats(self):
+        return {"queues": self.depths(), **self.counters}
+
+    async def run(self):
+        """Serve until `stop()` is called, then drain every stage and save a
+        final state snapshot."""
+        if self.snapshots is not None:
+            self.snapshots.restore()
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopping = asyncio.Event()
+        self._disconnected = asyncio.Event()
+        self._queues = {
+            "ingest": asyncio.Queue(self.ingest_size),
+            "evaluate": asyncio.Queue(self.queue_size),
+            "persist": asyncio.Queue(self.queue_size),
+            "publish": asyncio.Queue(self.queue_size),
+        }
+        if self.priority:
+            self._queues["evaluate"] = AsyncLaneQueue(PriorityLanes(self.queue_size, counters=self.counters))
+            self._queues["publish"] = AsyncLaneQueue(PublishLanes(self.queue_size, counters=self.counters))
+
+        stages = [
+            asyncio.create_task(self._decode_loop()),
+            asyncio.create_task(self._evaluate_loop()),
+            asyncio.create_task(self._persist_loop()),
+            asyncio.create_task(self._publish_loop()),
+        ]
+        network = [
+            asyncio.create_task(self._connection_loop()),
+            asyncio.create_task(self._misc_loop()),
+        ]
+        collector = pipeline_collector(self)
+        register_collector(collector)
+        print("🚀 Async MQTT listener ready...")
+        try:
+            await self._stopping.wait()
+        finally:
+            unregister_collector(collector)
+            self._stopping.set()
+            await self._queues["ingest"].put(_STOP)
+            await asyncio.gather(*stages, return_exceptions=True)
+            # DISCONNECT is queued behind the last publishes; wait for it to go out
+            if self.client.is_connected():
+                self.client.disconnect()
+                try:
+                    await asyncio.wait_for(self._disconnected.wait(), 5)
+                except asyncio.TimeoutError:
+                    pass
+            self._disconnected.set()
+            await asyncio.gather(*network, return_exceptions=True)
+            self._db_executor.shutdown(wait=True)
+            if self.snapshots is not None:
+                self.snapshots.save()
+            for spool in (self.ingest_spool, self.publisher.spool):
+                if spool is not None:
+                    spool.sync()
+
+
+def start_async_listener(topics=MQTT_TOPICS):
+    run_listener(AsyncMQTTListener(topics))
+
+
+def run_listener(listener):
+    """Serve `listener` until SIGINT / SIGTERM."""
+    async def _main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, listener.stop)
+            except (NotImplementedError, RuntimeError):
+                pass   # not available on this platform / thread
+        await listener.run()
+
+    asyncio.run(_main())
@@ -0,0 +1,337 @@
+"""
+Minimal MQTT broker for local runs and multi-worker tests (`manage.py broker`).
+
+Not a production broker: no persistence, no auth, no will messages, and
+QoS 1/2 deliveries are sent once without retry. It speaks MQTT 3.1.1 and 5
+(properties are skipped on input and sent empty) with enough of the protocol
+for paho and the firmware: CONNECT, PUBLISH at QoS 0/1/2, SUBSCRIBE with
+"+"/"#" wildcards (granted QoS capped at 1), UNSUBSCRIBE, retained messages,
+PINGREQ and DISCONNECT.
+
+Shared subscriptions (`$share/<group>/<filter>`) send each message to one
+member of the group, picked by a hash of the topic, so all the messages of
+one device reach the same worker as long as the group does not change.
+"""
+
+import asyncio
+import itertools
+import threading
+import zlib
+
+from app.config.config import LOCAL_BROKER_HOST, LOCAL_BROKER_PORT
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+_MAX_GRANTED_QOS = 1
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT filter matching; "$..." topics never match a leading wildcard."""
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    levels = topic.split("/")
+    parts = topic_filter.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+def _string(data, pos):
+    size = int.from_bytes(data[pos:pos + 2], "big")
+    pos += 2
+    return data[pos:pos + size].decode("utf-8"), pos + size
+
+
+def _encode_string(text):
+    raw = text.encode("utf-8")
+    return len(raw).to_bytes(2, "big") + raw
+
+
+def _varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ProtocolError("truncated length")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 21:
+            raise ProtocolError("malformed length")
+
+
+def _encode_varint(value):
+    out = bytearray()
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+def _packet(kind, body, flags=0):
+    return bytes([kind << 4 | flags]) + _encode_varint(len(body)) + body
+
+
+def _skip_properties(data, pos, v5):
+    if not v5:
+        return pos
+    size, pos = _varint(data, pos)
+    return pos + size
+
+
+class _Session:
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.v5 = False
+        self.subscriptions = {}   # filter -> granted qos
+        self._ids = itertools.cycle(range(1, 65536))
+
+    # --------------------------------------------
+    # Wire
+    # --------------------------------------------
+    async def _read_packet(self):
+        header = await self.reader.readexactly(1)
+        value = shift = 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+            if shift > 21:
+                raise ProtocolError("malformed length")
+        body = await self.reader.readexactly(value) if value else b""
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    def send(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def _empty_properties(self):
+        return b"\x00" if self.v5 else b""
+
+    def deliver(self, topic, payload, qos, retain=False):
+        body = _encode_string(topic)
+        if qos:
+            body += next(self._ids).to_bytes(2, "big")
+        body += self._empty_properties() + payload
+        self.send(_packet(PUBLISH, body, qos << 1 | int(retain)))
+
+    # --------------------------------------------
+    # Protocol
+    # --------------------------------------------
+    async def serve(self):
+        try:
+            kind, _, body = await self._read_packet()
+            if kind != CONNECT:
+                raise ProtocolError("expected CONNECT")
+            self._connect(body)
+            while True:
+                kind, flags, body = await self._read_packet()
+                if kind == DISCONNECT:
+                    break
+                self._handle(kind, flags, body)
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            self.broker.remove(self)
+            self.writer.close()
+
+    def _connect(self, body):
+        _, pos = _string(body, 0)   # protocol name
+        level = body[pos]
+        self.v5 = level == 5
+        flags = body[pos + 1]
+        pos = _skip_properties(body, pos + 4, self.v5)
+        self.client_id, pos = _string(body, pos)
+        if not self.client_id:
+            self.client_id = self.broker.next_client_id()
+        if flags & 0x04:   # will message: accepted, never sent
+            pos = _skip_properties(body, pos, self.v5)
+            _, pos = _string(body, pos)
+            size = int.from_bytes(body[pos:pos + 2], "big")
+            pos += 2 + size
+        self.broker.add(self)
+        self.send(_packet(CONNACK, b"\x00\x00" + self._empty_properties()))
+
+    def _handle(self, kind, flags, body):
+        if kind == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic, pos = _string(body, 0)
+            packet_id = None
+            if qos:
+                packet_id = body[pos:pos + 2]
+                pos += 2
+            pos = _skip_properties(body, pos, self.v5)
+            self.broker.publish(topic, body[pos:], qos, bool(flags & 0x01))
+            if qos == 1:
+                self.send(_packet(PUBACK, packet_id))
+            elif qos == 2:
+                self.send(_packet(PUBREC, packet_id))
+        elif kind == PUBREL:
+            self.send(_packet(PUBCOMP, body[:2]))
+        elif kind in (PUBACK, PUBCOMP):
+            pass   # deliveries are not retried, nothing to release
+        elif kind == PUBREC:
+            self.send(_packet(PUBREL, body[:2], 0x02))
+        elif kind == SUBSCRIBE:
+            packet_id = body[:2]
+            pos = _skip_properties(body, 2, self.v5)
+            granted = bytearray()
+            filters = []
+            while pos < len(body):
+                topic_filter, pos = _string(body, pos)
+                qos = min(body[pos] & 0x03, _MAX_GRANTED_QOS)
+                pos += 1
+                self.subscriptions[topic_filter] = qos
+                self.broker.subscribe(self, topic_filter)
+                granted.append(qos)
+                filters.append(topic_filter)
+            self.send(_packet(SUBACK, packet_id + self._empty_properties() + bytes(granted)))
+            for topic_filter in filters:
+                self.broker.send_retained(self, topic_filter)
+        elif kind == UNSUBSCRIBE:
+            packet_id = body[:2]
+            pos = _skip_properties(body, 2, self.v5)
+            count = 0
+            while pos < len(body):
+                topic_filter, pos = _string(body, pos)
+                self.subscriptions.pop(topic_filter, None)
+                self.broker.unsubscribe(self, topic_filter)
+                count += 1
+            reasons = b"\x00" * count if self.v5 else b""
+            self.send(_packet(UNSUBACK, packet_id + self._empty_properties() + reasons))
+        elif kind == PINGREQ:
+            self.send(_packet(PINGRESP, b""))
+        else:
+            raise ProtocolError(f"unexpected packet type {kind}")
+
+
+class LocalBroker:
+    def __init__(self):
+        self.sessions = {}   # client id -> session
+        self.shared = {}     # (group, filter) -> sessions, ordered by client id
+        self.retained = {}   # topic -> (payload, qos)
+        self._anonymous = itertools.count(1)
+        self.server = None
+
+    def next_client_id(self):
+        return f"local-{next(self._anonymous)}"
+
+    def add(self, session):
+        previous = self.sessions.get(session.client_id)
+        if previous is not None:   # same client id: the old connection is dropped
+            self.remove(previous)
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+
+    def remove(self, session):
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        for topic_filter in list(session.subscriptions):
+            self.unsubscribe(session, topic_filter)
+
+    @staticmethod
+    def _shared(topic_filter):
+        if topic_filter.startswith("$share/"):
+            _, group, inner = topic_filter.split("/", 2)
+            return group, inner
+        return None
+
+    def subscribe(self, session, topic_filter):
+        shared = self._shared(topic_filter)
+        if shared is None:
+            return
+        members = self.shared.setdefault(shared, [])
+        if session not in members:
+            members.append(session)
+            members.sort(key=lambda s: s.client_id)
+
+    def unsubscribe(self, session, topic_filter):
+        shared = self._shared(topic_filter)
+        if shared is None:
+            return
+        members = self.shared.get(shared, [])
+        if session in members:
+            members.remove(session)
+        if not members:
+            self.shared.pop(shared, None)
+
+    def send_retained(self, session, topic_filter):
+        if self._shared(topic_filter) is not None:
+            return   # retained messages are not sent to shared subscriptions
+        for topic, (payload, qos) in self.retained.items():
+            if topic_matches(topic_filter, topic):
+                session.deliver(topic, payload, min(qos, session.subscriptions[topic_filter]), retain=True)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for session in list(self.sessions.values()):
+            granted = [
+                q for f, q in session.subscriptions.items()
+                if self._shared(f) is None and topic_matches(f, topic)
+            ]
+            if granted:
+                session.deliver(topic, payload, min(qos, max(granted)))
+        for (group, topic_filter), members in self.shared.items():
+            if members and topic_matches(topic_filter, topic):
+                member = members[zlib.crc32(topic.encode()) % len(members)]
+                granted = member.subscriptions.get(f"$share/{group}/{topic_filter}", 0)
+                member.deliver(topic, payload, min(qos, granted))
+
+    async def _client(self, reader, writer):
+        await _Session(self, reader, writer).serve()
+
+    async def start(self, host=LOCAL_BROKER_HOST, port=LOCAL_BROKER_PORT):
+        self.server = await asyncio.start_server(self._client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+
+def run_broker(host=LOCAL_BROKER_HOST, port=LOCAL_BROKER_PORT):
+    """Serve until interrupted."""
+    async def _main():
+        broker = LocalBroker()
+        bound = await broker.start(host, port)
+        print(f"🛰️ Local MQTT broker on {host}:{bound}")
+        async with broker.server:
+            await broker.server.serve_forever()
+
+    asyncio.run(_main())
+
+
+def start_local_broker_thread(host=LOCAL_BROKER_HOST, port=0):
+    """Serve on a daemon thread; returns (broker, bound port). Port 0 picks a free one."""
+    broker = LocalBroker()
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    bound = []
+
+    def _run():
+        asyncio.set_event_loop(loop)
+        bound.append(loop.run_until_complete(broker.start(host, port)))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=_run, name="local-broker", daemon=True).start()
+    ready.wait()
+    print(f"🛰️ Local MQTT broker on {host}:{bound[0]}")
+    return broker, bound[0]
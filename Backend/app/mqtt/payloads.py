@@ -0,0 +1,105 @@
+from app.config.config import (
+    MQTT_DEFAULT_QOS,
+    MQTT_TOPIC_QOS,
+    MQTT_UNITY_ALERT_TOPIC,
+    MQTT_UNITY_TOPIC,
+    MQTT_VENTILATION_TOPIC,
+)
+
+
+def _extract_color(level: str) -> str:
+    sanitized = (level or "").replace("_", "-")
+    return sanitized.split("-")[0] if "-" in sanitized else sanitized or "unknown"
+
+
+def build_unity_payload(status_packet):
+    return {
+        "timestamp": status_packet.get("timestamp"),
+        "co": _extract_color(status_packet.get("co", {}).get("level", "")),
+        "co2": _extract_color(status_packet.get("co2", {}).get("level", "")),
+        "pm2_5": _extract_color(
+            status_packet.get("pm", {}).get("pm2_5", {}).get("level", "")
+        ),
+        "pm10": _extract_color(
+            status_packet.get("pm", {}).get("pm10", {}).get("level", "")
+        ),
+        "temp": _extract_color(status_packet.get("temp", {}).get("level", "")),
+        "wbgt": _extract_color(status_packet.get("wbgt", {}).get("level", "")),
+        "pressure": _extract_color(status_packet.get("pressure", {}).get("level", "")),
+    }
+
+def build_unity_alert_messages(status_packet):
+    ts = status_packet.get("timestamp")
+
+    severity_rank = {"none": 0, "warning": 1, "high": 2, "critical": 3}
+
+    def _append_if_active(messages, name, data):
+        if not data:
+            return
+
+        # Current or expected (forecast) severity, whichever is worse
+        severity = data.get("severity", "none")
+        predicted = data.get("predicted_severity", "none")
+        if severity_rank.get(predicted, 0) > severity_rank.get(severity, 0):
+            severity = predicted
+        if severity not in {"warning", "high", "critical"}:
+            return
+
+        messages.append(
+            {
+                "gas": name,
+                "predicted_value": data.get("predicted_value", data.get("value")),
+                "level": severity,
+                "timestamp": ts,
+            }
+        )
+
+    alerts = []
+    pm = status_packet.get("pm", {})
+    _append_if_active(alerts, "co", status_packet.get("co"))
+    _append_if_active(alerts, "co2", status_packet.get("co2"))
+    _append_if_active(alerts, "pm2_5", pm.get("pm2_5"))
+    _append_if_active(alerts, "pm10", pm.get("pm10"))
+    _append_if_active(alerts, "temp", status_packet.get("temp"))
+    _append_if_active(alerts, "wbgt", status_packet.get("wbgt"))
+    _append_if_active(alerts, "pressure", status_packet.get("pressure"))
+
+    if not alerts:
+        return []
+
+    def _score(alert):
+        base = severity_rank.get(alert.get("level", "none"), 0)
+        value = alert.get("predicted_value")
+        return (base, value if isinstance(value, (int, float)) else float("-inf"))
+
+    worst = alerts[0]
+    worst_score = _score(worst)
+
+    for alert in alerts[1:]:
+        score = _score(alert)
+        if score > worst_score:
+            worst, worst_score = alert, score
+
+    return [worst]
+
+
+def build_ventilation_command(ventilation_actions):
+    """Ventilation payload sent to the fan controllers (reasons stay local)."""
+    publish_payload = dict(ventilation_actions)
+    publish_payload.pop("reasons", None)
+    return publish_payload
+
+
+def build_outbound_messages(status_packet, ventilation_actions):
+    """Return every (topic, payload) pair published for one evaluated reading."""
+    messages = [
+        (MQTT_VENTILATION_TOPIC, build_ventilation_command(ventilation_actions)),
+        (MQTT_UNITY_TOPIC, build_unity_payload(status_packet)),
+    ]
+    for alert_msg in build_unity_alert_messages(status_packet):
+        messages.append((MQTT_UNITY_ALERT_TOPIC, alert_msg))
+    return messages
+
+
+def qos_for(topic):
+    return MQTT_TOPIC_QOS.get(topic, MQTT_DEFAULT_QOS)
@@ -0,0 +1,406 @@
+"""
+Staged ingest pipeline.
+
+The MQTT callback only hands raw payloads to `IngestPipeline.submit`; the
+work happens on dedicated worker threads connected by bounded queues:
+
+    ingest -> decode -> evaluate -> persist
+                                 -> publish
+
+One message may carry a batch of readings. The batch travels through the
+stages as one item: its readings are evaluated in order, persisted
+together (in the same group commit) and only the state after the last one
+is published.
+
+Only the ingest queue is fed from paho's network thread and it never
+blocks: when it is full the payload goes to the ingest spool (app/spool),
+and so does everything after it until the decoder has caught up with the
+queue and then with the spool. Without a spool (or once it is full) the
+payload is dropped and counted. The internal queues block, so a slow stage
+pushes back on the stages before it and the burst is absorbed by the ingest
+queue and spool instead of the broker connection.
+
+With PRIORITY_INGEST the evaluate and publish queues are priority lanes
+(app/mqtt/priority.py): urgent readings and HVAC commands go first, and
+under overload routine readings skip evaluation and are persisted raw.
+"""
+
+import json
+import queue
+import threading
+import time
+
+from app.config.config import (
+    INGEST_QUEUE_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_STATS_INTERVAL,
+    PRIORITY_INGEST,
+    STATE_SNAPSHOT_INTERVAL,
+)
+from app.db.rollups_db import rollup_row
+from app.db.writer import get_writer
+from app.hvac.hvac_controller import decide_hvac_actions
+from app.metrics.alert_sink import get_alert_sink
+from app.metrics.evaluator import evaluate_all_metrics
+from app.metrics.rollups import get_rollup_engine
+from app.models.batch_payload import is_batch, validate_batch
+from app.models.binary_payload import decode_readings, is_binary_payload
+from app.models.validate_payload import validate_payload
+from app.mqtt.payloads import build_outbound_messages
+from app.mqtt.priority import LaneQueue, PriorityLanes, PublishLanes
+from app.mqtt.publisher import ChangePublisher
+from app.spool import SpoolFull, get_spool
+from app.state.hot_cache import get_hot_state
+from app.state.snapshot import StateSnapshotter
+from app.telemetry.metrics import (
+    ALERTS,
+    ERRORS,
+    STAGE_SECONDS,
+    register_collector,
+    unregister_collector,
+)
+
+_STOP = object()
+_SYNC = object()
+_DRAIN = object()
+
+_SPOOL_BATCH = 100   # spooled payloads taken at once
+_SPOOL_POLL = 0.1    # seconds the decoder waits on an empty queue before checking the spool
+
+
+def spool_message(spool, counters, topic, payload):
+    """Keep an inbound message in the ingest spool; False if it was dropped."""
+    try:
+        kept = spool.append(topic.encode() + b"\0" + payload)
+    except (SpoolFull, ValueError):
+        kept = False
+    counters["spooled" if kept else "dropped"] += 1
+    return kept
+
+
+def unspool_message(record):
+    """Ingest spool record -> (topic, payload)."""
+    topic, _, payload = bytes(record).partition(b"\0")
+    return topic.decode(), payload
+
+
+def decode_message(payload):
+    """Raw MQTT payload (binary or JSON bytes) -> list of validated readings."""
+    if is_binary_payload(payload):
+        # Fixed layout: unpacking already yields typed, complete fields
+        with STAGE_SECONDS.time(stage="decode"):
+            return decode_readings(payload)
+    with STAGE_SECONDS.time(stage="decode"):
+        data = json.loads(payload.decode())
+    with STAGE_SECONDS.time(stage="validate"):
+        if is_batch(data):
+            return validate_batch(data)
+        return [validate_payload(data)]
+
+
+def evaluate_reading(reading, alert_sink, rollups):
+    """Evaluate one reading; returns (persist item, publish item)."""
+    with STAGE_SECONDS.time(stage="evaluate"):
+        results = evaluate_all_metrics(reading)
+    status_packet = results["results"]["status_packet"]
+    with STAGE_SECONDS.time(stage="hvac"):
+        ventilation_actions = decide_hvac_actions(status_packet, reading.get("device_id"))
+    # Only alert episode transitions are persisted
+    with STAGE_SECONDS.time(stage="alerts"):
+        alerts = alert_sink.process(reading["timestamp"], results["alerts"], reading.get("device_id"))
+    for alert in alerts:
+        ALERTS.inc(category=alert["category"], state=alert.get("state", "open"))
+    with STAGE_SECONDS.time(stage="rollups"):
+        rollup_rows = rollups.observe(reading, results["metrics"])
+    return (
+        (reading, results["metrics"], alerts, ventilation_actions, rollup_rows),
+        (reading, status_packet, ventilation_actions),
+    )
+
+
+def raw_items(readings):
+    """Persist items storing readings without evaluation results."""
+    return [(reading, (), (), None) for reading in readings]
+
+
+def evaluate_batch(readings, alert_sink, rollups, on_error=None):
+    """Evaluate a batch in order.
+
+    Returns (persist items, publish item of the last evaluated reading or
+    None, the readings evaluated). A reading that fails evaluation is
+    reported to `on_error` and still persisted (raw).
+    """
+    persist_items, publish_item, evaluated = [], None, []
+    for reading in readings:
+        try:
+            persist_item, publish_item = evaluate_reading(reading, alert_sink, rollups)
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+            persist_items.extend(raw_items([reading]))
+            continue
+        persist_items.append(persist_item)
+        evaluated.append(reading)
+    return persist_items, publish_item, evaluated
+
+
+def publish_outbound(publisher, status_packet, ventilation_actions, device_id=None):
+    """Publish the outbound messages of one reading; returns those actually sent."""
+    with STAGE_SECONDS.time(stage="publish"):
+        messages = build_outbound_messages(status_packet, ventilation_actions)
+        return publisher.publish_all(messages, device_id)
+
+
+def pipeline_collector(pipeline):
+    """Telemetry collector exposing a pipeline's counters and queue depths."""
+    def collect():
+        return [
+            ("ingest_messages_total", "counter", "Readings through each pipeline step",
+             [({"event": name}, value) for name, value in pipeline.counters.items()]),
+            ("ingest_queue_depth", "gauge", "Items waiting in each pipeline queue",
+             [({"queue": name}, depth) for name, depth in pipeline.depths().items()]),
+            ("db_pending_rows", "gauge", "Rows buffered in the DB writer",
+             [({}, pipeline.writer.pending())]),
+        ]
+    return collect
+
+
+class IngestPipeline:
+    def __init__(
+        self,
+        client,
+        writer=None,
+        alert_sink=None,
+        rollups=None,
+        hot_state=None,
+        ingest_size=INGEST_QUEUE_SIZE,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        stats_interval=PIPELINE_STATS_INTERVAL,
+        snapshot_interval=STATE_SNAPSHOT_INTERVAL,
+        spool=True,
+        priority=PRIORITY_INGEST,
+    ):
+        self.client = client
+        self.ingest_spool = get_spool("ingest") if spool else None
+        self.publisher = ChangePublisher(client, spool=get_spool("outbound") if spool else None)
+        self.writer = writer or get_writer()
+        self.alert_sink = alert_sink or get_alert_sink()
+        self.rollups = rollups or get_rollup_engine()
+        self.hot_state = get_hot_state() if hot_state is None else hot_state
+        self.stats_interval = stats_interval
+        self.snapshots = StateSnapshotter(self, interval=snapshot_interval) if snapshot_interval else None
+
+        self.counters = {
+            "received": 0,
+            "dropped": 0,
+            "spooled": 0,
+            "decoded": 0,
+            "evaluated": 0,
+            "persisted": 0,
+            "published": 0,
+            "errors": 0,
+        }
+        self.queues = {
+            "ingest": queue.Queue(ingest_size),
+            "evaluate": queue.Queue(queue_size),
+            "persist": queue.Queue(queue_size),
+            "publish": queue.Queue(queue_size),
+        }
+        if priority:
+            self.counters.update(
+                urgent=0, shed_superseded=0, shed_coalesced=0, shed_overflow=0, publish_superseded=0
+            )
+            self.queues["evaluate"] = LaneQueue(PriorityLanes(queue_size, counters=self.counters))
+            self.queues["publish"] = LaneQueue(PublishLanes(queue_size, counters=self.counters))
+        self._threads = []
+        self._stopped = threading.Event()
+        self._collector = pipeline_collector(self)
+
+    # ------------------------------------------------
+    # Entry point (called on paho's network thread)
+    # ------------------------------------------------
+    def submit(self, payload, topic=""):
+        self.counters["received"] += 1
+        spool = self.ingest_spool
+        if spool is not None and len(spool):
+            # Behind the spooled backlog, to keep the arrival order
+            return spool_message(spool, self.counters, topic, payload)
+        try:
+            self.queues["ingest"].put_nowait(payload)
+            return True
+        except queue.Full:
+            if spool is not None:
+                return spool_message(spool, self.counters, topic, payload)
+            self.counters["dropped"] += 1
+            return False
+
+    def request_sync(self):
+        """Re-send the full state of every outbound topic (a client joined)."""
+        try:
+            self.queues["publish"].put_nowait(_SYNC)
+        except queue.Full:
+            pass
+
+    def request_drain(self):
+        """Send the spooled outbound messages (the broker is back)."""
+        try:
+            self.queues["publish"].put_nowait(_DRAIN)
+        except queue.Full:
+            pass
+
+    def depths(self):
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def stats(self):
+        return {"queues": self.depths(), **self.counters}
+
+    # ------------------------------------------------
+    # Stages
+    # ------------------------------------------------
+    def _decode(self, payload):
+        try:
+            readings = decode_message(payload)
+        except Exception as e:
+            self.counters["errors"] += 1
+            ERRORS.inc(stage="decode", type=type(e).__name__)
+            print("❌ Decode error:", e)
+            return
+        self.counters["decoded"] += len(readings)
+        shed = self.queues["evaluate"].put(readings)
+        if shed:
+            self.queues["persist"].put(raw_items(shed))
+
+    def _decode_loop(self):
+        inbox = self.queues["ingest"]
+        spool = self.ingest_spool
+        while True:
+            if spool is not None and len(spool) and inbox.empty():
+                # The queue has caught up: the spooled payloads come next
+                records = spool.peek(_SPOOL_BATCH)
+                spool.discard(len(records))
+                for record in records:
+                    self._decode(unspool_message(record)[1])
+                continue
+            try:
+                payload = inbox.get(timeout=None if spool is None else _SPOOL_POLL)
+            except queue.Empty:
+                continue
+            if payload is _STOP:
+                # Whatever is still spooled is decoded after the next start
+                self.queues["evaluate"].put(_STOP)
+                return
+            self._decode(payload)
+
+    def _evaluation_error(self, e):
+        self.counters["errors"] += 1
+        ERRORS.inc(stage="evaluate", type=type(e).__name__)
+        print("❌ Evaluation error:", e)
+
+    def _evaluate_loop(self):
+        inbox = self.queues["evaluate"]
+        persist, publish = self.queues["persist"], self.queues["publish"]
+        while True:
+            readings = inbox.get()
+            if readings is _STOP:
+                # Keep the partial buckets; they are replaced once complete
+                self.writer.add_rows("rollups", [rollup_row(r) for r in self.rollups.flush()])
+                persist.put(_STOP)
+                publish.put(_STOP)
+                return
+            # Readings that fail evaluation are still persisted (raw)
+            persist_items, publish_item, evaluated = evaluate_batch(
+                readings, self.alert_sink, self.rollups, self._evaluation_error
+            )
+            self.counters["evaluated"] += len(evaluated)
+            self.hot_state.observe(evaluated, publish_item)
+            persist.put(persist_items)
+            if publish_item is not None:
+                publish.put(publish_item)
+            if self.snapshots is not None:
+                self.snapshots.observe(evaluated)
+                self.snapshots.maybe_save()
+
+    def _persist_loop(self):
+        inbox = self.queues["persist"]
+        while True:
+            items = inbox.get()
+            if items is _STOP:
+                self.writer.flush()
+                return
+            try:
+                self.writer.write_readings(items)
+                self.counters["persisted"] += len(items)
+            except Exception as e:
+                self.counters["errors"] += 1
+                ERRORS.inc(stage="persist", type=type(e).__name__)
+                print("❌ Storage error:", e)
+
+    def _publish_loop(self):
+        inbox = self.queues["publish"]
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            if item is _SYNC:
+                self.publisher.resync()
+                continue
+            if item is _DRAIN:
+                self.publisher.drain_spool()
+                continue
+            reading, status_packet, ventilation_actions = item
+            try:
+                messages = publish_outbound(
+                    self.publisher, status_packet, ventilation_actions, reading.get("device_id")
+                )
+            except Exception as e:
+                self.counters["errors"] += 1
+                ERRORS.inc(stage="publish", type=type(e).__name__)
+                print("❌ Publish error:", e)
+                continue
+
+            self.counters["published"] += 1
+            print("\n📥 Received:", reading)
+            for topic, payload in messages:
+                print(f"📡 Published to {topic}: {payload}")
+
+    def _stats_loop(self):
+        while not self._stopped.wait(self.stats_interval):
+            print(f"📈 Pipeline stats: {self.stats()}")
+
+    # ------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------
+    def start(self):
+        if self.snapshots is not None:
+            self.snapshots.restore()
+        register_collector(self._collector)
+        targets = {
+            "decode": self._decode_loop,
+            "evaluate": self._evaluate_loop,
+            "persist": self._persist_loop,
+            "publish": self._publish_loop,
+        }
+        if self.stats_interval:
+            targets["stats"] = self._stats_loop
+
+        for name, target in targets.items():
+            thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Drain every queue, flush the writer, stop the workers and save
+        a final state snapshot."""
+        self.queues["ingest"].put(_STOP)
+        self._stopped.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            thread.join(remaining)
+        self._threads = []
+        unregister_collector(self._collector)
+        if self.snapshots is not None:
+            self.snapshots.save()
+        for spool in (self.ingest_spool, self.publisher.spool):
+            if spool is not None:
+                spool.sync()
@@ -0,0 +1,351 @@
+"""
+Priority scheduling and load shedding between decode and evaluate, and
+in front of the publisher.
+
+Decoded batches are triaged on their raw values:
+
+- URGENT: CO (co_max), CO2 or PM at or near a danger band (PRIORITY_NEAR_DANGER
+  of the lower bound of the first "high" severity band);
+- ROUTINE: every channel in its green band;
+- NORMAL: anything else.
+
+PriorityLanes keeps one FIFO lane per device, so a device's readings are
+still evaluated in order (exposure windows, alert episodes and forecasts
+depend on it). Lanes holding an urgent batch are served before all others,
+the rest round-robin. Readings taken out of evaluation are "shed": they are
+still persisted, raw, but produce no metrics, alerts or commands:
+
+- past PRIORITY_SHED_WATERMARK of the capacity, routine batches queued ahead
+  of an urgent one in the same lane (superseded), and a routine batch
+  replaces the routine batch at the tail of its lane (coalesced); once the
+  lanes are full it is shed outright (overflow). Normal batches wait for room;
+- when the lanes are full, an urgent batch evicts a queued routine batch
+  (overflow); with none left it waits for room like a normal batch.
+
+PublishLanes sends HVAC commands (a mode other than NORMAL, or a mode
+change) and the state of urgent readings first. Outbound topics carry the
+latest state, so the older queued items of that device are dropped instead
+of being published after it.
+
+LaneQueue / AsyncLaneQueue wrap either kind for the threaded pipeline and
+the asyncio listener.
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+from app.config.config import PRIORITY_NEAR_DANGER, PRIORITY_SHED_WATERMARK
+from app.metrics.classifier import (
+    CO2_CLASSIFIER,
+    CO_CLASSIFIER,
+    PM10_CLASSIFIER,
+    PM25_CLASSIFIER,
+    PRESSURE_CLASSIFIER,
+    SEVERITY_RANK,
+    TEMP_CLASSIFIER,
+)
+
+URGENT, NORMAL, ROUTINE = 0, 1, 2
+
+
+def _danger_floor(classifier):
+    return min(low for _, severity, low, _ in classifier.bands if SEVERITY_RANK[severity] >= SEVERITY_RANK["high"])
+
+
+# field -> value from which a reading is urgent
+_NEAR_DANGER = {
+    field: _danger_floor(classifier) * PRIORITY_NEAR_DANGER
+    for field, classifier in (
+        ("co_max", CO_CLASSIFIER),
+        ("co2", CO2_CLASSIFIER),
+        ("pm2_5", PM25_CLASSIFIER),
+        ("pm10", PM10_CLASSIFIER),
+    )
+}
+_ROUTINE = (
+    ("co_max", CO_CLASSIFIER),
+    ("co2", CO2_CLASSIFIER),
+    ("pm2_5", PM25_CLASSIFIER),
+    ("pm10", PM10_CLASSIFIER),
+    ("temp", TEMP_CLASSIFIER),
+    ("pressure", PRESSURE_CLASSIFIER),
+)
+
+
+def reading_priority(reading):
+    for field, limit in _NEAR_DANGER.items():
+        value = reading.get(field)
+        if value is not None and value >= limit:
+            return URGENT
+    for field, classifier in _ROUTINE:
+        value = reading.get(field)
+        if value is None or classifier.classify(value)[0] != "green":
+            return NORMAL
+    return ROUTINE
+
+
+def batch_priority(readings):
+    return min((reading_priority(r) for r in readings), default=NORMAL)
+
+
+def _count(counters, key, n=1):
+    if counters is not None:
+        counters[key] = counters.get(key, 0) + n
+
+
+class PriorityLanes:
+    """Per-device lanes of decoded batches; see the module docstring."""
+
+    def __init__(self, capacity, watermark=PRIORITY_SHED_WATERMARK, counters=None):
+        self.capacity = capacity
+        self.shed_at = max(1, int(capacity * watermark))
+        self.counters = counters
+        self._lanes = {}     # device -> deque of [priority, readings]
+        self._urgent = {}    # device -> urgent batches queued; served in insertion order
+        self._ready = deque()   # devices with a lane and nothing urgent, round-robin
+        self._size = 0
+        self._after = deque()   # stop requests, handed out once the lanes are empty
+
+    def __len__(self):
+        return self._size + len(self._after)
+
+    def offer(self, readings):
+        """Queue a batch. Returns (accepted, shed readings); a normal batch,
+        or an urgent one with no routine batch to evict, is refused (nothing
+        changes) while the lanes are full."""
+        if not isinstance(readings, list):
+            self._after.append(readings)
+            return True, ()
+        priority = batch_priority(readings)
+        device = readings[0].get("device_id") if readings else None
+        lane = self._lanes.get(device)
+        shed = []
+
+        if priority == URGENT:
+            if lane and self._size >= self.shed_at:
+                # Under load, harmless samples ahead of it are not worth the wait
+                for item in [item for item in lane if item[0] == ROUTINE]:
+                    lane.remove(item)
+                    self._shed(shed, item[1], "superseded")
+            if self._size >= self.capacity and not self._evict_routine(shed):
+                return False, shed
+            _count(self.counters, "urgent", len(readings))
+            lane = self._lanes.get(device)   # eviction may have emptied it
+            if lane is None:
+                lane = self._lanes[device] = deque()
+            elif device not in self._urgent:
+                self._ready.remove(device)
+            lane.append([priority, readings])
+            self._size += 1
+            self._urgent[device] = self._urgent.get(device, 0) + 1
+            return True, shed
+
+        if priority == ROUTINE and self._size >= self.shed_at:
+            if lane and lane[-1][0] == ROUTINE:
+                self._shed(shed, lane[-1][1], "coalesced", dequeued=False)
+                lane[-1][1] = readings
+                return True, shed
+            if self._size >= self.capacity:
+                self._shed(shed, readings, "overflow", dequeued=False)
+                return True, shed
+        elif self._size >= self.capacity:
+            return False, shed
+
+        if lane is None:
+            lane = self._lanes[device] = deque()
+        if not lane and device not in self._urgent:
+            self._ready.append(device)
+        lane.append([priority, readings])
+        self._size += 1
+        return True, shed
+
+    def _shed(self, shed, readings, reason, dequeued=True):
+        shed.extend(readings)
+        _count(self.counters, f"shed_{reason}", len(readings))
+        if dequeued:
+            self._size -= 1
+
+    def _evict_routine(self, shed):
+        for device in self._ready:
+            lane = self._lanes[device]
+            for item in lane:
+                if item[0] == ROUTINE:
+                    lane.remove(item)
+                    self._shed(shed, item[1], "overflow")
+                    if not lane:
+                        del self._lanes[device]
+                        self._ready.remove(device)
+                    return True
+        return False
+
+    def pop(self):
+        """Next batch to evaluate, or None."""
+        if self._urgent:
+            device = next(iter(self._urgent))
+            lane = self._lanes[device]
+            priority, readings = lane.popleft()
+            if priority == URGENT:
+                self._urgent[device] -= 1
+                if not self._urgent[device]:
+                    del self._urgent[device]
+                    if lane:
+                        self._ready.append(device)
+        elif self._ready:
+            device = self._ready.popleft()
+            lane = self._lanes[device]
+            priority, readings = lane.popleft()
+            if lane:
+                self._ready.append(device)
+        elif self._after:
+            return self._after.popleft()
+        else:
+            return None
+        if not lane:
+            del self._lanes[device]
+        self._size -= 1
+        return readings
+
+
+def _command_mode(item):
+    ventilation = item[2]
+    return ventilation.get("ventilation_mode") if ventilation else None
+
+
+class PublishLanes:
+    """Publish items, HVAC commands and urgent readings first; see the module docstring."""
+
+    def __init__(self, capacity, counters=None):
+        self.capacity = capacity
+        self.counters = counters
+        self._urgent = deque()
+        self._normal = deque()
+        self._queued = {}  # device -> publish items queued
+        self._modes = {}   # device -> last queued ventilation mode
+
+    def __len__(self):
+        return len(self._urgent) + len(self._normal)
+
+    def offer(self, item):
+        if not isinstance(item, tuple):   # sync / drain / stop requests
+            self._normal.append(item)
+            return True, ()
+        device = item[0].get("device_id")
+        mode = _command_mode(item)
+        previous = self._modes.get(device, "NORMAL")
+        urgent = (mode is not None and (mode != "NORMAL" or mode != previous)) or reading_priority(item[0]) == URGENT
+        if not urgent and len(self) >= self.capacity:
+            return False, ()
+        self._modes[device] = mode
+        if urgent:
+            if self._queued.get(device):
+                self._drop_device(device)
+            self._urgent.append(item)
+        else:
+            self._normal.append(item)
+        self._queued[device] = self._queued.get(device, 0) + 1
+        return True, ()
+
+    def _drop_device(self, device):
+        for name in ("_urgent", "_normal"):
+            items = getattr(self, name)
+            kept = deque(i for i in items if not (isinstance(i, tuple) and i[0].get("device_id") == device))
+            _count(self.counters, "publish_superseded", len(items) - len(kept))
+            setattr(self, name, kept)
+        del self._queued[device]
+
+    def pop(self):
+        queue = self._urgent or self._normal
+        if not queue:
+            return None
+        item = queue.popleft()
+        if isinstance(item, tuple):
+            device = item[0].get("device_id")
+            self._queued[device] -= 1
+            if not self._queued[device]:
+                del self._queued[device]
+        return item
+
+
+class LaneQueue:
+    """Blocking queue over PriorityLanes / PublishLanes for worker threads.
+
+    `put` returns the readings shed to make room (persist them raw)."""
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            while True:
+                accepted, shed = self.lanes.offer(item)
+                if accepted:
+                    self._cond.notify_all()
+                    return shed
+                self._cond.wait()
+
+    def put_nowait(self, item):
+        with self._cond:
+            accepted, shed = self.lanes.offer(item)
+            if accepted:
+                self._cond.notify_all()
+            return accepted
+
+    def get(self):
+        with self._cond:
+            while True:
+                item = self.lanes.pop()
+                if item is not None:
+                    self._cond.notify_all()
+                    return item
+                self._cond.wait()
+
+    def qsize(self):
+        return len(self.lanes)
+
+    def empty(self):
+        return not len(self.lanes)
+
+
+class AsyncLaneQueue:
+    """LaneQueue for the asyncio listener (event loop thread only)."""
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+        self._changed = asyncio.Event()
+
+    async def put(self, item):
+        while True:
+            accepted, shed = self.lanes.offer(item)
+            if accepted:
+                self._changed.set()
+                return shed
+            self._changed.clear()
+            await self._changed.wait()
+
+    def put_nowait(self, item):
+        accepted, _ = self.lanes.offer(item)
+        if accepted:
+            self._changed.set()
+        return accepted
+
+    def get_nowait(self):
+        item = self.lanes.pop()
+        if item is not None:
+            self._changed.set()
+        return item
+
+    async def get(self):
+        while True:
+            item = self.get_nowait()
+            if item is not None:
+                return item
+            self._changed.clear()
+            await self._changed.wait()
+
+    def qsize(self):
+        return len(self.lanes)
+
+    def empty(self):
+        return not len(self.lanes)
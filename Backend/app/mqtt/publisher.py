@@ -0,0 +1,193 @@
+"""
+Change-only MQTT publishing.
+
+ChangePublisher remembers the last payload sent per (topic, device) and
+only publishes when something other than the ignored fields (timestamp by
+default) changed. Per topic (MQTT_PUBLISH_POLICY):
+
+    mode     "change"  full payload when anything changed
+             "delta"   only the changed fields, plus "timestamp" and
+                       "delta": true (keyframes stay full payloads)
+             "always"  every payload, like before
+    retain   publish full payloads as retained messages, so a client that
+             subscribes later gets the current state from the broker
+    ignore   extra fields that do not count as a change on their own
+
+A full keyframe is re-sent every MQTT_KEYFRAME_INTERVAL seconds, and for
+every topic at once when anything is published on MQTT_SYNC_TOPIC (a
+client that just joined asks for the current state).
+
+With a spool (app/spool), messages that cannot go out because the broker is
+unreachable are spooled, and so is everything after them until the
+connection is back. The backlog goes out first, on the next publish or
+when the listener reconnects (`drain_spool`). Outbound topics carry the
+latest state, so only the last message of each (topic, device) is sent,
+with the deltas spooled after a full payload folded into it.
+"""
+
+import json
+import time
+
+import paho.mqtt.client as mqtt
+
+from app.config.config import MQTT_KEYFRAME_INTERVAL, MQTT_PUBLISH_POLICY
+from app.mqtt.payloads import qos_for
+
+_DEFAULT_POLICY = {"mode": "change", "retain": False, "ignore": ()}
+_ALWAYS_IGNORED = ("timestamp",)
+
+
+def _coalesce(records):
+    """Spooled [topic, data, retain] records -> the latest message per
+    (topic, device), ordered by their last record."""
+    latest = {}   # (topic, device_id) -> [payload, data, retain]
+    for topic, data, retain in records:
+        payload = json.loads(data)
+        key = (topic, payload.get("device_id"))
+        previous = latest.pop(key, None)
+        if previous is not None and payload.get("delta"):
+            merged = {**previous[0], **payload}
+            if not previous[0].get("delta"):
+                del merged["delta"]   # still a full payload
+            payload, data, retain = merged, None, previous[2]
+        latest[key] = [payload, data, retain]
+    return [
+        (topic, json.dumps(payload) if data is None else data, retain)
+        for (topic, _), (payload, data, retain) in latest.items()
+    ]
+
+
+class ChangePublisher:
+    def __init__(self, client, policy=MQTT_PUBLISH_POLICY, keyframe_interval=MQTT_KEYFRAME_INTERVAL, spool=None):
+        self.client = client
+        self.policy = policy
+        self.keyframe_interval = keyframe_interval
+        self.spool = spool
+        self._last = {}   # (topic, device_id) -> [payload, fingerprint, last keyframe time]
+        self.counters = {"full": 0, "delta": 0, "suppressed": 0, "spooled": 0, "spool_coalesced": 0}
+
+    def _policy(self, topic):
+        return {**_DEFAULT_POLICY, **self.policy.get(topic, {})}
+
+    @staticmethod
+    def _fingerprint(payload, ignore):
+        return {k: v for k, v in payload.items() if k not in ignore}
+
+    def _send(self, topic, payload, retain):
+        data = json.dumps(payload)
+        if self.spool is None:
+            self.client.publish(topic, data, qos=qos_for(topic), retain=retain)
+            return
+        if len(self.spool) and self.client.is_connected():
+            self.drain_spool()
+        if not len(self.spool) and self._publish(topic, data, retain):
+            return
+        self.spool.append(json.dumps([topic, data, retain]).encode())
+        self.counters["spooled"] += 1
+
+    def _publish(self, topic, data, retain):
+        # Not handed to paho while disconnected: its own queue is memory only
+        if not self.client.is_connected():
+            return False
+        info = self.client.publish(topic, data, qos=qos_for(topic), retain=retain)
+        return info.rc == mqtt.MQTT_ERR_SUCCESS
+
+    def drain_spool(self):
+        """Send the latest spooled message of every (topic, device); the
+        spool is emptied once all of them went out, and kept for the next
+        attempt if one fails."""
+        if self.spool is None or not len(self.spool):
+            return 0
+        records = self.spool.peek()
+        messages = _coalesce(json.loads(record) for record in records)
+        for topic, data, retain in messages:
+            if not self._publish(topic, data, retain):
+                return 0
+        self.spool.discard(len(records))
+        self.counters["spool_coalesced"] += len(records) - len(messages)
+        print(f"📤 Sent {len(messages)} spooled message(s) ({len(records)} spooled)")
+        return len(messages)
+
+    def publish(self, topic, payload, device_id=None, now=None):
+        """Publish `payload` if needed; returns what was sent (or None)."""
+        now = time.monotonic() if now is None else now
+        policy = self._policy(topic)
+        if device_id is not None:
+            payload = dict(payload, device_id=device_id)
+
+        if policy["mode"] == "always":
+            self._send(topic, payload, policy["retain"])
+            self.counters["full"] += 1
+            return payload
+
+        key = (topic, device_id)
+        ignore = set(_ALWAYS_IGNORED) | set(policy["ignore"])
+        fingerprint = self._fingerprint(payload, ignore)
+        last = self._last.get(key)
+
+        if last is None or now - last[2] >= self.keyframe_interval:
+            self._last[key] = [payload, fingerprint, now]
+            self._send(topic, payload, policy["retain"])
+            self.counters["full"] += 1
+            return payload
+
+        if fingerprint == last[1]:
+            self.counters["suppressed"] += 1
+            return None
+
+        if policy["mode"] == "delta":
+            changed = {k: v for k, v in fingerprint.items() if last[1].get(k) != v}
+            message = {"timestamp": payload.get("timestamp"), "delta": True, **changed}
+            if device_id is not None:
+                message["device_id"] = device_id
+            # Deltas are never retained: the retained message stays a full state
+            self._send(topic, message, False)
+            self.counters["delta"] += 1
+        else:
+            message = payload
+            self._send(topic, message, policy["retain"])
+            self.counters["full"] += 1
+        last[0], last[1] = payload, fingerprint
+        return message
+
+    def publish_all(self, messages, device_id=None, now=None):
+        """Publish one reading's (topic, payload) pairs; returns those sent.
+
+        A topic that produced no message this time (e.g. no active alert)
+        is forgotten, so the next message on it is sent even if it equals
+        the one before the gap.
+        """
+        topics = {topic for topic, _ in messages}
+        for key in [k for k in self._last if k[1] == device_id and k[0] not in topics]:
+            del self._last[key]
+
+        sent = []
+        for topic, payload in messages:
+            message = self.publish(topic, payload, device_id, now)
+            if message is not None:
+                sent.append((topic, message))
+        return sent
+
+    def snapshot(self, now=None):
+        """Last payloads with their keyframe age in seconds."""
+        now = time.monotonic() if now is None else now
+        return [
+            [topic, device_id, payload, fingerprint, now - sent]
+            for (topic, device_id), (payload, fingerprint, sent) in list(self._last.items())
+        ]
+
+    def restore(self, state, downtime=0.0, now=None):
+        """Inverse of `snapshot`; `downtime` seconds are added to every age."""
+        now = time.monotonic() if now is None else now
+        self._last = {
+            (topic, device_id): [payload, fingerprint, now - age - downtime]
+            for topic, device_id, payload, fingerprint, age in state
+        }
+
+    def resync(self, now=None):
+        """Re-send the last full payload of every topic as a keyframe."""
+        now = time.monotonic() if now is None else now
+        for (topic, _), last in self._last.items():
+            self._send(topic, last[0], self._policy(topic)["retain"])
+            last[2] = now
+            self.counters["full"] += 1
@@ -0,0 +1,2 @@
+from .replay import replay_chunk, replay_history
+from .rollups import rebuild_rollups
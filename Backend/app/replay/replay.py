@@ -0,0 +1,216 @@
+"""
+Replay / backfill of stored sensor history.
+
+Regenerates the `metrics`, `alerts` and `ventilation_history` tables from
+`sensor_readings` with the current thresholds. The source table is read in
+id-ordered chunks; each chunk is evaluated in a worker process with the
+side-effect-free evaluator and `decide_hvac_actions`, and the resulting rows
+are bulk-written by the parent into fresh target databases.
+
+CO STEL/TWA and alert episodes depend on the readings before a chunk, so
+every worker first replays the readings that precede its chunk within the
+TWA window (without emitting rows) to warm up its own ExposureTracker and
+ChannelForecasts per device, and AlertSink. Episodes already open for longer than that
+window restart at the chunk boundary.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config.config import EXPOSURE_MAX_GAP, SENSOR_DB_PATH
+from app.config.thresholds import CO_TWA_WINDOW
+from app.db.alerts_db import alert_row, init_alerts_db
+from app.db.connection import connect_read_only, select_list
+from app.db.metrics_db import init_metrics_db, metric_row
+from app.db.ventilation_db import init_ventilation_db, ventilation_row
+from app.db.writer import DBWriter
+from app.hvac.hvac_controller import decide_hvac_actions
+from app.metrics.alert_sink import AlertSink
+from app.metrics.evaluator import evaluate_all_metrics
+from app.metrics.exposure import ExposureTracker
+from app.metrics.forecast import ChannelForecasts
+from app.utils.time_utils import to_epoch
+
+READING_COLUMNS = (
+    "id", "timestamp", "temp", "pressure", "co_mean", "co_max",
+    "co_valid", "pm2_5", "pm10", "co2", "humidity", "device_id",
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+WARMUP_SECONDS = CO_TWA_WINDOW + EXPOSURE_MAX_GAP
+
+
+def _select(conn):
+    return f"SELECT {select_list(conn, 'sensor_readings', READING_COLUMNS)} FROM sensor_readings"
+
+
+def _to_reading(row):
+    reading = dict(zip(READING_COLUMNS, row))
+    reading["co_valid"] = bool(reading["co_valid"])
+    return reading
+
+
+def iter_chunk_bounds(source_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (first_id, last_id) ranges of `chunk_size` readings, in id order."""
+    conn = connect_read_only(source_path)
+    try:
+        last_id = 0
+        while True:
+            first = conn.execute(
+                "SELECT id FROM sensor_readings WHERE id > ? ORDER BY id LIMIT 1",
+                (last_id,),
+            ).fetchone()
+            if first is None:
+                return
+            end = conn.execute(
+                "SELECT id FROM sensor_readings WHERE id >= ? ORDER BY id LIMIT 1 OFFSET ?",
+                (first[0], chunk_size - 1),
+            ).fetchone()
+            if end is None:
+                end = conn.execute("SELECT MAX(id) FROM sensor_readings").fetchone()
+            yield first[0], end[0]
+            last_id = end[0]
+    finally:
+        conn.close()
+
+
+def _warmup_readings(conn, first_id, first_epoch):
+    """Readings before `first_id` that still fall inside the TWA window, plus
+    the one just before it (it anchors the first in-window interval)."""
+    cutoff = first_epoch - WARMUP_SECONDS
+    cur = conn.execute(f"{_select(conn)} WHERE id < ? ORDER BY id DESC", (first_id,))
+    warmup = []
+    for row in cur:
+        reading = _to_reading(row)
+        try:
+            epoch = to_epoch(reading["timestamp"])
+        except (TypeError, ValueError):
+            continue
+        warmup.append(reading)
+        if epoch < cutoff:
+            break
+    warmup.reverse()
+    return warmup
+
+
+def replay_chunk(source_path, first_id, last_id):
+    """
+    Evaluate readings first_id..last_id without touching any database
+    except for reading the source. Returns row tuples ready for the
+    metrics / alerts / ventilation INSERT statements plus a skip count.
+    """
+    conn = connect_read_only(source_path)
+    try:
+        readings = [
+            _to_reading(row)
+            for row in conn.execute(
+                f"{_select(conn)} WHERE id BETWEEN ? AND ? ORDER BY id", (first_id, last_id)
+            )
+        ]
+        warmup = []
+        if readings:
+            try:
+                first_epoch = to_epoch(readings[0]["timestamp"])
+                warmup = _warmup_readings(conn, first_id, first_epoch)
+            except (TypeError, ValueError):
+                pass
+    finally:
+        conn.close()
+
+    exposures, forecasts = {}, {}   # device_id -> ExposureTracker / ChannelForecasts
+    sink = AlertSink()
+
+    def _evaluate(reading):
+        device_id = reading["device_id"]
+        if device_id not in exposures:
+            exposures[device_id] = ExposureTracker()
+            forecasts[device_id] = ChannelForecasts()
+        return evaluate_all_metrics(reading, exposures[device_id], forecasts[device_id])
+
+    for reading in warmup:
+        try:
+            results = _evaluate(reading)
+            sink.process(reading["timestamp"], results["alerts"], reading["device_id"])
+        except (TypeError, ValueError, KeyError):
+            continue
+
+    out = {"metrics": [], "alerts": [], "ventilation": [], "skipped": 0}
+    for reading in readings:
+        try:
+            results = _evaluate(reading)
+            actions = decide_hvac_actions(results["results"]["status_packet"])
+            alerts = sink.process(reading["timestamp"], results["alerts"], reading["device_id"])
+        except (TypeError, ValueError, KeyError):
+            # Incomplete rows (NULL columns, malformed timestamps)
+            out["skipped"] += 1
+            continue
+        out["metrics"].extend(metric_row(m) for m in results["metrics"])
+        out["alerts"].extend(alert_row(a) for a in alerts)
+        out["ventilation"].append(ventilation_row(actions))
+    return out
+
+
+def _prepare_targets(targets, overwrite):
+    for path in targets.values():
+        if os.path.exists(path):
+            if not overwrite:
+                raise FileExistsError(f"Target database already exists: {path}")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    init_metrics_db(targets["metrics"])
+    init_alerts_db(targets["alerts"])
+    init_ventilation_db(targets["ventilation"])
+
+
+def replay_history(
+    targets,
+    source_path=SENSOR_DB_PATH,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=None,
+    dry_run=False,
+    overwrite=False,
+):
+    """
+    Re-evaluate every stored reading and write the derived rows to
+    `targets` ({"metrics": path, "alerts": path, "ventilation": path}).
+
+    With `dry_run` nothing is written; the row counts are still returned.
+    """
+    if not dry_run:
+        _prepare_targets(targets, overwrite)
+        writer = DBWriter(paths=targets, max_rows=50000, max_delay=float("inf"))
+
+    totals = {"chunks": 0, "metrics": 0, "alerts": 0, "ventilation": 0, "skipped": 0}
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        bounds = iter_chunk_bounds(source_path, chunk_size)
+
+        def _collect(out):
+            totals["chunks"] += 1
+            totals["skipped"] += out["skipped"]
+            for kind in ("metrics", "alerts", "ventilation"):
+                totals[kind] += len(out[kind])
+                if not dry_run:
+                    writer.add_rows(kind, out[kind])
+            if not dry_run:
+                writer.maybe_flush()
+
+        # Keep a bounded number of chunks in flight and consume them in
+        # submission order so target ids follow reading order.
+        for first_id, last_id in bounds:
+            in_flight.append(pool.submit(replay_chunk, source_path, first_id, last_id))
+            if len(in_flight) >= 2 * workers:
+                _collect(in_flight.popleft().result())
+        while in_flight:
+            _collect(in_flight.popleft().result())
+
+    if not dry_run:
+        writer.close()
+    return totals
@@ -0,0 +1,89 @@
+"""
+Rebuild the `rollups` table from the history already stored.
+
+Raw channel series are rebuilt from `sensor_readings` (per device) and
+metric series from the stored `metrics` rows (so the rollups reflect what was recorded,
+not what the current thresholds would say). Both tables are streamed in id
+order and fed through the same RollupEngine as the live pipeline.
+"""
+
+from app.config.config import METRICS_DB_PATH, SENSOR_DB_PATH
+from app.db.connection import connect, connect_read_only, select_list
+from app.db.rollups_db import init_rollups_db, rollup_row
+from app.db.writer import DBWriter
+from app.metrics.rollups import SENSOR_CHANNELS, RollupEngine
+from app.utils.time_utils import to_epoch
+
+_FETCH_SIZE = 5000
+
+
+def _stream(path, sql):
+    conn = connect_read_only(path)
+    try:
+        cur = conn.execute(sql)
+        while True:
+            rows = cur.fetchmany(_FETCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
+
+def rebuild_rollups(
+    sensor_path=SENSOR_DB_PATH,
+    metrics_path=METRICS_DB_PATH,
+    target_path=METRICS_DB_PATH,
+):
+    init_rollups_db(target_path)
+    conn = connect(target_path)
+    with conn:
+        conn.execute("DELETE FROM rollups")
+    conn.close()
+
+    writer = DBWriter(paths={"rollups": target_path}, max_rows=20000, max_delay=float("inf"))
+
+    totals = {"readings": 0, "metrics": 0, "rows": 0, "skipped": 0}
+
+    def _emit(rows):
+        if rows:
+            writer.add_rows("rollups", [rollup_row(r) for r in rows])
+            totals["rows"] += len(rows)
+            writer.maybe_flush()
+
+    engine = RollupEngine()
+    conn = connect_read_only(sensor_path)
+    try:
+        columns = select_list(conn, "sensor_readings", ("device_id",) + SENSOR_CHANNELS)
+    finally:
+        conn.close()
+    for row in _stream(sensor_path, f"SELECT timestamp, {columns} FROM sensor_readings ORDER BY id"):
+        try:
+            t = to_epoch(row[0])
+        except (TypeError, ValueError):
+            totals["skipped"] += 1
+            continue
+        totals["readings"] += 1
+        device_id = row[1]
+        for channel, value in zip(SENSOR_CHANNELS, row[2:]):
+            if value is not None:
+                _emit(engine.add_sample(device_id, channel, t, value))
+
+    # Metric series are independent of the raw ones, so a second pass keeps
+    # both streams in id (= time) order. The split metrics table has no
+    # device column: these series are rebuilt device-less.
+    for ts, metric_type, value, status in _stream(
+        metrics_path, "SELECT timestamp, metric_type, value, status FROM metrics ORDER BY id"
+    ):
+        try:
+            t = to_epoch(ts)
+        except (TypeError, ValueError):
+            totals["skipped"] += 1
+            continue
+        totals["metrics"] += 1
+        _emit(engine.add_sample(None, f"metric:{metric_type}", t, value, status))
+
+    _emit(engine.flush())
+    writer.close()
+    totals["late_samples"] = engine.late_samples
+    return totals
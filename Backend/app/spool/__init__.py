@@ -0,0 +1 @@
+from .spool import Spool, SpoolFull, close_spools, get_spool, set_spool_dir
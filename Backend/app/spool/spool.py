@@ -0,0 +1,309 @@
+"""
+Append-only, memory-mapped spool files.
+
+A spool keeps what could not be handed to its sink yet (raw payloads the
+ingest queue had no room for, DB rows while SQLite is locked or the disk is
+full, publishes while the broker is away) and gives it back oldest first
+once the sink recovers.
+
+File layout (little-endian):
+
+    header   64 bytes: magic "SPL1", version, capacity, head, tail,
+             head seq, next seq
+    data     `capacity` bytes used as a ring of records
+    record   uint32 length, uint32 crc32 (of seq + payload), uint64 seq,
+             payload
+
+A record never straddles the end of the ring: when it does not fit there it
+goes to the start, after a wrap marker if there is room for one. Appending
+only copies into the mapping; the file is msync'ed at most every
+SPOOL_SYNC_INTERVAL seconds, so no message waits on a synchronous disk
+write. A process crash loses nothing (the page cache survives it), a power
+loss at most the last interval.
+
+Opening a spool walks the records from the head and keeps the consecutive
+ones with a valid CRC, including those appended after the last header
+update; a torn record ends the spool.
+
+When a record does not fit, the overflow policy decides:
+
+    drop_oldest   discard records from the head until it fits
+    drop_newest   refuse the new record (`append` returns False)
+    error         raise SpoolFull, the caller keeps the data elsewhere
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from app.config.config import SPOOL_DIR, SPOOL_MAX_BYTES, SPOOL_OVERFLOW, SPOOL_SYNC_INTERVAL
+from app.telemetry.metrics import register_collector
+
+MAGIC = b"SPL1"
+VERSION = 1
+HEADER_SIZE = 64
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "error")
+
+_HEADER = struct.Struct("<4sIQQQQQ")   # magic, version, capacity, head, tail, head seq, next seq
+_RECORD = struct.Struct("<IIQ")        # length, crc32, seq
+_SEQ = struct.Struct("<Q")
+_WRAP = 0xFFFFFFFF
+
+
+class SpoolFull(Exception):
+    pass
+
+
+def _crc(seq, payload):
+    return zlib.crc32(payload, zlib.crc32(_SEQ.pack(seq)))
+
+
+class Spool:
+    def __init__(self, path, max_bytes, overflow="drop_newest", sync_interval=SPOOL_SYNC_INTERVAL):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.path = path
+        self.overflow = overflow
+        self.sync_interval = sync_interval
+        self.dropped = 0   # records lost to the overflow policy
+        self.corrupt = 0   # records lost to a torn write, found when opening
+        self._lock = threading.Lock()
+        self._synced = time.monotonic()
+        self._open(max_bytes)
+
+    # ------------------------------------------------
+    # File
+    # ------------------------------------------------
+    def _open(self, max_bytes):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            state = None
+            if size >= HEADER_SIZE:
+                magic, version, capacity, *rest = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+                if magic == MAGIC and version == VERSION and size == HEADER_SIZE + capacity:
+                    state = rest
+                    # An empty spool takes the configured size; one with
+                    # records keeps its own until it has been drained
+                    if capacity != max_bytes and rest[2] == rest[3]:
+                        state = None
+                else:
+                    print(f"⚠️ Spool {self.path}: unrecognized file, starting empty")
+            if state is None:
+                # Zero-filled (sparse), so no stale record can look valid
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, HEADER_SIZE + max_bytes)
+            self._mm = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        self.capacity = len(self._mm) - HEADER_SIZE
+        self._end = len(self._mm)
+        if state is None:
+            self.head = self.tail = HEADER_SIZE
+            self.head_seq = self.next_seq = 0
+            self._write_header()
+        else:
+            self._recover(*state)
+
+    def _recover(self, head, tail, head_seq, next_seq):
+        if not HEADER_SIZE <= head < self._end:
+            head, next_seq = HEADER_SIZE, head_seq
+        self.head, self.head_seq = head, head_seq
+        pos, seq = head, head_seq
+        while True:
+            record = self._locate(pos)
+            if record is None:
+                break
+            start, length, crc, record_seq = record
+            if record_seq != seq or length > self._end - start - _RECORD.size:
+                break
+            payload_at = start + _RECORD.size
+            if crc != _crc(seq, self._mm[payload_at:payload_at + length]):
+                break
+            pos, seq = payload_at + length, seq + 1
+        self.tail, self.next_seq = pos, seq
+        if seq < next_seq:
+            self.corrupt = next_seq - seq
+            print(f"⚠️ Spool {self.path}: {self.corrupt} torn record(s) discarded")
+        if self.head_seq == self.next_seq:
+            self.head = self.tail = HEADER_SIZE
+        self._write_header()
+
+    def _write_header(self):
+        _HEADER.pack_into(
+            self._mm, 0, MAGIC, VERSION, self.capacity,
+            self.head, self.tail, self.head_seq, self.next_seq,
+        )
+
+    def _locate(self, pos):
+        """(start, length, crc, seq) of the record at `pos`, following a wrap."""
+        if pos + _RECORD.size > self._end:
+            pos = HEADER_SIZE
+        length, crc, seq = _RECORD.unpack_from(self._mm, pos)
+        if length == _WRAP:
+            pos = HEADER_SIZE
+            length, crc, seq = _RECORD.unpack_from(self._mm, pos)
+        if length == _WRAP:
+            return None
+        return pos, length, crc, seq
+
+    def _reserve(self, size):
+        """Offset where a record of `size` bytes goes, or None if it does not fit."""
+        if self.head_seq == self.next_seq:
+            self.head = self.tail = HEADER_SIZE
+            return HEADER_SIZE
+        if self.tail > self.head:
+            if self.tail + size <= self._end:
+                return self.tail
+            if HEADER_SIZE + size <= self.head:
+                if self.tail + _RECORD.size <= self._end:
+                    _RECORD.pack_into(self._mm, self.tail, _WRAP, 0, self.next_seq)
+                return HEADER_SIZE
+            return None
+        # Wrapped: the free space is between tail and head
+        if self.tail + size <= self.head:
+            return self.tail
+        return None
+
+    def _discard(self, n):
+        for _ in range(min(n, self.next_seq - self.head_seq)):
+            start, length, _, _ = self._locate(self.head)
+            self.head = start + _RECORD.size + length
+            self.head_seq += 1
+        if self.head_seq == self.next_seq:
+            self.head = self.tail = HEADER_SIZE
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now - self._synced >= self.sync_interval:
+            self._mm.flush()
+            self._synced = now
+
+    # ------------------------------------------------
+    # Records
+    # ------------------------------------------------
+    def append(self, payload):
+        """Add a record; False if the overflow policy refused it."""
+        size = _RECORD.size + len(payload)
+        if size > self.capacity:
+            raise ValueError(f"Record of {len(payload)} bytes does not fit in spool {self.path}")
+        with self._lock:
+            pos = self._reserve(size)
+            while pos is None:
+                if self.overflow == "error":
+                    raise SpoolFull(f"Spool {self.path} is full ({len(self)} records)")
+                self.dropped += 1
+                if self.overflow == "drop_newest":
+                    return False
+                self._discard(1)
+                pos = self._reserve(size)
+            seq = self.next_seq
+            _RECORD.pack_into(self._mm, pos, len(payload), _crc(seq, payload), seq)
+            self._mm[pos + _RECORD.size:pos + size] = payload
+            self.tail = pos + size
+            self.next_seq = seq + 1
+            self._write_header()
+            self._maybe_sync()
+        return True
+
+    def peek(self, limit=None):
+        """The oldest records (up to `limit`), left in the spool."""
+        out = []
+        with self._lock:
+            pos = self.head
+            for _ in range(self.next_seq - self.head_seq if limit is None else min(limit, len(self))):
+                start, length, _, _ = self._locate(pos)
+                pos = start + _RECORD.size
+                out.append(self._mm[pos:pos + length])
+                pos += length
+        return out
+
+    def discard(self, n=1):
+        """Remove the `n` oldest records (once their sink has taken them)."""
+        with self._lock:
+            self._discard(n)
+            self._write_header()
+            self._maybe_sync()
+
+    def __len__(self):
+        return self.next_seq - self.head_seq
+
+    def used_bytes(self):
+        if self.head_seq == self.next_seq:
+            return 0
+        if self.tail > self.head:
+            return self.tail - self.head
+        return self.capacity - (self.head - self.tail)
+
+    def stats(self):
+        return {
+            "records": len(self),
+            "bytes": self.used_bytes(),
+            "capacity": self.capacity,
+            "dropped": self.dropped,
+            "corrupt": self.corrupt,
+        }
+
+    def sync(self):
+        with self._lock:
+            self._mm.flush()
+            self._synced = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+
+
+_spools = {}
+_spool_dir = SPOOL_DIR
+
+
+def _collect():
+    spools = list(_spools.items())
+    return [
+        ("spool_records", "gauge", "Records waiting in each spool",
+         [({"spool": name}, len(s)) for name, s in spools]),
+        ("spool_bytes", "gauge", "Bytes used in each spool",
+         [({"spool": name}, s.used_bytes()) for name, s in spools]),
+        ("spool_dropped_total", "counter", "Records lost to a spool's overflow policy",
+         [({"spool": name}, s.dropped) for name, s in spools]),
+    ]
+
+
+def get_spool(name):
+    """Process-wide spool `name` ("ingest", "storage", "outbound") under
+    SPOOL_DIR, or None when spooling is off."""
+    if _spool_dir is None:
+        return None
+    spool = _spools.get(name)
+    if spool is None:
+        if not _spools:
+            register_collector(_collect)
+        spool = _spools[name] = Spool(
+            os.path.join(_spool_dir, f"{name}.spool"), SPOOL_MAX_BYTES[name], SPOOL_OVERFLOW[name]
+        )
+        if len(spool):
+            print(f"📦 Spool {name}: {len(spool)} record(s) to replay")
+    return spool
+
+
+def set_spool_dir(directory):
+    """Keep this process's spools in `directory` instead of SPOOL_DIR (each
+    cluster worker has its own); call before the first `get_spool`."""
+    global _spool_dir
+    if _spools:
+        raise RuntimeError("Spools are already open")
+    _spool_dir = directory
+
+
+def close_spools():
+    for spool in _spools.values():
+        spool.close()
+    _spools.clear()
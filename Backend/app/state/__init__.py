@@ -0,0 +1,2 @@
+from .snapshot import StateSnapshotter
+from .hot_cache import HotStateCache, get_hot_state
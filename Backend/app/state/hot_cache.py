@@ -0,0 +1,159 @@
+"""
+In-memory hot state: what consumers want as "current state", per device.
+
+For every device the cache holds the latest status packet and ventilation
+actions (one immutable `Latest` tuple, swapped in a single assignment after
+each evaluation) and a ring of the last HOT_CACHE_READINGS readings in one
+flat array('d'): RING_FIELDS doubles per slot (epoch seconds, the sensor
+channels, co_valid as 0/1, NaN for a missing field), about 80 bytes a
+reading instead of a dict per reading. At most HOT_CACHE_MAX_DEVICES devices
+are kept; the least recently updated one is evicted first.
+
+The query API serves it (/api/state, /api/unity) without touching the
+databases. The JSON of a device's latest state is encoded once per update
+and reused by every request until the next one.
+"""
+
+import json
+import math
+import threading
+from array import array
+from collections import OrderedDict, namedtuple
+
+from app.config.config import HOT_CACHE_MAX_DEVICES, HOT_CACHE_READINGS
+from app.utils.time_utils import epoch_to_iso_cached, to_epoch
+
+RING_FIELDS = (
+    "timestamp", "temp", "pressure", "co_mean", "co_max", "co_valid", "pm2_5", "pm10", "co2", "humidity",
+)
+
+_NAN = math.nan
+
+Latest = namedtuple("Latest", "seq timestamp status_packet ventilation")
+
+
+class DeviceState:
+    def __init__(self, device_id, capacity=HOT_CACHE_READINGS):
+        self.device_id = device_id
+        self.capacity = capacity
+        self.latest = None
+        self._width = len(RING_FIELDS)
+        self._ring = array("d", bytes(8 * capacity * self._width))
+        self._count = 0            # readings ever added; the next slot is count % capacity
+        self._lock = threading.Lock()
+        self._encoded = (None, None)   # (seq, JSON bytes of `latest`)
+
+    def add_reading(self, reading):
+        values = [to_epoch(reading["timestamp"])]
+        for field in RING_FIELDS[1:]:
+            value = reading.get(field)
+            values.append(_NAN if value is None else float(value))
+        with self._lock:
+            start = (self._count % self.capacity) * self._width
+            self._ring[start:start + self._width] = array("d", values)
+            self._count += 1
+
+    def set_latest(self, status_packet, ventilation):
+        seq = 1 if self.latest is None else self.latest.seq + 1
+        self.latest = Latest(seq, status_packet.get("timestamp"), status_packet, ventilation)
+
+    def recent(self, n=None):
+        """The last `n` readings (all kept by default), oldest first, as
+        columns: {"timestamp": [...], "temp": [...], ...}."""
+        width = self._width
+        with self._lock:
+            count = self._count
+            n = min(count, self.capacity) if n is None else max(0, min(n, count, self.capacity))
+            first = (count - n) % self.capacity
+            if first + n <= self.capacity:
+                flat = self._ring[first * width:(first + n) * width]
+            else:
+                flat = self._ring[first * width:] + self._ring[:(first + n - self.capacity) * width]
+        columns = {}
+        for i, field in enumerate(RING_FIELDS):
+            column = flat[i::width]
+            values = column.tolist()
+            if field == "timestamp":
+                values = [epoch_to_iso_cached(v) for v in values]
+            elif field == "co_valid":
+                values = [v == 1.0 for v in values]
+            elif math.isnan(sum(column)):
+                values = [None if v != v else v for v in values]
+            columns[field] = values
+        return columns
+
+    def to_dict(self):
+        latest = self.latest
+        if latest is None:
+            return {"device_id": self.device_id, "timestamp": None, "status": None, "ventilation": None}
+        ventilation = None
+        if latest.ventilation is not None:
+            ventilation = dict(latest.ventilation, reasons=list(latest.ventilation.get("reasons", ())))
+        return {
+            "device_id": self.device_id,
+            "timestamp": latest.timestamp,
+            "status": latest.status_packet,
+            "ventilation": ventilation,
+        }
+
+    def encoded(self):
+        """JSON of `to_dict()`, encoded once per update."""
+        latest = self.latest
+        seq = latest.seq if latest is not None else None
+        cached_seq, body = self._encoded
+        if body is None or cached_seq != seq:
+            body = json.dumps(self.to_dict()).encode()
+            self._encoded = (seq, body)
+        return body
+
+
+class HotStateCache:
+    def __init__(self, capacity=HOT_CACHE_READINGS, max_devices=HOT_CACHE_MAX_DEVICES):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self._devices = OrderedDict()   # device id -> DeviceState, least recently updated first
+        self._lock = threading.Lock()
+
+    def _device(self, device_id):
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None:
+                state = self._devices[device_id] = DeviceState(device_id, self.capacity)
+                while len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+            else:
+                self._devices.move_to_end(device_id)
+            return state
+
+    def observe(self, readings, publish_item=None):
+        """Record an evaluated batch: every reading goes to its device's
+        ring, the last evaluated one becomes the device's latest state."""
+        state = None
+        for reading in readings:
+            device_id = reading.get("device_id")
+            if state is None or state.device_id != device_id:
+                state = self._device(device_id)
+            state.add_reading(reading)
+        if publish_item is not None:
+            reading, status_packet, ventilation = publish_item
+            self._device(reading.get("device_id")).set_latest(status_packet, ventilation)
+
+    def get(self, device_id):
+        return self._devices.get(device_id)
+
+    def devices(self):
+        with self._lock:
+            return list(self._devices.values())
+
+    def __len__(self):
+        return len(self._devices)
+
+
+_default_cache = None
+
+
+def get_hot_state():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HotStateCache()
+    return _default_cache
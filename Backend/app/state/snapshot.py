@@ -0,0 +1,198 @@
+"""
+Warm restart: periodic snapshots of the in-memory streaming state.
+
+The evaluate stage owns the state that would otherwise be rebuilt by
+scanning the databases after a restart: CO exposure windows (STEL/TWA),
+trend forecasts, open alert episodes, open rollup buckets, and the publisher's last
+payloads. StateSnapshotter writes all of it, plus the timestamp of the
+last reading evaluated per device, to one gzipped JSON file every
+STATE_SNAPSHOT_INTERVAL seconds and on shutdown. The file is replaced
+atomically, so a crash leaves the previous snapshot intact.
+
+On startup `restore` loads the snapshot and replays only the readings
+stored after those timestamps (a crash between two snapshots), so
+exposure windows continue exactly where they stopped. Readings that were
+received but never persisted are lost either way. Without a usable
+snapshot the service cold-starts as before.
+"""
+
+import gzip
+import json
+import os
+import time
+
+from app.config.config import (
+    SENSOR_DB_PATH,
+    STATE_SNAPSHOT_INTERVAL,
+    STATE_SNAPSHOT_PATH,
+    STORAGE_MODE,
+    UNIFIED_DB_PATH,
+)
+from app.db.connection import connect_read_only, select_list
+from app.metrics.evaluator import evaluate_all_metrics
+from app.metrics.exposure import restore_trackers, snapshot_trackers
+from app.metrics.forecast import restore_forecasts, snapshot_forecasts
+from app.utils.time_utils import epoch_to_iso, to_epoch
+
+VERSION = 1
+
+_READING_COLUMNS = (
+    "timestamp", "temp", "pressure", "co_mean", "co_max", "co_valid", "pm2_5", "pm10", "co2",
+    "humidity",
+)
+
+
+def _readings_since(since, storage_mode=STORAGE_MODE):
+    """Stored readings newer than epoch `since`, in insertion order."""
+    columns = ", ".join(_READING_COLUMNS)
+    path = UNIFIED_DB_PATH if storage_mode == "unified" else SENSOR_DB_PATH
+    conn = connect_read_only(path)
+    try:
+        if storage_mode == "unified":
+            sql = f"SELECT device_id, {columns} FROM readings_v WHERE ts > ? ORDER BY id"
+            args = (int(since),)
+        else:
+            # NULL for rows stored before sensor_readings had a device column
+            device = select_list(conn, "sensor_readings", ("device_id",))
+            sql = f"SELECT {device}, {columns} FROM sensor_readings WHERE timestamp > ? ORDER BY id"
+            args = (epoch_to_iso(since),)
+        for device_id, *values in conn.execute(sql, args):
+            reading = dict(zip(_READING_COLUMNS, values))
+            reading["co_valid"] = bool(reading["co_valid"])
+            if device_id is not None:
+                reading["device_id"] = device_id
+            yield reading
+    finally:
+        conn.close()
+
+
+class StateSnapshotter:
+    """Snapshots the streaming state of a pipeline (IngestPipeline or
+    AsyncMQTTListener: anything with alert_sink, rollups and publisher).
+
+    `observe` and `maybe_save` are called by the evaluate stage, which
+    owns that state; the publisher is copied from the same thread.
+    """
+
+    def __init__(self, pipeline, path=STATE_SNAPSHOT_PATH, interval=STATE_SNAPSHOT_INTERVAL, known_devices_only=False):
+        self.pipeline = pipeline
+        self.path = path
+        self.interval = interval
+        # A cluster worker shares the databases with the others: only catch
+        # up on the devices it was serving
+        self.known_devices_only = known_devices_only
+        self.positions = {}   # device_id -> epoch of the last reading evaluated
+        self._next = time.monotonic() + interval if interval else None
+
+    def observe(self, readings):
+        for reading in readings:
+            self.positions[reading.get("device_id")] = to_epoch(reading["timestamp"])
+
+    # ------------------------------------------------
+    # Saving
+    # ------------------------------------------------
+    def capture(self):
+        return {
+            "version": VERSION,
+            "storage_mode": STORAGE_MODE,
+            "saved_at": time.time(),
+            "positions": [[device_id, t] for device_id, t in self.positions.items()],
+            "exposure": snapshot_trackers(),
+            "forecast": snapshot_forecasts(),
+            "alerts": self.pipeline.alert_sink.snapshot(),
+            "rollups": self.pipeline.rollups.snapshot(),
+            "publisher": self.pipeline.publisher.snapshot(),
+        }
+
+    def save(self):
+        state = self.capture()
+        tmp = f"{self.path}.tmp"
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(tmp, "wt", compresslevel=1) as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        return state
+
+    def maybe_save(self):
+        if self._next is None or time.monotonic() < self._next:
+            return
+        self._next = time.monotonic() + self.interval
+        try:
+            self.save()
+        except (OSError, TypeError, ValueError) as e:
+            print("❌ State snapshot failed:", e)
+
+    # ------------------------------------------------
+    # Restoring
+    # ------------------------------------------------
+    def load(self):
+        """The saved state, or None if there is no usable snapshot."""
+        try:
+            with gzip.open(self.path, "rt") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable state snapshot {self.path}: {e}")
+            return None
+        if state.get("version") != VERSION or state.get("storage_mode") != STORAGE_MODE:
+            print(f"⚠️ Ignoring state snapshot {self.path}: saved by another version or storage mode")
+            return None
+        return state
+
+    def restore(self):
+        """Load the snapshot and replay the readings stored since; returns
+        the number of readings replayed, or None on a cold start."""
+        start = time.perf_counter()
+        state = self.load()
+        if state is None:
+            return None
+
+        restore_trackers(state["exposure"])
+        restore_forecasts(state.get("forecast", []))
+        self.pipeline.alert_sink.restore(state["alerts"])
+        self.pipeline.rollups.restore(state["rollups"])
+        self.pipeline.publisher.restore(state["publisher"], downtime=max(0.0, time.time() - state["saved_at"]))
+        self.positions = {device_id: t for device_id, t in state["positions"]}
+
+        replayed = self.replay()
+        print(
+            f"♻️ Restored state from {self.path} ({replayed} readings replayed) "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return replayed
+
+    def replay(self):
+        """Feed readings stored after the snapshot through the stateful
+        stages; their rows are already in the databases, so nothing is
+        written or published."""
+        if not self.positions:
+            return 0
+        alert_sink, rollups = self.pipeline.alert_sink, self.pipeline.rollups
+        # Per-device positions: a row without a device was stored before
+        # sensor_readings had the column and cannot be attributed
+        by_device = any(device_id is not None for device_id in self.positions)
+        replayed = unattributed = 0
+        for reading in _readings_since(min(self.positions.values())):
+            device_id = reading.get("device_id")
+            if device_id is None and by_device:
+                unattributed += 1
+                continue
+            if self.known_devices_only and device_id not in self.positions:
+                continue
+            try:
+                t = to_epoch(reading["timestamp"])
+                if t <= self.positions.get(device_id, float("-inf")):
+                    continue
+                results = evaluate_all_metrics(reading)
+                alert_sink.process(reading["timestamp"], results["alerts"], device_id)
+                rollups.observe(reading, results["metrics"])
+            except (TypeError, ValueError, KeyError):
+                continue   # incomplete row
+            self.positions[device_id] = t
+            replayed += 1
+        if unattributed:
+            print(f"⚠️ {unattributed} stored reading(s) without a device not replayed; exposure windows miss them")
+        return replayed
@@ -0,0 +1,11 @@
+from .metrics import (
+    ALERTS,
+    DB_ROWS,
+    DB_WRITE_SECONDS,
+    ERRORS,
+    STAGE_SECONDS,
+    Counter,
+    Histogram,
+    render_prometheus,
+)
+from .server import start_metrics_server, start_telemetry, summary_line
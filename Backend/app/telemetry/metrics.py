@@ -0,0 +1,189 @@
+"""
+In-process instrumentation: counters and latency histograms.
+
+Metrics are plain objects registered in a module-level registry and
+rendered in the Prometheus text format by `render_prometheus`. Components
+with counters of their own (the ingest pipelines) register a collector
+function instead of duplicating them; gauges such as queue depths are
+reported the same way.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; the hot-path stages run in microseconds, SQLite flushes in ms
+DEFAULT_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+_registry = []     # metric objects, in registration order
+_collectors = []   # callables returning [(name, type, help, [(labels, value)])]
+_registry_lock = threading.Lock()
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [
+            (self.name, dict(zip(self.labelnames, key)), value)
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class _Timer:
+    __slots__ = ("histogram", "key", "start")
+
+    def __init__(self, histogram, key):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        _register(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def _observe(self, key, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe(self, value, **labels):
+        self._observe(self._key(labels), value)
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, self._key(labels))
+
+    def snapshot(self):
+        with self._lock:
+            return {k: (list(s[0]), s[1], s[2]) for k, s in self._series.items()}
+
+    def quantile(self, q, **labels):
+        """Bucket upper bound below which a fraction `q` of observations fall."""
+        series = self.snapshot().get(self._key(labels))
+        if not series or not series[2]:
+            return None
+        counts, _, total = series
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        out = []
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            labels = dict(zip(self.labelnames, key))
+            running = 0
+            for bound, c in zip(self.buckets, counts):
+                running += c
+                out.append((f"{self.name}_bucket", {**labels, "le": repr(bound)}, running))
+            out.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, count))
+            out.append((f"{self.name}_sum", labels, total))
+            out.append((f"{self.name}_count", labels, count))
+        return out
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+
+
+def register_collector(func):
+    with _registry_lock:
+        _collectors.append(func)
+
+
+def unregister_collector(func):
+    with _registry_lock:
+        if func in _collectors:
+            _collectors.remove(func)
+
+
+def render_prometheus():
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+        collectors = list(_collectors)
+
+    families = [(m.name, m.type, m.help, m.samples()) for m in metrics]
+    for collect in collectors:
+        for name, kind, help, values in collect():
+            families.append((name, kind, help, [(name, labels, v) for labels, v in values]))
+
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_labels_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------
+# Metrics shared by the ingest path
+# ------------------------------------------------
+STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds", "Time spent per reading in each ingest stage", ("stage",)
+)
+DB_WRITE_SECONDS = Histogram(
+    "db_write_seconds", "Time to write one batch of rows (one transaction)", ("kind",)
+)
+DB_ROWS = Counter("db_rows_total", "Rows written to SQLite", ("kind",))
+ERRORS = Counter("ingest_errors_total", "Errors by stage and exception type", ("stage", "type"))
+ALERTS = Counter("alerts_total", "Alert rows emitted by the alert sink", ("category", "state"))
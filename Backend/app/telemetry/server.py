@@ -0,0 +1,73 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config.config import TELEMETRY_HOST, TELEMETRY_PORT, TELEMETRY_SUMMARY_INTERVAL
+from app.telemetry.metrics import ALERTS, ERRORS, STAGE_SECONDS, render_prometheus
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # scraped every few seconds; keep the console for the pipeline
+
+
+def start_metrics_server(host=TELEMETRY_HOST, port=TELEMETRY_PORT):
+    """Serve /metrics on a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="telemetry-http", daemon=True)
+    thread.start()
+    print(f"📊 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def _fmt_seconds(value):
+    if value is None:
+        return "-"
+    if value == float("inf"):
+        return ">5s"
+    if value < 0.001:
+        return f"{value * 1e6:.0f}µs"
+    return f"{value * 1000:.1f}ms"
+
+
+def summary_line():
+    """One log line: p50/p99 per stage, error and alert totals."""
+    stages = sorted(key[0] for key in STAGE_SECONDS.snapshot())
+    parts = [
+        f"{stage} p50={_fmt_seconds(STAGE_SECONDS.quantile(0.5, stage=stage))} "
+        f"p99={_fmt_seconds(STAGE_SECONDS.quantile(0.99, stage=stage))}"
+        for stage in stages
+    ]
+    errors = sum(ERRORS.values().values())
+    alerts = sum(ALERTS.values().values())
+    return f"⏱️ {' | '.join(parts) or 'no samples yet'} | errors={errors} alerts={alerts}"
+
+
+def start_summary_log(interval=TELEMETRY_SUMMARY_INTERVAL):
+    stop = threading.Event()
+
+    def _run():
+        while not stop.wait(interval):
+            print(summary_line())
+
+    threading.Thread(target=_run, name="telemetry-summary", daemon=True).start()
+    return stop
+
+
+def start_telemetry():
+    """Start the /metrics endpoint and the summary log as configured."""
+    if TELEMETRY_PORT:
+        start_metrics_server()
+    if TELEMETRY_SUMMARY_INTERVAL:
+        start_summary_log()
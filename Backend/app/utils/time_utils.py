@@ -1,7 +1,34 @@
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
 def parse_timestamp(ts):
     return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ")
 
 def now_iso():
     return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def to_epoch(ts):
+    """ISO-8601 timestamp (naive values are taken as UTC) -> epoch seconds."""
+    dt = datetime.fromisoformat(ts)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def epoch_to_iso(epoch):
+    """Epoch seconds -> ISO-8601 UTC string in the device format."""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+_day_prefix = (None, "")   # (day number, "YYYY-MM-DDT"), replaced as a whole
+
+
+def epoch_to_iso_cached(ts):
+    """Integral epoch seconds -> same string as epoch_to_iso, with the date
+    part cached per day (for formatting many timestamps in a row)."""
+    global _day_prefix
+    day, rest = divmod(int(ts), 86400)
+    cached_day, prefix = _day_prefix
+    if cached_day != day:
+        prefix = time.strftime("%Y-%m-%dT", time.gmtime(ts))
+        _day_prefix = (day, prefix)
+    return "%s%02d:%02d:%02dZ" % (prefix, rest // 3600, rest % 3600 // 60, rest % 60)
@@ -0,0 +1,264 @@
+"""
+Per-stage microbenchmarks for the ingestion hot path.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_ingest                      # print results
+    python -m benchmarks.bench_ingest --save baseline.json
+    python -m benchmarks.bench_ingest --compare baseline.json
+
+Every stage is fed the same seeded synthetic readings, spread over the full
+band range of each channel. For each stage the suite reports throughput,
+p50/p99 latency and the transient memory allocated per call (tracemalloc
+peak). Databases are created in a temporary directory.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app.db.alerts_db import init_alerts_db, insert_alert_record
+from app.db.connection import close_connections
+from app.db.metrics_db import init_metrics_db, insert_metric_record
+from app.db.sensor_db import init_sensor_db, insert_sensor_reading
+from app.db.ventilation_db import init_ventilation_db, insert_ventilation_record
+from app.db.writer import DBWriter
+from app.hvac.hvac_controller import decide_hvac_actions
+from app.metrics.classifier import (
+    CO2_CLASSIFIER,
+    CO_CLASSIFIER,
+    PM10_CLASSIFIER,
+    PM25_CLASSIFIER,
+    PRESSURE_CLASSIFIER,
+    TEMP_CLASSIFIER,
+    WBGT_CLASSIFIER,
+)
+from app.metrics.evaluator import evaluate_all_metrics
+from app.metrics.exposure import ExposureTracker
+from app.metrics.temp_pressure_wbgt import compute_wbgt, get_wbgt_table
+from app.models.binary_payload import decode_reading, encode_reading
+from app.models.validate_payload import validate_payload
+from app.mqtt.payloads import build_unity_alert_messages, build_unity_payload
+
+# Realistic (and slightly beyond-limit) ranges per channel
+RANGES = {
+    "temp": (10.0, 40.0),
+    "pressure": (850.0, 1120.0),
+    "co_mean": (0.0, 250.0),
+    "co_max": (0.0, 450.0),
+    "pm2_5": (0.0, 130.0),
+    "pm10": (5.0, 170.0),
+    "co2": (400.0, 12000.0),
+    "humidity": (5.0, 95.0),
+}
+
+DEFAULT_REGRESSION_THRESHOLD = 0.20
+
+
+def synthetic_readings(n, seed=1234):
+    rng = random.Random(seed)
+    start = 1_735_689_600  # 2025-01-01T00:00:00Z
+    readings = []
+    for i in range(n):
+        reading = {
+            key: round(rng.uniform(low, high), 2) for key, (low, high) in RANGES.items()
+        }
+        reading["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start + 60 * i))
+        reading["co_valid"] = rng.random() > 0.1
+        readings.append(reading)
+    return readings
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def bench(func, inputs, alloc_samples=200):
+    """Time `func(x)` for every input; returns a stats dict (ns / bytes)."""
+    for x in inputs[: min(50, len(inputs))]:   # warm-up
+        func(x)
+
+    gc.disable()
+    timings = []
+    perf = time.perf_counter_ns
+    try:
+        total_start = perf()
+        for x in inputs:
+            t0 = perf()
+            func(x)
+            timings.append(perf() - t0)
+        total = perf() - total_start
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    peaks = []
+    for x in inputs[:alloc_samples]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(x)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "calls": len(inputs),
+        "ops_per_s": len(inputs) / (total / 1e9) if total else 0.0,
+        "p50_ns": _percentile(timings, 0.50),
+        "p99_ns": _percentile(timings, 0.99),
+        "mean_ns": statistics.fmean(timings),
+        "alloc_bytes": statistics.fmean(peaks) if peaks else 0.0,
+    }
+
+
+def build_stages(readings):
+    """Return {stage name: (callable, inputs)}."""
+    payloads = [json.dumps(r).encode() for r in readings]
+    exposure = ExposureTracker()
+    evaluated = [evaluate_all_metrics(r, ExposureTracker()) for r in readings]
+    packets = [e["results"]["status_packet"] for e in evaluated]
+    actions = [decide_hvac_actions(p) for p in packets]
+    metrics = [m for e in evaluated for m in e["metrics"]][: len(readings)]
+    alerts = [a for e in evaluated for a in e["alerts"]][: len(readings)] or [
+        {"timestamp": readings[0]["timestamp"], "category": "CO2", "value": 1.0,
+         "limit": 1.0, "severity": "warning", "message": "synthetic"}
+    ]
+
+    climate = [(r["temp"], r["humidity"]) for r in readings]
+    wbgt_table = get_wbgt_table()
+
+    group_writer = DBWriter()
+
+    def _write_reading(i):
+        e = evaluated[i]
+        group_writer.write_reading(readings[i], e["metrics"], e["alerts"], actions[i])
+
+    stages = {
+        "decode+validate": (lambda p: validate_payload(json.loads(p.decode())), payloads),
+        "decode.binary": (decode_reading, [encode_reading(r) for r in readings]),
+        "evaluate_all_metrics": (lambda r: evaluate_all_metrics(r, exposure), readings),
+        "compute_wbgt": (lambda th: compute_wbgt(*th), climate),
+        "wbgt_table.lookup": (lambda th: wbgt_table.wbgt(*th), climate),
+        "classify.co": (CO_CLASSIFIER.classify, [r["co_max"] for r in readings]),
+        "classify.co2": (CO2_CLASSIFIER.classify, [r["co2"] for r in readings]),
+        "classify.pm2_5": (PM25_CLASSIFIER.classify, [r["pm2_5"] for r in readings]),
+        "classify.pm10": (PM10_CLASSIFIER.classify, [r["pm10"] for r in readings]),
+        "classify.temp": (TEMP_CLASSIFIER.classify, [r["temp"] for r in readings]),
+        "classify.pressure": (PRESSURE_CLASSIFIER.classify, [r["pressure"] for r in readings]),
+        "classify.wbgt": (WBGT_CLASSIFIER.classify, [compute_wbgt(*th) for th in climate]),
+        "decide_hvac_actions": (decide_hvac_actions, packets),
+        "build_unity_payload": (build_unity_payload, packets),
+        "build_unity_alert_messages": (build_unity_alert_messages, packets),
+        "db.insert_sensor_reading": (insert_sensor_reading, readings),
+        "db.insert_metric_record": (insert_metric_record, metrics),
+        "db.insert_alert_record": (insert_alert_record, alerts),
+        "db.insert_ventilation_record": (insert_ventilation_record, actions),
+        "db.writer.write_reading": (_write_reading, list(range(len(readings)))),
+    }
+    return stages, group_writer
+
+
+def run(n, only=None):
+    readings = synthetic_readings(n)
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # DB paths in config are relative ("db/..."), so run inside tmp
+        os.chdir(tmp)
+        os.mkdir("db")
+        try:
+            init_sensor_db()
+            init_metrics_db()
+            init_alerts_db()
+            init_ventilation_db()
+            stages, group_writer = build_stages(readings)
+            for name, (func, inputs) in stages.items():
+                if only and not any(name.startswith(o) for o in only):
+                    continue
+                results[name] = bench(func, inputs)
+            group_writer.close()
+        finally:
+            close_connections()
+            os.chdir(cwd)
+    return results
+
+
+def print_results(results, baseline=None):
+    header = f"{'stage':32} {'ops/s':>12} {'p50 µs':>9} {'p99 µs':>9} {'alloc B':>9}"
+    if baseline:
+        header += f" {'Δp50':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        line = (
+            f"{name:32} {r['ops_per_s']:12,.0f} {r['p50_ns'] / 1000:9.2f} "
+            f"{r['p99_ns'] / 1000:9.2f} {r['alloc_bytes']:9.0f}"
+        )
+        if baseline and name in baseline:
+            base = baseline[name]["p50_ns"] or 1
+            line += f" {100 * (r['p50_ns'] - base) / base:+7.1f}%"
+        print(line)
+
+
+def find_regressions(results, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base and base["p50_ns"] and r["p50_ns"] > base["p50_ns"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestion hot-path microbenchmarks")
+    parser.add_argument("-n", "--readings", type=int, default=5000)
+    parser.add_argument("--only", nargs="*", help="stage name prefixes to run")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="allowed p50 slowdown before flagging (fraction)")
+    args = parser.parse_args(argv)
+
+    results = run(args.readings, args.only)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python": sys.version.split()[0],
+                    "readings": args.readings,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\n💾 Baseline saved to {args.save}")
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️ p50 regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,41 @@ from app.db.sensor_db import init_sensor_db
 from app.db.metrics_db import init_metrics_db
 from app.db.alerts_db import init_alerts_db
 from app.mqtt.mqtt_listener import start_listener
+from app.mqtt.async_listener import start_async_listener
 from app.db.ventilation_db import init_ventilation_db
+from app.db.rollups_db import init_rollups_db
+from app.db.writer import get_writer
+from app.spool import close_spools
+from app.api.server import start_query_api_thread
+from app.telemetry.server import start_telemetry
+from app.db.unified_db import init_unified_db
+from app.cluster import run_cluster
+from app.config.config import CLUSTER_WORKERS, MQTT_ASYNC, QUERY_API_ENABLED, STORAGE_MODE
 
 if __name__ == "__main__":
-    init_sensor_db()
-    init_metrics_db()
-    init_alerts_db()
-    init_ventilation_db()
-    start_listener()
+    if STORAGE_MODE == "unified":
+        init_unified_db()
+    else:
+        init_sensor_db()
+        init_metrics_db()
+        init_alerts_db()
+        init_ventilation_db()
+        init_rollups_db()
+    start_telemetry()
+    if QUERY_API_ENABLED and CLUSTER_WORKERS:
+        # The hot cache lives in the workers; this process would serve it empty
+        print("⚠️ Query API not started in cluster mode: the hot state is spread over the workers")
+    elif QUERY_API_ENABLED:
+        start_query_api_thread()
+    if CLUSTER_WORKERS:
+        # Worker processes run the listeners, the storage process the writer
+        run_cluster()
+    else:
+        try:
+            if MQTT_ASYNC:
+                start_async_listener()
+            else:
+                start_listener()
+        finally:
+            get_writer().close()
+            close_spools()
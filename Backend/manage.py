@@ -0,0 +1,144 @@
+import argparse
+import os
+
+from app.api.server import run_query_api
+from app.archive import COLUMNS, export_archive
+from app.config.config import (
+    ALERTS_DB_PATH,
+    ARCHIVE_DIR,
+    LOCAL_BROKER_HOST,
+    LOCAL_BROKER_PORT,
+    METRICS_DB_PATH,
+    QUERY_API_HOST,
+    QUERY_API_PORT,
+    SENSOR_DB_PATH,
+    STORAGE_MODE,
+    UNIFIED_DB_PATH,
+    VENTILATION_DB_PATH,
+)
+from app.db.migrate import migrate_to_unified
+from app.mqtt.local_broker import run_broker
+from app.replay import rebuild_rollups, replay_history
+
+
+def _replay(args):
+    out = args.out_dir
+    targets = {
+        "metrics": os.path.join(out, "metrics.db"),
+        "alerts": os.path.join(out, "alerts.db"),
+        "ventilation": os.path.join(out, "ventilation.db"),
+    }
+    totals = replay_history(
+        targets,
+        source_path=args.source,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        overwrite=args.overwrite,
+    )
+    label = "Dry run" if args.dry_run else f"Replayed into {out}"
+    print(f"🔁 {label}: {totals}")
+
+
+def _rebuild_rollups(args):
+    totals = rebuild_rollups(
+        sensor_path=args.sensor_db,
+        metrics_path=args.metrics_db,
+        target_path=args.target or args.metrics_db,
+    )
+    print(f"🧮 Rollups rebuilt: {totals}")
+
+
+def _migrate(args):
+    totals = migrate_to_unified(
+        sensor_path=args.sensor_db,
+        metrics_path=args.metrics_db,
+        alerts_path=args.alerts_db,
+        ventilation_path=args.ventilation_db,
+        target_path=args.target,
+        overwrite=args.overwrite,
+    )
+    print(f"🗃️ Migrated into {args.target}: {totals}")
+
+
+def _archive(args):
+    totals = export_archive(
+        out_dir=args.out_dir,
+        storage_mode=args.storage_mode,
+        sensor_path=args.sensor_db,
+        metrics_path=args.metrics_db,
+        unified_path=args.unified_db,
+        tables=args.tables,
+        overwrite=args.overwrite,
+    )
+    print(f"🗄️ Archived into {args.out_dir}: {totals}")
+
+
+def _serve_api(args):
+    try:
+        run_query_api(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+
+
+def _broker(args):
+    try:
+        run_broker(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Maintenance commands for the sensor backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay = sub.add_parser("replay", help="Re-evaluate stored sensor history")
+    replay.add_argument("--source", default=SENSOR_DB_PATH, help="sensor_readings database")
+    replay.add_argument("--out-dir", default=os.path.join(os.path.dirname(SENSOR_DB_PATH), "replay"), help="directory for the regenerated databases")
+    replay.add_argument("--chunk-size", type=int, default=5000)
+    replay.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    replay.add_argument("--dry-run", action="store_true", help="evaluate only, write nothing")
+    replay.add_argument("--overwrite", action="store_true", help="replace existing target databases")
+    replay.set_defaults(func=_replay)
+
+    rollups = sub.add_parser("rebuild-rollups", help="Recompute the rollups table from stored history")
+    rollups.add_argument("--sensor-db", default=SENSOR_DB_PATH)
+    rollups.add_argument("--metrics-db", default=METRICS_DB_PATH)
+    rollups.add_argument("--target", default=None, help="database receiving the rollups (default: --metrics-db)")
+    rollups.set_defaults(func=_rebuild_rollups)
+
+    migrate = sub.add_parser("migrate", help="Copy the split databases into the unified schema")
+    migrate.add_argument("--sensor-db", default=SENSOR_DB_PATH)
+    migrate.add_argument("--metrics-db", default=METRICS_DB_PATH)
+    migrate.add_argument("--alerts-db", default=ALERTS_DB_PATH)
+    migrate.add_argument("--ventilation-db", default=VENTILATION_DB_PATH)
+    migrate.add_argument("--target", default=UNIFIED_DB_PATH)
+    migrate.add_argument("--overwrite", action="store_true", help="replace an existing target database")
+    migrate.set_defaults(func=_migrate)
+
+    archive = sub.add_parser("archive", help="Export readings and metrics to the columnar archive")
+    archive.add_argument("--out-dir", default=ARCHIVE_DIR)
+    archive.add_argument("--storage-mode", choices=("split", "unified"), default=STORAGE_MODE)
+    archive.add_argument("--sensor-db", default=SENSOR_DB_PATH)
+    archive.add_argument("--metrics-db", default=METRICS_DB_PATH)
+    archive.add_argument("--unified-db", default=UNIFIED_DB_PATH)
+    archive.add_argument("--tables", nargs="+", choices=list(COLUMNS), default=list(COLUMNS))
+    archive.add_argument("--overwrite", action="store_true", help="rewrite every day, not only the changed ones")
+    archive.set_defaults(func=_archive)
+
+    api = sub.add_parser("serve-api", help="Run the read-only HTTP query API")
+    api.add_argument("--host", default=QUERY_API_HOST)
+    api.add_argument("--port", type=int, default=QUERY_API_PORT)
+    api.set_defaults(func=_serve_api)
+
+    broker = sub.add_parser("broker", help="Run a local MQTT broker (development and cluster tests)")
+    broker.add_argument("--host", default=LOCAL_BROKER_HOST)
+    broker.add_argument("--port", type=int, default=LOCAL_BROKER_PORT)
+    broker.set_defaults(func=_broker)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
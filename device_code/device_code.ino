@@ -4,7 +4,13 @@
 #include <WiFi.h>
 #include <PubSubClient.h>
 #include <Wire.h>
+// 1 on boards fitted with a BME280 (BMP280 footprint, plus humidity)
+#define USE_BME280 0
+#if USE_BME280
+#include <Adafruit_BME280.h>
+#else
 #include <Adafruit_BMP280.h>
+#endif
 #include "time.h"
 
 // =========================
@@ -49,9 +55,14 @@ float pm25_win2 = 0, pm10_win2 = 0;
 // =========================
 // BMP280 VARIABLES
 // =========================
+#if USE_BME280
+Adafruit_BME280 bmp;  // I2C
+#else
 Adafruit_BMP280 bmp;  // I2C
+#endif
 float currentTemp = 0.0;
 float currentPressure = 0.0;
+float currentHumidity = NAN;  // % RH; NAN = no humidity sensor (backend assumes 40 %)
 
 // =========================
 // MQTT CONFIG
@@ -64,6 +75,23 @@ const int   mqtt_port   = 1883;
 const char* mqtt_topic  = "omar/factory/sensors";
 const char* mqtt_control_topic = "omar/factory/ventilation";
 
+// Binary payload (Backend/app/models/binary_payload.py, version 2):
+// 40 bytes instead of ~180 for the JSON string. Off until the board has a
+// CO2 sensor: the backend rejects a record without co2.
+const bool USE_BINARY_PAYLOAD = false;
+const uint8_t PAYLOAD_MAGIC = 0xA5;
+const uint8_t PAYLOAD_VERSION = 2;
+const uint8_t PAYLOAD_FLAG_CO_VALID = 0x01;
+const int32_t PAYLOAD_MISSING = INT32_MIN;   // channel not measured
+const size_t BINARY_PAYLOAD_SIZE = 40;
+
+// Samples buffered per binary publish (records are sent back to back).
+// 1 = publish every minute. PubSubClient's default 256-byte packet holds
+// up to 5 records; call client.setBufferSize() for more.
+const int SAMPLES_PER_PUBLISH = 1;
+uint8_t sampleBuffer[SAMPLES_PER_PUBLISH * BINARY_PAYLOAD_SIZE];
+int bufferedSamples = 0;
+
 
 WiFiClient espClient;
 PubSubClient client(espClient);
@@ -123,6 +151,9 @@ void setupWiFi() {
 void readBMP280() {
   currentTemp = bmp.readTemperature();
   currentPressure = bmp.readPressure() / 100.0;  // Pa → hPa
+#if USE_BME280
+  currentHumidity = bmp.readHumidity();
+#endif
 }
 
 // =========================
@@ -274,6 +305,67 @@ void reconnectMQTT() {
   }
 }
 
+// =========================
+// BINARY PAYLOAD
+// =========================
+
+// Little-endian int32 (the ESP32 is little-endian, but keep it explicit)
+void putInt32(uint8_t* buf, size_t offset, int32_t v) {
+  buf[offset]     = (uint8_t)(v & 0xFF);
+  buf[offset + 1] = (uint8_t)((v >> 8) & 0xFF);
+  buf[offset + 2] = (uint8_t)((v >> 16) & 0xFF);
+  buf[offset + 3] = (uint8_t)((v >> 24) & 0xFF);
+}
+
+// Fixed point with 2 decimals, like the JSON payload
+int32_t centi(float v) {
+  return (int32_t)lroundf(v * 100.0f);
+}
+
+void encodeBinaryRecord(uint8_t* buf, uint32_t ts, float temp, float pressure,
+                        float co_mean, int co_max, bool co_valid,
+                        float pm25, float pm10, float humidity) {
+  buf[0] = PAYLOAD_MAGIC;
+  buf[1] = PAYLOAD_VERSION;
+  buf[2] = co_valid ? PAYLOAD_FLAG_CO_VALID : 0;
+  buf[3] = 0;
+  putInt32(buf, 4, (int32_t)ts);
+  putInt32(buf, 8, centi(temp));
+  putInt32(buf, 12, centi(pressure));
+  putInt32(buf, 16, centi(co_mean));
+  putInt32(buf, 20, co_max * 100);
+  putInt32(buf, 24, centi(pm25));
+  putInt32(buf, 28, centi(pm10));
+  putInt32(buf, 32, PAYLOAD_MISSING);   // no CO2 sensor on this board
+  putInt32(buf, 36, isnan(humidity) ? PAYLOAD_MISSING : centi(humidity));
+}
+
+void publishBinaryPayload(uint32_t ts, float temp, float pressure,
+                          float co_mean, int co_max, bool co_valid,
+                          float pm25, float pm10, float humidity) {
+  encodeBinaryRecord(sampleBuffer + bufferedSamples * BINARY_PAYLOAD_SIZE,
+                     ts, temp, pressure, co_mean, co_max, co_valid, pm25, pm10, humidity);
+  bufferedSamples++;
+  if (bufferedSamples < SAMPLES_PER_PUBLISH) {
+    Serial.print("Buffered sample "); Serial.print(bufferedSamples);
+    Serial.print("/"); Serial.println(SAMPLES_PER_PUBLISH);
+    return;
+  }
+
+  size_t size = bufferedSamples * BINARY_PAYLOAD_SIZE;
+  if (client.publish(mqtt_topic, sampleBuffer, size)) {
+    bufferedSamples = 0;
+    Serial.print("=== MQTT binary payload sent (");
+    Serial.print(size);
+    Serial.println(" bytes) ===");
+  } else {
+    // Keep the newest samples and retry with the next one
+    memmove(sampleBuffer, sampleBuffer + BINARY_PAYLOAD_SIZE, size - BINARY_PAYLOAD_SIZE);
+    bufferedSamples--;
+    Serial.println("MQTT publish failed, keeping samples for the next attempt");
+  }
+}
+
 // =========================
 // FINAL MINUTE PROCESSOR
 // =========================
@@ -349,11 +441,18 @@ void mqttCallback(char* topic, byte* message, unsigned int length) {
   Serial.println("---- MINUTE SUMMARY ----");
   Serial.print("Temp: "); Serial.println(currentTemp);
   Serial.print("Pressure: "); Serial.println(currentPressure);
+  Serial.print("Humidity: "); Serial.println(currentHumidity);
   Serial.print("CO mean: "); Serial.println(co_mean);
   Serial.print("CO max : "); Serial.println(co_max);
   Serial.print("PM2.5  : "); Serial.println(pm25);
   Serial.print("PM10   : "); Serial.println(pm10);
 
+  if (USE_BINARY_PAYLOAD) {
+    publishBinaryPayload((uint32_t)now, currentTemp, currentPressure,
+                         co_mean, co_max, mq7Valid, pm25, pm10, currentHumidity);
+    return;
+  }
+
   // Build JSON payload
   String payload = "{";
   payload += "\"timestamp\":\"" + String(timestamp) + "\",";
@@ -364,6 +463,9 @@ void mqttCallback(char* topic, byte* message, unsigned int length) {
   payload += "\"co_valid\":" + String(mq7Valid ? "true" : "false") + ",";
   payload += "\"pm2_5\":" + String(pm25, 2) + ",";
   payload += "\"pm10\":" + String(pm10, 2);
+  if (!isnan(currentHumidity)) {
+    payload += ",\"humidity\":" + String(currentHumidity, 2);
+  }
   payload += "}";
 
   Serial.println("=== MQTT Payload ===");